@@ -2,56 +2,293 @@
 Master Orchestrator - Routes messages to agents
 """
 
-import json
+import asyncio
+import os
+import random
+import time
+from collections import Counter
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional, Any
 import logging
 
-from app.core.llm_gateway import LLMGateway
+from app.core.call_metrics import get_call_metrics
+from app.core.llm_gateway import get_llm_gateway, parse_json_object, LLMResponse
+from app.core.prompt_builder import get_prompt_builder
+from app.core.response_cache import ReplyScope
+from app.core.websocket_manager import manager
 
 logger = logging.getLogger(__name__)
 
+PIPELINE_TWO_CALL = "two_call"
+PIPELINE_COMBINED = "combined"
+PIPELINE_AB = "ab"
+
+DEFAULT_CLASSIFICATION = {"priority": "medium", "category": "general", "sentiment": "neutral"}
+ALLOWED_VALUES = {
+    "priority": {"high", "medium", "low"},
+    "category": {"billing", "technical", "general"},
+    "sentiment": {"positive", "neutral", "negative"}
+}
+
+# Shared across orchestrator instances so every entry point reports into one place
+pipeline_stats: Counter = Counter()
+
+def get_pipeline_stats() -> Dict[str, Any]:
+    """Pipeline counters for all orchestrators in this process"""
+    combined = pipeline_stats["combined_attempts"]
+    speculated = pipeline_stats["speculation_hits"] + pipeline_stats["speculation_misses"]
+    return {
+        "pipeline_mode": os.getenv("ORCHESTRATOR_PIPELINE_MODE", PIPELINE_TWO_CALL),
+        **pipeline_stats,
+        "combined_success_rate": round(pipeline_stats["combined_success"] / combined, 4) if combined else 0.0,
+        "speculation_hit_rate": round(pipeline_stats["speculation_hits"] / speculated, 4) if speculated else 0.0
+    }
+
+def validate_classification(data: Optional[Dict]) -> Optional[Dict]:
+    """Return a normalized classification, or None if any field is missing or invalid"""
+    if not data:
+        return None
+    result = {}
+    for field, allowed in ALLOWED_VALUES.items():
+        value = str(data.get(field, "")).strip().lower()
+        if value not in allowed:
+            return None
+        result[field] = value
+    return result
+
 class MasterOrchestrator:
     def __init__(self):
-        self.llm_gateway = LLMGateway()
-    
+        self.llm_gateway = get_llm_gateway()
+        # Strips quoted history/signatures and bounds customer text to the model budget
+        self.prompt_builder = get_prompt_builder()
+        self.pipeline_mode = os.getenv("ORCHESTRATOR_PIPELINE_MODE", PIPELINE_TWO_CALL).lower()
+        # Share of traffic sent through the combined pipeline when mode is "ab"
+        self.combined_share = float(os.getenv("ORCHESTRATOR_COMBINED_SHARE", "0.5"))
+        # Draft the reply from the trained local classifier's guess while the LLM classifies,
+        # only for messages it is at least this confident about (no trained model: no drafts)
+        self.speculative = os.getenv("ORCHESTRATOR_SPECULATIVE", "true").lower() == "true"
+        self.speculation_min_confidence = float(os.getenv("ORCHESTRATOR_SPECULATION_MIN_CONFIDENCE", "0.6"))
+        # Push partial replies to dashboard WebSocket clients while they are generated
+        self.stream_to_dashboard = os.getenv("ORCHESTRATOR_STREAM_TO_DASHBOARD", "true").lower() == "true"
+        self.stream_flush_interval = float(os.getenv("ORCHESTRATOR_STREAM_FLUSH_MS", "50")) / 1000
+
     async def process_message(self, message: Dict) -> Dict:
         """Main orchestration logic"""
+        started = time.monotonic()
         try:
-            # Classify the message
-            classification = await self.llm_gateway.classify(message["content"])
-            
-            # Parse classification
-            try:
-                result = json.loads(classification.content)
-            except:
-                result = {"priority": "medium", "category": "general", "sentiment": "neutral"}
-            
             # Create ticket
             ticket_id = f"TICKET_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            
-            # Generate response
-            response_context = f"""Customer said: {message['content']}
-Priority: {result['priority']}
-Category: {result['category']}
 
-Generate a helpful response acknowledging their issue and providing ticket number {ticket_id}."""
-            
-            response = await self.llm_gateway.generate_response(response_context)
-            
-            return {
-                "success": True,
-                "ticket_id": ticket_id,
-                "classification": result,
-                "response": response.content,
-                "model_used": response.model_used,
-                "processing_time_ms": 2000  # Placeholder
-            }
-            
+            result = None
+            if self._use_combined_pipeline():
+                result = await self._process_combined(message, ticket_id)
+                if not result:
+                    # Structured answer failed validation; fall back to the two-call path
+                    pipeline_stats["combined_fallbacks"] += 1
+
+            result = result or await self._process_two_call(message, ticket_id)
+            elapsed = time.monotonic() - started
+            result["processing_time_ms"] = round(elapsed * 1000)
+            get_call_metrics().record_pipeline(result["pipeline"], elapsed)
+            return result
+
         except Exception as e:
             logger.error(f"Orchestration error: {e}")
             return {
                 "success": False,
                 "error": str(e),
                 "fallback_response": "Thank you for contacting support. We've received your message and will respond shortly."
-            }
\ No newline at end of file
+            }
+
+    def _use_combined_pipeline(self) -> bool:
+        if self.pipeline_mode == PIPELINE_COMBINED:
+            return True
+        if self.pipeline_mode == PIPELINE_AB:
+            return random.random() < self.combined_share
+        return False
+
+    async def _process_two_call(self, message: Dict, ticket_id: str) -> Dict:
+        """Classify first, then generate a response from the classification"""
+        pipeline_stats["two_call"] += 1
+
+        text = self._prompt_text(message, "classification")
+        guess = self.llm_gateway.local_classifier.guess(text, self.speculation_min_confidence) if self.speculative else None
+        if guess:
+            result, response = await self._classify_and_draft(message, ticket_id, text, guess)
+        else:
+            if self.speculative:
+                pipeline_stats["speculation_skipped"] += 1
+            # Classify the message
+            classification = await self.llm_gateway.classify(text, tenant_id=message.get("tenant_id"))
+            result = self._parse_classification(classification.content)
+
+            # Generate response
+            response = await self._generate(message, result, ticket_id)
+
+        return {
+            "success": True,
+            "ticket_id": ticket_id,
+            "classification": result,
+            "response": response.content,
+            "model_used": response.model_used,
+            "pipeline": PIPELINE_TWO_CALL
+        }
+
+    async def _classify_and_draft(self, message: Dict, ticket_id: str, text: str, guess: Dict):
+        """
+        Run classification and a speculative draft concurrently.
+
+        The draft is generated from the local classifier's confident guess. The response
+        prompt only depends on priority and category, so when the LLM agrees on both the
+        draft is used as is; otherwise it is cancelled and regenerated.
+        """
+        draft = asyncio.create_task(
+            self._generate(message, guess, ticket_id)
+        )
+
+        try:
+            classification = await self.llm_gateway.classify(text, tenant_id=message.get("tenant_id"))
+        except BaseException:
+            await self._discard(draft)
+            raise
+        result = self._parse_classification(classification.content)
+
+        if (result["priority"], result["category"]) == (guess["priority"], guess["category"]):
+            pipeline_stats["speculation_hits"] += 1
+            return result, await draft
+
+        pipeline_stats["speculation_misses"] += 1
+        await self._discard(draft)
+        response = await self._generate(message, result, ticket_id)
+        return result, response
+
+    @staticmethod
+    async def _discard(draft: asyncio.Task):
+        """
+        Cancel a speculative draft and wait for it to unwind, so its stream and
+        provider call are released and an error it raised is not left unretrieved
+        """
+        draft.cancel()
+        await asyncio.gather(draft, return_exceptions=True)
+
+    async def _generate(self, message: Dict, classification: Dict, ticket_id: str) -> LLMResponse:
+        """Generate the reply, streaming it to the dashboard when anyone is watching"""
+        text = self._prompt_text(message, "generation")
+        context = self._build_response_context(text, classification, ticket_id)
+        hedge = classification["priority"] == "high"
+        scope = self._reply_scope(message, text, classification, ticket_id)
+
+        if not (self.stream_to_dashboard and manager.active_connections):
+            return await self.llm_gateway.generate_response(
+                context, hedge=hedge, scope=scope, priority=classification["priority"]
+            )
+
+        envelope = {
+            "ticket_id": ticket_id,
+            "channel": message.get("channel"),
+            "sender": message.get("sender") or message.get("customer_id")
+        }
+
+        cached = self.llm_gateway.cached_reply(scope)
+        if cached:
+            await manager.broadcast({
+                "type": "response_complete",
+                **envelope,
+                "content": cached.content,
+                "model_used": cached.model_used
+            })
+            return cached
+
+        stream = self.llm_gateway.stream_response(context, priority=classification["priority"], tenant_id=scope.tenant_id)
+        pending, sequence, last_flush = [], 0, 0.0
+
+        try:
+            async for chunk in stream:
+                pending.append(chunk)
+                # The first chunk goes out immediately; later ones are batched per flush interval
+                if time.monotonic() - last_flush >= self.stream_flush_interval:
+                    await manager.broadcast({"type": "response_chunk", **envelope, "sequence": sequence, "delta": "".join(pending)})
+                    pending, sequence, last_flush = [], sequence + 1, time.monotonic()
+        except asyncio.CancelledError:
+            # A speculative draft was abandoned; tell the dashboard to drop what it has shown
+            await manager.broadcast({"type": "response_discarded", **envelope})
+            raise
+        except Exception as e:
+            logger.warning(f"Streaming generation failed, retrying without streaming: {e}")
+            pipeline_stats["stream_failures"] += 1
+            await manager.broadcast({"type": "response_discarded", **envelope})
+            return await self.llm_gateway.generate_response(
+                context, hedge=hedge, scope=scope, priority=classification["priority"]
+            )
+
+        if pending:
+            await manager.broadcast({"type": "response_chunk", **envelope, "sequence": sequence, "delta": "".join(pending)})
+        await manager.broadcast({
+            "type": "response_complete",
+            **envelope,
+            "content": stream.response.content,
+            "model_used": stream.response.model_used
+        })
+        pipeline_stats["streamed_responses"] += 1
+        self.llm_gateway.remember_reply(scope, stream.response)
+        return stream.response
+
+    @staticmethod
+    def _reply_scope(message: Dict, text: str, classification: Dict, ticket_id: str) -> ReplyScope:
+        return ReplyScope(
+            tenant_id=message.get("tenant_id") or "default",
+            category=classification["category"],
+            priority=classification["priority"],
+            message=text,
+            ticket_id=ticket_id,
+            identity={"customer_id": message.get("customer_id"), "sender": message.get("sender")}
+        )
+
+    @staticmethod
+    def _parse_classification(content: str) -> Dict:
+        return validate_classification(parse_json_object(content)) or dict(DEFAULT_CLASSIFICATION)
+
+    def _prompt_text(self, message: Dict, model_type: str) -> str:
+        """Customer text as it goes into a prompt for model_type: cleaned and within the token budget"""
+        return self.prompt_builder.compact(
+            message["content"], self.llm_gateway.input_budget(model_type), channel=message.get("channel")
+        ).text
+
+    @staticmethod
+    def _build_response_context(text: str, classification: Dict, ticket_id: str) -> str:
+        return f"""Customer said: {text}
+Priority: {classification['priority']}
+Category: {classification['category']}
+
+Generate a helpful response acknowledging their issue and providing ticket number {ticket_id}."""
+
+    async def _process_combined(self, message: Dict, ticket_id: str) -> Optional[Dict]:
+        """Classify and draft the reply in a single generation call; None if the answer is invalid"""
+        pipeline_stats["combined_attempts"] += 1
+
+        prompt = f"""You are a customer support agent. Classify the customer message and write a reply.
+
+Customer said: {self._prompt_text(message, "generation")}
+
+The reply must acknowledge their issue and provide ticket number {ticket_id}.
+Return only JSON, with no other text:
+{{"priority": "high|medium|low", "category": "billing|technical|general", "sentiment": "positive|neutral|negative", "reply": "<reply to the customer>"}}"""
+
+        response = await self.llm_gateway.generate_response(prompt, tenant_id=message.get("tenant_id"))
+        data = parse_json_object(response.content) if response.success else None
+        classification = validate_classification(data)
+        reply = data.get("reply") if data else None
+
+        if not classification or not isinstance(reply, str) or not reply.strip():
+            logger.warning(f"Combined pipeline answer failed validation (model: {response.model_used})")
+            return None
+
+        pipeline_stats["combined_success"] += 1
+        return {
+            "success": True,
+            "ticket_id": ticket_id,
+            "classification": classification,
+            "response": reply.strip(),
+            "model_used": response.model_used,
+            "pipeline": PIPELINE_COMBINED
+        }
@@ -2,34 +2,70 @@
 Health check API endpoints
 """
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from datetime import datetime
 from typing import Dict, Any
 
+from app.core.call_metrics import get_call_metrics
+from app.core.llm_gateway import get_llm_gateway
+from app.agents.master_orchestrator import get_pipeline_stats
+
 router = APIRouter()
 
 @router.get("/status")
 async def health_status() -> Dict[str, Any]:
     """Get system health status"""
+    breakers = get_llm_gateway().get_breaker_states()
+    open_circuits = [name for name, breaker in breakers.items() if breaker["state"] != "closed"]
+    
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "version": "1.0.0",
         "components": {
-            "llm_gateway": "healthy",
+            "llm_gateway": "degraded" if open_circuits else "healthy",
             "master_orchestrator": "healthy",
             "api": "healthy"
-        }
+        },
+        "circuit_breakers": breakers
     }
 
 @router.get("/ready")
-async def readiness_check() -> Dict[str, Any]:
-    """Check if system is ready to serve requests"""
-    return {
-        "ready": True,
+async def readiness_check():
+    """Check if system is ready to serve requests (503 until the fallback models are loaded)"""
+    warmup = get_llm_gateway().warmer.get_stats()
+    body = {
+        "ready": warmup["ready"],
         "timestamp": datetime.now().isoformat(),
         "checks": {
             "database": "ready",
-            "llm_providers": "ready",
+            "llm_providers": "ready" if warmup["ready"] else "warming_up",
             "agents": "ready"
-        }
-    }
\ No newline at end of file
+        },
+        "models": warmup["models"]
+    }
+    return body if warmup["ready"] else JSONResponse(status_code=503, content=body)
+
+@router.get("/llm/stats")
+async def llm_stats() -> Dict[str, Any]:
+    """Get LLM gateway runtime statistics (connection pools, etc.)"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        **get_llm_gateway().get_stats()
+    }
+
+@router.get("/llm/metrics")
+async def llm_metrics() -> Dict[str, Any]:
+    """Per-call stage timings, tokens and cost per provider/model/task (JSON form of /metrics)"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        **get_call_metrics().get_stats()
+    }
+
+@router.get("/orchestrator/stats")
+async def orchestrator_stats() -> Dict[str, Any]:
+    """Get message pipeline statistics"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        **get_pipeline_stats()
+    }
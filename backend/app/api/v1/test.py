@@ -8,11 +8,14 @@ import logging
 import json
 
 from app.agents.master_orchestrator import MasterOrchestrator
+from app.core.llm_gateway import get_llm_gateway
 
 router = APIRouter()
 orchestrator = MasterOrchestrator()
 logger = logging.getLogger(__name__)
 
+MAX_BULK_MESSAGES = 500
+
 @router.post("/test")
 async def test_webhook(request: Request):
     """Test endpoint for processing customer messages"""
@@ -47,4 +50,39 @@ async def test_webhook(request: Request):
         
     except Exception as e:
         logger.error(f"Test webhook error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/bulk")
+async def test_bulk_classification(request: Request):
+    """Classify many customer messages in one request (batched LLM prompts)"""
+    try:
+        data = await request.json()
+        messages = data.get("messages", [])
+        
+        if not isinstance(messages, list) or not messages or not all(isinstance(m, str) and m for m in messages):
+            raise HTTPException(status_code=400, detail="messages must be a non-empty list of strings")
+        if len(messages) > MAX_BULK_MESSAGES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_MESSAGES} messages per request")
+        
+        responses = await get_llm_gateway().classify_many(messages, tenant_id=data.get("tenant_id"))
+        
+        results = []
+        for message, response in zip(messages, responses):
+            classification = MasterOrchestrator._parse_classification(response.content)
+            results.append({
+                "message": message,
+                "classification": classification,
+                "model_used": response.model_used
+            })
+        
+        return {
+            "status": "success",
+            "count": len(results),
+            "results": results
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Bulk classification error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
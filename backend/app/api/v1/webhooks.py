@@ -4,15 +4,51 @@ Using unified channel manager for consistent message processing
 """
 
 from fastapi import APIRouter, Request, HTTPException
-from typing import Dict
+from typing import Dict, Any, Optional
+import os
 import logging
 
 from app.core.channel_manager import ChannelManager
+from app.core.job_queue import DurableJobQueue
+from app.core.job_scheduler import message_schedule_key
 
 router = APIRouter()
 channel_manager = ChannelManager()
 logger = logging.getLogger(__name__)
 
+# Webhooks acknowledge as soon as the parsed message is queued; workers do the processing,
+# high priority (local classification) and SLA-critical messages first
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "true").lower() == "true"
+job_queue = DurableJobQueue.from_env(
+    channel_manager.handle_message,
+    prioritize=message_schedule_key,
+    # A worker takes a conversation's messages together instead of one worker per waiting message
+    conversation_of=channel_manager.conversation_key
+)
+
+async def accept_message(channel_name: str, data: Dict[str, Any]) -> Optional[int]:
+    """
+    Queue a webhook payload or polled message (or process it inline when the queue is
+    disabled); returns the job id
+    """
+    if not JOB_QUEUE_ENABLED:
+        result = await channel_manager.process_message(channel_name, data)
+        logger.info(f"Processed {channel_name} message: {result}")
+        return None
+    try:
+        parsed_message = channel_manager.parse_message(channel_name, data)
+    except Exception as e:
+        # Nothing to retry: a payload that does not parse now never will
+        logger.warning(f"Ignoring {channel_name} webhook payload: {e}")
+        return None
+    if not await channel_manager.claim_delivery(channel_name, parsed_message):
+        return None
+    try:
+        return await job_queue.enqueue(channel_name, parsed_message)
+    except Exception:
+        await channel_manager.release_delivery(channel_name, parsed_message)
+        raise
+
 # POC Configuration: Telegram and Email webhooks only
 
 @router.post("/telegram")
@@ -20,9 +56,7 @@ async def telegram_webhook(request: Request):
     """Handle incoming Telegram messages via unified channel manager"""
     try:
         data = await request.json()
-        result = await channel_manager.process_message("telegram", data)
-        
-        logger.info(f"Processed Telegram message: {result}")
+        await accept_message("telegram", data)
         return {"ok": True}
         
     except Exception as e:
@@ -34,15 +68,25 @@ async def email_webhook(request: Request):
     """Handle incoming email messages via unified channel manager"""
     try:
         data = await request.json()
-        result = await channel_manager.process_message("email", data)
-        
-        logger.info(f"Processed email webhook: {result}")
-        return {"status": "received"}
+        job_id = await accept_message("email", data)
+        if job_id is None:
+            return {"status": "received"}
+        return {"status": "queued", "job_id": job_id}
         
     except Exception as e:
         logger.error(f"Email webhook error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/queue")
+async def get_queue_status():
+    """Depth, wait and processing times of the webhook job queue, and per-conversation ordering"""
+    return {
+        "enabled": JOB_QUEUE_ENABLED,
+        **job_queue.get_stats(),
+        "conversations": channel_manager.conversations.get_stats(),
+        "deliveries": channel_manager.get_delivery_stats()
+    }
+
 @router.get("/channels/status")
 async def get_channels_status():
     """Get status of all communication channels"""
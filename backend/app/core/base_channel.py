@@ -87,6 +87,24 @@ class BaseChannel(ABC):
             "supports_formatting": False,
             "max_message_length": 1000
         }
+    
+    def get_delivery_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Outbound delivery statistics, if the channel keeps any
+        """
+        return None
+    
+    def render_prometheus(self) -> str:
+        """
+        Outbound delivery metrics in Prometheus text format
+        """
+        return ""
+    
+    async def aclose(self):
+        """
+        Release connections held by the channel
+        """
+        pass
 
 class MessageProcessingError(Exception):
     """Custom exception for message processing errors"""
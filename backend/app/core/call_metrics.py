@@ -0,0 +1,188 @@
+"""
+Call Metrics - Per-stage timing, tokens and cost of every upstream LLM call
+
+The gateway opens a CallTiming around each provider call. Providers attach
+`trace_extensions()` to their httpx requests, so httpcore's trace hook fills
+in connect and time-to-first-byte for whichever call is current. Finished
+calls are aggregated per stage/provider/model/task into LatencyHistograms and
+exported as JSON (`get_stats`) or Prometheus text (`render_prometheus`).
+
+Stages, all in seconds:
+    queue_wait  admission control (rate limits, concurrency) before the request is sent
+    connect     TCP + TLS set-up; only observed when the call opened a new connection
+    ttfb        request sent until response headers arrived
+    total       request sent until the full answer (or error) was received
+"""
+
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+
+from app.core.llm_metrics import (
+    DEFAULT_BUCKETS, LatencyHistogram, prometheus_histogram, prometheus_labels, prometheus_metric
+)
+
+# Queue waits and connects are usually well under the default buckets' first bound
+STAGE_BUCKETS = {
+    "queue_wait": (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+    "connect": (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+}
+
+PIPELINE_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+class CallTiming:
+    """Stage timings of one provider call"""
+
+    def __init__(self, provider: str, model: str, task: str):
+        self.provider = provider
+        self.model = model
+        self.task = task
+        self.created = time.monotonic()
+        self.sent: Optional[float] = None
+        self.queue_wait: Optional[float] = None
+        self.connect: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        self.total: Optional[float] = None
+        self._connect_started: Optional[float] = None
+
+    def admitted(self):
+        """Admission granted: the queue wait ends and the request is about to be sent"""
+        self.sent = time.monotonic()
+        self.queue_wait = self.sent - self.created
+
+    def finished(self):
+        if self.sent is not None:
+            self.total = time.monotonic() - self.sent
+
+    async def trace(self, event: str, info: Dict[str, Any]):
+        """httpx/httpcore `trace` extension callback"""
+        now = time.monotonic()
+        if event == "connection.connect_tcp.started":
+            self._connect_started = now
+        elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if self._connect_started is not None:
+                self.connect = now - self._connect_started
+        elif event.endswith("receive_response_headers.complete") and self.ttfb is None and self.sent is not None:
+            self.ttfb = now - self.sent
+
+_current_call: ContextVar[Optional[CallTiming]] = ContextVar("llm_call_timing", default=None)
+
+def trace_extensions() -> Dict[str, Any]:
+    """httpx request extensions that report into the current call's timing (empty outside a call)"""
+    timing = _current_call.get()
+    return {"trace": timing.trace} if timing is not None else {}
+
+class CallMetrics:
+    """Aggregates finished CallTimings and pipeline processing times"""
+
+    def __init__(self):
+        self._stages: Dict[Tuple[str, str, str, str], LatencyHistogram] = {}
+        self._calls: Counter = Counter()      # (provider, model, task, outcome)
+        self._tokens: Counter = Counter()     # (provider, model, task)
+        self._cost: Dict[Tuple[str, str, str], float] = defaultdict(float)
+        self._new_connections: Counter = Counter()
+        self._pipeline: Dict[str, LatencyHistogram] = {}
+
+    @contextmanager
+    def call(self, provider: str, model: str, task: str) -> Iterator[CallTiming]:
+        """Time one provider call; the caller marks `admitted()` and reports `record()`"""
+        timing = CallTiming(provider, model, task)
+        # set() rather than reset(token): a streaming call may be closed from another context
+        previous = _current_call.get()
+        _current_call.set(timing)
+        try:
+            yield timing
+        finally:
+            _current_call.set(previous)
+
+    def _observe(self, stage: str, timing: CallTiming, seconds: Optional[float]):
+        if seconds is None:
+            return
+        key = (stage, timing.provider, timing.model, timing.task)
+        if key not in self._stages:
+            self._stages[key] = LatencyHistogram(STAGE_BUCKETS.get(stage, DEFAULT_BUCKETS))
+        self._stages[key].observe(seconds)
+
+    def record(self, timing: CallTiming, outcome: str, tokens: int = 0, cost_usd: float = 0.0):
+        """outcome: "success", "error", "timeout" or "cancelled" ("not_admitted" has no request stages)"""
+        timing.finished()
+        call = (timing.provider, timing.model, timing.task)
+        self._calls[call + (outcome,)] += 1
+        self._tokens[call] += tokens
+        self._cost[call] += cost_usd
+        self._observe("queue_wait", timing, timing.queue_wait if timing.queue_wait is not None else time.monotonic() - timing.created)
+        if timing.connect is not None:
+            self._new_connections[call] += 1
+        self._observe("connect", timing, timing.connect)
+        self._observe("ttfb", timing, timing.ttfb)
+        # Cancelled calls (hedge losers, disconnects) would skew the total distribution
+        if outcome != "cancelled":
+            self._observe("total", timing, timing.total)
+
+    def record_pipeline(self, pipeline: str, seconds: float):
+        """End-to-end processing time of one message through the orchestrator"""
+        self._pipeline.setdefault(pipeline, LatencyHistogram(PIPELINE_BUCKETS)).observe(seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        calls: Dict[str, Dict[str, Any]] = {}
+        for (provider, model, task), tokens in self._tokens.items():
+            calls[f"{provider}/{model}/{task}"] = {
+                "provider": provider,
+                "model": model,
+                "task": task,
+                "outcomes": {},
+                "tokens": tokens,
+                "cost_usd": round(self._cost[(provider, model, task)], 6),
+                "new_connections": self._new_connections[(provider, model, task)],
+                "stages": {}
+            }
+        for (provider, model, task, outcome), count in self._calls.items():
+            calls[f"{provider}/{model}/{task}"]["outcomes"][outcome] = count
+        for (stage, provider, model, task), histogram in self._stages.items():
+            calls[f"{provider}/{model}/{task}"]["stages"][stage] = histogram.snapshot()
+
+        return {
+            "calls": calls,
+            "totals": {
+                "calls": sum(self._calls.values()),
+                "tokens": sum(self._tokens.values()),
+                "cost_usd": round(sum(self._cost.values()), 6)
+            },
+            "pipeline_processing": {name: histogram.snapshot() for name, histogram in self._pipeline.items()}
+        }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines: List[str] = []
+        lines += prometheus_histogram("llm_call_stage_seconds", "Upstream LLM call time per stage", [
+            (prometheus_labels(stage=stage, provider=provider, model=model, task=task), hist)
+            for (stage, provider, model, task), hist in sorted(self._stages.items())
+        ])
+        lines += prometheus_metric("llm_calls_total", "counter", "Upstream LLM calls by outcome", [
+            (prometheus_labels(provider=provider, model=model, task=task, outcome=outcome), count)
+            for (provider, model, task, outcome), count in sorted(self._calls.items())
+        ])
+        lines += prometheus_metric("llm_tokens_total", "counter", "Tokens reported by upstream LLM calls", [
+            (prometheus_labels(provider=provider, model=model, task=task), count)
+            for (provider, model, task), count in sorted(self._tokens.items())
+        ])
+        lines += prometheus_metric("llm_cost_usd_total", "counter", "Estimated cost of upstream LLM calls in USD", [
+            (prometheus_labels(provider=provider, model=model, task=task), cost)
+            for (provider, model, task), cost in sorted(self._cost.items())
+        ])
+        lines += prometheus_metric("llm_new_connections_total", "counter", "Upstream LLM calls that had to open a new connection", [
+            (prometheus_labels(provider=provider, model=model, task=task), count)
+            for (provider, model, task), count in sorted(self._new_connections.items())
+        ])
+        lines += prometheus_histogram("pipeline_processing_seconds", "End-to-end message processing time", [
+            (prometheus_labels(pipeline=pipeline), hist) for pipeline, hist in sorted(self._pipeline.items())
+        ])
+        return "\n".join(lines) + "\n"
+
+@lru_cache(maxsize=1)
+def get_call_metrics() -> CallMetrics:
+    """Process-wide metrics shared by the gateway and the orchestrator"""
+    return CallMetrics()
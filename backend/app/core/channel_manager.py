@@ -3,9 +3,13 @@ Channel Manager for Cassava AI Support Orchestrator
 Manages all communication channels and provides unified interface
 """
 
+import os
+import time
 import logging
 from typing import Dict, Any, Optional, List
 from app.core.base_channel import BaseChannel, ChannelConnectionError
+from app.core.dedup_index import DeliveryDedupIndex
+from app.core.keyed_executor import KeyedExecutor
 from app.core.telegram_channel import TelegramChannel
 from app.core.email_channel import EmailChannel
 from app.agents.master_orchestrator import MasterOrchestrator
@@ -20,6 +24,17 @@ class ChannelManager:
     def __init__(self):
         self.channels: Dict[str, BaseChannel] = {}
         self.orchestrator = MasterOrchestrator()
+        # One conversation (chat / email sender) at a time, conversations in parallel;
+        # optionally a burst from one sender is answered by a single orchestration call
+        merge = os.getenv("CHANNEL_MERGE_BURSTS", "false").lower() == "true"
+        self.conversations = KeyedExecutor(
+            self._run_conversation,
+            merge_window=float(os.getenv("CHANNEL_MERGE_WINDOW_MS", "1500")) / 1000,
+            max_batch=int(os.getenv("CHANNEL_MERGE_MAX_MESSAGES", "5")) if merge else 1
+        )
+        # Repeated deliveries (Telegram retries, duplicate Message-IDs) are answered only once
+        self.dedup_enabled = os.getenv("WEBHOOK_DEDUP_ENABLED", "true").lower() == "true"
+        self.deliveries = DeliveryDedupIndex.from_env()
         self._initialize_channels()
     
     def _initialize_channels(self):
@@ -60,44 +75,16 @@ class ChannelManager:
             Processing result with response
         """
         try:
-            # Get channel
-            channel = self.channels.get(channel_name)
-            if not channel:
-                raise ValueError(f"Channel '{channel_name}' not available")
-            
-            # Parse message
-            parsed_message = channel.parse_incoming_message(raw_data)
-            if not parsed_message:
-                raise ValueError("Failed to parse incoming message")
+            parsed_message = self.parse_message(channel_name, raw_data)
+            if not await self.claim_delivery(channel_name, parsed_message):
+                return {"duplicate": True, "channel": channel_name, "processed": False}
             
-            # Process through orchestrator
-            result = await self.orchestrator.process_message(parsed_message)
-            
-            # Send response if we have one
-            if result and result.get('response'):
-                # Format response for channel
-                formatted_response = channel.format_response(result['response'])
-                
-                # Get channel-specific send parameters
-                send_params = self._get_channel_send_params(channel_name, parsed_message, raw_data)
-                
-                # For Telegram, use chat_id instead of sender if available
-                recipient = send_params.pop("to", parsed_message['sender'])
-                
-                # Send response
-                success = await channel.send_message(
-                    to=recipient,
-                    content=formatted_response,
-                    **send_params
-                )
-                
-                result['sent'] = success
-                if success:
-                    logger.info(f"✅ Response sent via {channel_name} to {recipient}")
-                else:
-                    logger.error(f"❌ Failed to send response via {channel_name}")
-            
-            return result
+            try:
+                return await self.handle_message(channel_name, parsed_message)
+            except Exception:
+                # Let a redelivery try again
+                await self.release_delivery(channel_name, parsed_message)
+                raise
             
         except Exception as e:
             logger.error(f"Error processing {channel_name} message: {e}")
@@ -107,7 +94,118 @@ class ChannelManager:
                 "processed": False
             }
     
-    def _get_channel_send_params(self, channel_name: str, parsed_message: Dict[str, Any], raw_data: Dict[str, Any]) -> Dict[str, Any]:
+    def parse_message(self, channel_name: str, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Parse a raw webhook payload into the unified message format (raises ValueError if it cannot)
+        """
+        # Get channel
+        channel = self.channels.get(channel_name)
+        if not channel:
+            raise ValueError(f"Channel '{channel_name}' not available")
+        
+        # Parse message
+        parsed_message = channel.parse_incoming_message(raw_data)
+        if not parsed_message:
+            raise ValueError("Failed to parse incoming message")
+        # Arrival order within a conversation, kept through the job queue
+        parsed_message["received_at"] = time.time()
+        return parsed_message
+    
+    async def claim_delivery(self, channel_name: str, parsed_message: Dict[str, Any]) -> bool:
+        """
+        False if this message was already delivered (keyed on channel + message ID)
+        """
+        delivery_id = self._delivery_id(channel_name, parsed_message)
+        if not self.dedup_enabled or not delivery_id:
+            return True
+        if await self.deliveries.claim(channel_name, delivery_id):
+            return True
+        logger.info(f"Ignoring duplicate {channel_name} delivery of message {delivery_id}")
+        return False
+    
+    async def release_delivery(self, channel_name: str, parsed_message: Dict[str, Any]):
+        delivery_id = self._delivery_id(channel_name, parsed_message)
+        if self.dedup_enabled and delivery_id:
+            await self.deliveries.release(channel_name, delivery_id)
+    
+    @staticmethod
+    def _delivery_id(channel_name: str, parsed_message: Dict[str, Any]) -> Optional[str]:
+        message_id = parsed_message.get("message_id")
+        if not message_id:
+            return None
+        if channel_name == "telegram":
+            # Telegram message IDs are only unique within a chat
+            return f"{(parsed_message.get('metadata') or {}).get('chat_id')}:{message_id}"
+        return str(message_id)
+    
+    async def handle_message(self, channel_name: str, parsed_message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run a parsed message through the orchestrator and send the reply (used by the webhook job queue).
+        Messages of the same conversation are handled one after another, in arrival order.
+        """
+        return await self.conversations.submit(
+            self.conversation_key(channel_name, parsed_message),
+            (channel_name, parsed_message),
+            order=parsed_message.get("received_at") or 0.0
+        )
+    
+    @staticmethod
+    def conversation_key(channel_name: str, parsed_message: Dict[str, Any]) -> str:
+        """Messages with the same key are handled one after another (Telegram chat, email sender)"""
+        chat_id = (parsed_message.get("metadata") or {}).get("chat_id")
+        return f"{channel_name}:{chat_id if chat_id is not None else parsed_message.get('sender', '')}"
+    
+    async def _run_conversation(self, key: str, items: List) -> Dict[str, Any]:
+        """Handle one message, or a burst of messages from the same conversation as one"""
+        channel_name = items[0][0]
+        messages = [message for _, message in items]
+        if len(messages) == 1:
+            return await self._handle(channel_name, messages[0])
+        
+        # Answer the burst once, replying to its latest message
+        merged = dict(messages[-1])
+        merged["content"] = "\n\n".join(message.get("content", "") for message in messages if message.get("content"))
+        merged["merged_message_ids"] = [message.get("message_id") for message in messages]
+        logger.info(f"Merged {len(messages)} messages from {key} into one orchestration call")
+        result = await self._handle(channel_name, merged)
+        result["merged_messages"] = len(messages)
+        return result
+    
+    async def _handle(self, channel_name: str, parsed_message: Dict[str, Any]) -> Dict[str, Any]:
+        channel = self.channels.get(channel_name)
+        if not channel:
+            raise ValueError(f"Channel '{channel_name}' not available")
+        
+        # Process through orchestrator
+        result = await self.orchestrator.process_message(parsed_message)
+        
+        # Send response if we have one
+        if result and result.get('response'):
+            # Format response for channel
+            formatted_response = channel.format_response(result['response'])
+            
+            # Get channel-specific send parameters
+            send_params = self._get_channel_send_params(channel_name, parsed_message)
+            
+            # For Telegram, use chat_id instead of sender if available
+            recipient = send_params.pop("to", parsed_message['sender'])
+            
+            # Send response
+            success = await channel.send_message(
+                to=recipient,
+                content=formatted_response,
+                **send_params
+            )
+            
+            result['sent'] = success
+            if success:
+                logger.info(f"✅ Response sent via {channel_name} to {recipient}")
+            else:
+                logger.error(f"❌ Failed to send response via {channel_name}")
+        
+        return result
+    
+    def _get_channel_send_params(self, channel_name: str, parsed_message: Dict[str, Any]) -> Dict[str, Any]:
         """
         Get channel-specific parameters for sending response
         """
@@ -165,6 +263,26 @@ class ChannelManager:
         
         return status
     
+    def get_delivery_stats(self) -> Dict[str, Any]:
+        """
+        Duplicate suppression and per-channel outbound delivery statistics
+        """
+        return {
+            "deduplication": self.deliveries.get_stats(),
+            **{name: stats for name, channel in self.channels.items() if (stats := channel.get_delivery_stats()) is not None}
+        }
+    
+    def render_prometheus(self) -> str:
+        return self.deliveries.render_prometheus() + "".join(channel.render_prometheus() for channel in self.channels.values())
+    
+    async def aclose(self):
+        """
+        Close channel connections and the dedup store
+        """
+        for channel in self.channels.values():
+            await channel.aclose()
+        await self.deliveries.aclose()
+    
     def get_available_channels(self) -> List[str]:
         """
         Get list of available channel names
@@ -0,0 +1,178 @@
+"""
+Circuit Breaker - Per-provider failure isolation for the LLM gateway
+"""
+
+import os
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass, asdict
+from enum import Enum
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+@dataclass
+class BreakerConfig:
+    """Thresholds for one provider's circuit breaker"""
+    window_size: int = 20               # most recent calls considered
+    min_calls: int = 5                  # calls needed before the rates are trusted
+    failure_rate_threshold: float = 0.5
+    slow_call_seconds: float = 10.0
+    slow_call_rate_threshold: float = 0.8
+    open_seconds: float = 30.0          # how long to short-circuit before probing
+    half_open_max_probes: int = 1       # concurrent probes allowed while half-open
+    half_open_successes: int = 2        # successful probes needed to close
+
+    @classmethod
+    def from_env(cls, name: str) -> "BreakerConfig":
+        """Read CIRCUIT_BREAKER_* defaults, overridable per provider (e.g. MISTRAL_BREAKER_OPEN_SECONDS)"""
+        def setting(key: str, default: Any) -> str:
+            return os.getenv(f"{name.upper()}_BREAKER_{key}", os.getenv(f"CIRCUIT_BREAKER_{key}", str(default)))
+
+        defaults = cls()
+        return cls(
+            window_size=int(setting("WINDOW_SIZE", defaults.window_size)),
+            min_calls=int(setting("MIN_CALLS", defaults.min_calls)),
+            failure_rate_threshold=float(setting("FAILURE_RATE", defaults.failure_rate_threshold)),
+            slow_call_seconds=float(setting("SLOW_CALL_SECONDS", defaults.slow_call_seconds)),
+            slow_call_rate_threshold=float(setting("SLOW_CALL_RATE", defaults.slow_call_rate_threshold)),
+            open_seconds=float(setting("OPEN_SECONDS", defaults.open_seconds)),
+            half_open_max_probes=int(setting("HALF_OPEN_PROBES", defaults.half_open_max_probes)),
+            half_open_successes=int(setting("HALF_OPEN_SUCCESSES", defaults.half_open_successes))
+        )
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over a sliding window of call outcomes.
+
+    Closed: calls flow; the breaker opens when the failure rate or slow-call rate
+    in the window crosses its threshold. Open: calls are refused until
+    `open_seconds` pass. Half-open: a trickle of probe calls is let through;
+    enough successes close the breaker, any failure re-opens it.
+    """
+
+    def __init__(self, name: str, config: Optional[BreakerConfig] = None):
+        self.name = name
+        self.config = config or BreakerConfig.from_env(name)
+        self.state = BreakerState.CLOSED
+
+        # (failed, slow) per recent call
+        self._outcomes: deque = deque(maxlen=self.config.window_size)
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._last_latency: Optional[float] = None
+        self._stats = {
+            "calls": 0,
+            "failures": 0,
+            "slow_calls": 0,
+            "rejected": 0,
+            "times_opened": 0
+        }
+
+    def allow_request(self) -> bool:
+        """Whether a call may go to this provider now (reserves a probe slot when half-open)"""
+        if self.state == BreakerState.OPEN:
+            if time.monotonic() - self._opened_at < self.config.open_seconds:
+                self._stats["rejected"] += 1
+                return False
+            self._transition(BreakerState.HALF_OPEN)
+
+        if self.state == BreakerState.HALF_OPEN:
+            if self._probes_in_flight >= self.config.half_open_max_probes:
+                self._stats["rejected"] += 1
+                return False
+            self._probes_in_flight += 1
+
+        return True
+
+    def record_success(self, latency_seconds: float):
+        slow = latency_seconds >= self.config.slow_call_seconds
+        self._record(failed=False, slow=slow, latency_seconds=latency_seconds)
+
+        if self.state == BreakerState.HALF_OPEN:
+            self._release_probe()
+            self._probe_successes += 1
+            if self._probe_successes >= self.config.half_open_successes:
+                self._transition(BreakerState.CLOSED)
+        else:
+            self._evaluate()
+
+    def record_failure(self, latency_seconds: Optional[float] = None):
+        self._record(failed=True, slow=False, latency_seconds=latency_seconds)
+
+        if self.state == BreakerState.HALF_OPEN:
+            self._release_probe()
+            self._transition(BreakerState.OPEN)
+        else:
+            self._evaluate()
+
+    def record_cancelled(self):
+        """A call that was abandoned before it finished says nothing about provider health"""
+        if self.state == BreakerState.HALF_OPEN:
+            self._release_probe()
+
+    def _record(self, failed: bool, slow: bool, latency_seconds: Optional[float]):
+        self._outcomes.append((failed, slow))
+        self._stats["calls"] += 1
+        self._stats["failures"] += int(failed)
+        self._stats["slow_calls"] += int(slow)
+        if latency_seconds is not None:
+            self._last_latency = latency_seconds
+
+    def _release_probe(self):
+        self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _evaluate(self):
+        if self.state != BreakerState.CLOSED or len(self._outcomes) < self.config.min_calls:
+            return
+
+        failure_rate, slow_rate = self._rates()
+        if failure_rate >= self.config.failure_rate_threshold or slow_rate >= self.config.slow_call_rate_threshold:
+            self._transition(BreakerState.OPEN)
+
+    def _rates(self):
+        if not self._outcomes:
+            return 0.0, 0.0
+        total = len(self._outcomes)
+        failures = sum(1 for failed, _ in self._outcomes if failed)
+        slow = sum(1 for _, is_slow in self._outcomes if is_slow)
+        return failures / total, slow / total
+
+    def _transition(self, state: BreakerState):
+        if state == self.state:
+            return
+
+        logger.warning(f"Circuit breaker '{self.name}': {self.state.value} -> {state.value}")
+        self.state = state
+
+        if state == BreakerState.OPEN:
+            self._opened_at = time.monotonic()
+            self._stats["times_opened"] += 1
+        elif state == BreakerState.HALF_OPEN:
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        elif state == BreakerState.CLOSED:
+            self._outcomes.clear()
+
+    def get_state(self) -> Dict[str, Any]:
+        failure_rate, slow_rate = self._rates()
+        state = {
+            "state": self.state.value,
+            "failure_rate": round(failure_rate, 4),
+            "slow_call_rate": round(slow_rate, 4),
+            "window_calls": len(self._outcomes),
+            "last_latency_seconds": round(self._last_latency, 4) if self._last_latency is not None else None,
+            **self._stats,
+            "config": asdict(self.config)
+        }
+        if self.state == BreakerState.OPEN:
+            remaining = self.config.open_seconds - (time.monotonic() - self._opened_at)
+            state["retry_in_seconds"] = round(max(0.0, remaining), 2)
+        return state
@@ -0,0 +1,190 @@
+"""
+Classification Cache - Content-addressed cache for LLM message classifications
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bump when the classification prompt changes so stale entries are not served
+CACHE_NAMESPACE = "clscache:v1"
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """Normalize a message so near-exact repeats share a key"""
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+def cache_key(text: str) -> str:
+    """Content address for a message: hash of its normalized text"""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{CACHE_NAMESPACE}:{digest}"
+
+class ClassificationCache:
+    """
+    Two-level classification cache: an in-process LRU with TTL and a memory cap,
+    optionally backed by Redis so several workers share hits.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 3600,
+        max_entries: int = 10000,
+        max_bytes: int = 8 * 1024 * 1024,
+        redis_url: Optional[str] = None
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.redis_url = redis_url
+
+        # key -> (expires_at, payload)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+        self._redis = None
+        self._stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "redis_errors": 0
+        }
+
+    @classmethod
+    def from_env(cls) -> "ClassificationCache":
+        return cls(
+            ttl_seconds=float(os.getenv("CLASSIFICATION_CACHE_TTL", "3600")),
+            max_entries=int(os.getenv("CLASSIFICATION_CACHE_MAX_ENTRIES", "10000")),
+            max_bytes=int(os.getenv("CLASSIFICATION_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+            redis_url=os.getenv("CLASSIFICATION_CACHE_REDIS_URL") or None
+        )
+
+    async def get(self, text: str) -> Optional[Dict[str, Any]]:
+        """Return the cached classification record for a message, if any"""
+        key = cache_key(text)
+
+        payload = self._memory_get(key)
+        if payload is not None:
+            self._stats["memory_hits"] += 1
+        else:
+            payload = await self._redis_get(key)
+            if payload is not None:
+                self._stats["redis_hits"] += 1
+                self._memory_set(key, payload)
+
+        if payload is None:
+            self._stats["misses"] += 1
+            return None
+
+        self._stats["hits"] += 1
+        return json.loads(payload)
+
+    async def set(self, text: str, record: Dict[str, Any]):
+        """Store a classification record for a message"""
+        key = cache_key(text)
+        payload = json.dumps(record, separators=(",", ":"))
+
+        self._memory_set(key, payload)
+        self._stats["stores"] += 1
+        await self._redis_set(key, payload)
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, payload = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self._stats["expirations"] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return payload
+
+    def _memory_set(self, key: str, payload: str):
+        if key in self._entries:
+            self._remove(key)
+
+        size = self._entry_size(key, payload)
+        if size > self.max_bytes:
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, payload)
+        self._bytes += size
+
+        # Evict least recently used entries until both caps are respected
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats["evictions"] += 1
+
+    def _remove(self, key: str):
+        _, payload = self._entries.pop(key)
+        self._bytes -= self._entry_size(key, payload)
+
+    @staticmethod
+    def _entry_size(key: str, payload: str) -> int:
+        # Approximate footprint: key and payload text plus per-entry overhead
+        return len(key) + len(payload) + 64
+
+    def _get_redis(self):
+        if self._redis is None and self.redis_url:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    async def _redis_get(self, key: str) -> Optional[str]:
+        client = self._get_redis()
+        if client is None:
+            return None
+        try:
+            return await client.get(key)
+        except Exception as e:
+            self._stats["redis_errors"] += 1
+            logger.warning(f"Classification cache Redis read failed: {e}")
+            return None
+
+    async def _redis_set(self, key: str, payload: str):
+        client = self._get_redis()
+        if client is None:
+            return
+        try:
+            await client.set(key, payload, ex=max(1, int(self.ttl_seconds)))
+        except Exception as e:
+            self._stats["redis_errors"] += 1
+            logger.warning(f"Classification cache Redis write failed: {e}")
+
+    async def aclose(self):
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "redis": bool(self.redis_url)
+        }
@@ -0,0 +1,272 @@
+"""
+Cost Ledger - Persistent record of LLM spend with per-tenant budgets
+
+Every answered call is appended to an in-memory buffer and written to SQLite
+(aiosqlite) in write-behind batches, so recording never waits on disk. Running
+per-tenant and per-model totals for the current budget period are kept in
+memory and reloaded from the database on startup.
+
+A tenant whose spend reaches the soft limit (share of its budget) is served
+from the cheapest models first; at the budget it only gets local fallbacks.
+"""
+
+import asyncio
+import json
+import os
+import time
+import weakref
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+import aiosqlite
+
+from app.core.llm_providers import LLMResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+
+BUDGET_OK = "ok"
+BUDGET_DOWNGRADE = "downgrade"
+BUDGET_EXHAUSTED = "exhausted"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_costs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    tenant_id TEXT NOT NULL,
+    task TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    cost_usd REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS llm_costs_tenant_ts ON llm_costs (tenant_id, ts);
+"""
+
+@dataclass
+class BudgetPolicy:
+    budgets: Dict[str, float] = field(default_factory=dict)  # USD per period; tenants not listed use default_budget
+    default_budget: float = 0.0      # 0 = unlimited
+    soft_limit: float = 0.8          # share of the budget from which cheaper models are used
+    period: str = "month"            # "day" or "month" (UTC calendar periods)
+
+    @classmethod
+    def from_env(cls) -> "BudgetPolicy":
+        try:
+            budgets = {tenant: float(usd) for tenant, usd in json.loads(os.getenv("TENANT_LLM_BUDGETS", "{}")).items()}
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.error(f"Ignoring invalid TENANT_LLM_BUDGETS: {e}")
+            budgets = {}
+        period = os.getenv("TENANT_LLM_BUDGET_PERIOD", "month").lower()
+        return cls(
+            budgets=budgets,
+            default_budget=float(os.getenv("TENANT_LLM_DEFAULT_BUDGET_USD", "0")),
+            soft_limit=float(os.getenv("TENANT_LLM_BUDGET_SOFT_LIMIT", "0.8")),
+            period=period if period in ("day", "month") else "month"
+        )
+
+    def budget_for(self, tenant_id: str) -> float:
+        return self.budgets.get(tenant_id, self.default_budget)
+
+    def period_start(self, now: Optional[float] = None) -> float:
+        """Unix time at which the current budget period began"""
+        moment = datetime.fromtimestamp(now if now is not None else time.time(), timezone.utc)
+        start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        if self.period == "month":
+            start = start.replace(day=1)
+        return start.timestamp()
+
+class _Totals:
+    __slots__ = ("calls", "tokens", "cost_usd")
+
+    def __init__(self):
+        self.calls = 0
+        self.tokens = 0
+        self.cost_usd = 0.0
+
+    def add(self, calls: int, tokens: int, cost_usd: float):
+        self.calls += calls
+        self.tokens += tokens
+        self.cost_usd += cost_usd
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "tokens": self.tokens, "cost_usd": round(self.cost_usd, 6)}
+
+class CostLedger:
+    """Write-behind SQLite ledger of LLM spend with in-memory running totals"""
+
+    def __init__(self, path: str, policy: BudgetPolicy, flush_interval: float = 2.0, batch_size: int = 200):
+        self.path = path
+        self.policy = policy
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._pending: List[Tuple] = []
+        self._db: Optional[aiosqlite.Connection] = None
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        # Coalesced callers share one response object; only the first one is charged
+        self._recorded: "weakref.WeakValueDictionary[int, LLMResponse]" = weakref.WeakValueDictionary()
+
+        self._period_start = policy.period_start()
+        self._tenants: Dict[str, _Totals] = defaultdict(_Totals)
+        self._models: Dict[str, _Totals] = defaultdict(_Totals)
+        self._tenant_models: Dict[Tuple[str, str], _Totals] = defaultdict(_Totals)
+        self._stats = {"recorded": 0, "flushed": 0, "flushes": 0, "flush_errors": 0, "downgraded": 0, "blocked": 0}
+
+    @classmethod
+    def from_env(cls) -> "CostLedger":
+        return cls(
+            path=os.getenv("COST_LEDGER_PATH", "data/cost_ledger.db"),
+            policy=BudgetPolicy.from_env(),
+            flush_interval=float(os.getenv("COST_LEDGER_FLUSH_SECONDS", "2")),
+            batch_size=int(os.getenv("COST_LEDGER_BATCH_SIZE", "200"))
+        )
+
+    async def start(self):
+        """Open the database, reload the current period's totals and start the flush loop"""
+        if self._flush_task is not None:
+            return
+        try:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = await aiosqlite.connect(self.path)
+            await self._db.execute("PRAGMA journal_mode=WAL")
+            await self._db.executescript(_SCHEMA)
+            await self._db.commit()
+            await self._load_period()
+        except Exception as e:
+            # Budgets still work from in-memory totals; spend just is not persisted
+            logger.error(f"Cost ledger database {self.path} unavailable: {e}")
+            self._db = None
+        self._flush_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._flush_task = self._flush_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def _load_period(self):
+        async with self._db.execute(
+            "SELECT tenant_id, provider, model, COUNT(*), SUM(tokens), SUM(cost_usd) "
+            "FROM llm_costs WHERE ts >= ? GROUP BY tenant_id, provider, model",
+            (self._period_start,)
+        ) as cursor:
+            for tenant_id, provider, model, calls, tokens, cost in await cursor.fetchall():
+                self._add(tenant_id, f"{provider}/{model}", calls, tokens or 0, cost or 0.0)
+        logger.info(f"Cost ledger loaded spend for {len(self._tenants)} tenants since the period start")
+
+    def _add(self, tenant_id: str, model: str, calls: int, tokens: int, cost_usd: float):
+        self._tenants[tenant_id].add(calls, tokens, cost_usd)
+        self._models[model].add(calls, tokens, cost_usd)
+        self._tenant_models[(tenant_id, model)].add(calls, tokens, cost_usd)
+
+    def _roll_period(self):
+        """Reset the in-memory totals when a new budget period starts"""
+        start = self.policy.period_start()
+        if start != self._period_start:
+            self._period_start = start
+            self._tenants.clear()
+            self._models.clear()
+            self._tenant_models.clear()
+
+    def record(self, tenant_id: Optional[str], task: str, response: LLMResponse):
+        """Charge a response to a tenant; responses that cost nothing (caches, fallbacks) are skipped"""
+        if not response.tokens_used and not response.cost_usd:
+            return
+        if id(response) in self._recorded:
+            return
+        self._recorded[id(response)] = response
+
+        tenant_id = tenant_id or DEFAULT_TENANT
+        self._roll_period()
+        self._add(tenant_id, f"{response.provider}/{response.model_used}", 1, response.tokens_used, response.cost_usd)
+        self._pending.append((
+            time.time(), tenant_id, task, response.provider, response.model_used, response.tokens_used, response.cost_usd
+        ))
+        self._stats["recorded"] += 1
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    def budget_state(self, tenant_id: Optional[str]) -> str:
+        tenant_id = tenant_id or DEFAULT_TENANT
+        budget = self.policy.budget_for(tenant_id)
+        if budget <= 0:
+            return BUDGET_OK
+        self._roll_period()
+        spent = self._tenants[tenant_id].cost_usd if tenant_id in self._tenants else 0.0
+        if spent >= budget:
+            return BUDGET_EXHAUSTED
+        if spent >= budget * self.policy.soft_limit:
+            return BUDGET_DOWNGRADE
+        return BUDGET_OK
+
+    def note_enforced(self, state: str):
+        """Count a call that was downgraded or blocked by its tenant's budget"""
+        self._stats["downgraded" if state == BUDGET_DOWNGRADE else "blocked"] += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write buffered entries in one transaction; on failure they are kept for the next flush"""
+        async with self._flush_lock:
+            if not self._pending or self._db is None:
+                return
+            batch, self._pending = self._pending, []
+            try:
+                await self._db.executemany(
+                    "INSERT INTO llm_costs (ts, tenant_id, task, provider, model, tokens, cost_usd) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    batch
+                )
+                await self._db.commit()
+            except Exception as e:
+                self._stats["flush_errors"] += 1
+                logger.warning(f"Cost ledger flush of {len(batch)} entries failed: {e}")
+                # Keep the newest entries so a broken disk cannot grow memory without bound
+                self._pending = (batch + self._pending)[-self.batch_size * 50:]
+                return
+            self._stats["flushed"] += len(batch)
+            self._stats["flushes"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        tenants = {}
+        for tenant_id, totals in self._tenants.items():
+            budget = self.policy.budget_for(tenant_id)
+            tenants[tenant_id] = {
+                **totals.snapshot(),
+                "budget_usd": budget or None,
+                "budget_used": round(totals.cost_usd / budget, 4) if budget > 0 else None,
+                "state": self.budget_state(tenant_id),
+                "models": {
+                    model: model_totals.snapshot()
+                    for (owner, model), model_totals in self._tenant_models.items() if owner == tenant_id
+                }
+            }
+        return {
+            "path": self.path,
+            "persistent": self._db is not None,
+            "period": self.policy.period,
+            "period_start": datetime.fromtimestamp(self._period_start, timezone.utc).isoformat(),
+            "soft_limit": self.policy.soft_limit,
+            "pending": len(self._pending),
+            **self._stats,
+            "tenants": tenants,
+            "models": {model: totals.snapshot() for model, totals in self._models.items()}
+        }
@@ -0,0 +1,200 @@
+"""
+Dedup Index - Suppresses repeated deliveries of the same inbound message
+
+Telegram re-sends an update when the webhook is slow and mail gateways can
+deliver a Message-ID twice. Each delivery is claimed under channel + message
+ID: the first claim wins, later ones are duplicates. Claims live in a bounded
+in-memory layer with a TTL, optionally backed by Redis (SET NX, shared between
+instances) or SQLite (survives restarts). When the backing store is
+unreachable the index fails open and the message is processed.
+"""
+
+import asyncio
+import os
+import time
+import logging
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+import aiosqlite
+
+from app.core.llm_metrics import prometheus_labels, prometheus_metric
+
+logger = logging.getLogger(__name__)
+
+DEDUP_NAMESPACE = "delivery:v1"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deliveries (
+    key TEXT PRIMARY KEY,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deliveries_seen_at ON deliveries (seen_at);
+"""
+
+# Expired SQLite rows are deleted every this many claims
+_PURGE_EVERY = 1000
+
+class DeliveryDedupIndex:
+    """Claims inbound message IDs; bounded LRU in memory plus optional Redis or SQLite"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = 86400,
+        max_entries: int = 100000,
+        redis_url: Optional[str] = None,
+        sqlite_path: Optional[str] = None
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.redis_url = redis_url
+        # Redis is shared between instances, so it wins when both are configured
+        self.sqlite_path = sqlite_path if not redis_url else None
+
+        # key -> expires_at (monotonic)
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._redis = None
+        self._db: Optional[aiosqlite.Connection] = None
+        self._db_lock = asyncio.Lock()
+        self._db_failed = False
+        self._claims_since_purge = 0
+        self._stats: Counter = Counter()
+        self._suppressed: Counter = Counter()
+
+    @classmethod
+    def from_env(cls) -> "DeliveryDedupIndex":
+        return cls(
+            ttl_seconds=float(os.getenv("WEBHOOK_DEDUP_TTL_SECONDS", "86400")),
+            max_entries=int(os.getenv("WEBHOOK_DEDUP_MAX_ENTRIES", "100000")),
+            redis_url=os.getenv("WEBHOOK_DEDUP_REDIS_URL") or None,
+            sqlite_path=os.getenv("WEBHOOK_DEDUP_SQLITE_PATH") or None
+        )
+
+    @property
+    def backend(self) -> str:
+        if self.redis_url:
+            return "redis"
+        return "sqlite" if self.sqlite_path else "memory"
+
+    async def claim(self, channel: str, message_id: str) -> bool:
+        """True for the first delivery of a message, False for a duplicate"""
+        key = f"{DEDUP_NAMESPACE}:{channel}:{message_id}"
+        self._stats["claims"] += 1
+
+        if self._memory_seen(key):
+            return self._duplicate(channel)
+        first = await self._persistent_claim(key)
+        self._memory_add(key)
+        if not first:
+            return self._duplicate(channel)
+        return True
+
+    async def release(self, channel: str, message_id: str):
+        """Forget a claim so a redelivery is processed (the first attempt could not be handled)"""
+        key = f"{DEDUP_NAMESPACE}:{channel}:{message_id}"
+        self._entries.pop(key, None)
+        try:
+            if self.redis_url:
+                await self._get_redis().delete(key)
+            elif await self._get_db() is not None:
+                await self._db.execute("DELETE FROM deliveries WHERE key = ?", (key,))
+                await self._db.commit()
+        except Exception as e:
+            self._stats["store_errors"] += 1
+            logger.warning(f"Could not release delivery claim {key}: {e}")
+
+    def _duplicate(self, channel: str) -> bool:
+        self._suppressed[channel] += 1
+        return False
+
+    def _memory_seen(self, key: str) -> bool:
+        expires_at = self._entries.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False
+        return True
+
+    def _memory_add(self, key: str):
+        self._entries[key] = time.monotonic() + self.ttl_seconds
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    async def _persistent_claim(self, key: str) -> bool:
+        try:
+            if self.redis_url:
+                return bool(await self._get_redis().set(key, "1", nx=True, ex=max(1, int(self.ttl_seconds))))
+            if await self._get_db() is None:
+                return True
+            now = time.time()
+            self._claims_since_purge += 1
+            if self._claims_since_purge >= _PURGE_EVERY:
+                self._claims_since_purge = 0
+                await self._db.execute("DELETE FROM deliveries WHERE seen_at < ?", (now - self.ttl_seconds,))
+            # An expired row is taken over; a live one means this delivery is a duplicate
+            cursor = await self._db.execute(
+                "INSERT INTO deliveries (key, seen_at) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET seen_at = excluded.seen_at WHERE deliveries.seen_at < ?",
+                (key, now, now - self.ttl_seconds)
+            )
+            await self._db.commit()
+            return cursor.rowcount == 1
+        except Exception as e:
+            self._stats["store_errors"] += 1
+            logger.warning(f"Delivery dedup {self.backend} claim failed, processing anyway: {e}")
+            return True
+
+    def _get_redis(self):
+        if self._redis is None:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    async def _get_db(self) -> Optional[aiosqlite.Connection]:
+        if self._db is not None or self._db_failed or not self.sqlite_path:
+            return self._db
+        async with self._db_lock:
+            if self._db is None and not self._db_failed:
+                try:
+                    Path(self.sqlite_path).parent.mkdir(parents=True, exist_ok=True)
+                    db = await aiosqlite.connect(self.sqlite_path)
+                    await db.execute("PRAGMA journal_mode=WAL")
+                    await db.execute("PRAGMA synchronous=NORMAL")
+                    await db.executescript(_SCHEMA)
+                    await db.commit()
+                    self._db = db
+                except Exception as e:
+                    # Memory-only from here on rather than retrying on every message
+                    self._db_failed = True
+                    logger.error(f"Delivery dedup database {self.sqlite_path} unavailable: {e}")
+        return self._db
+
+    async def aclose(self):
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            **self._stats,
+            "duplicates_suppressed": sum(self._suppressed.values()),
+            "duplicates_by_channel": dict(self._suppressed)
+        }
+
+    def render_prometheus(self) -> str:
+        lines = prometheus_metric(
+            "webhook_duplicates_suppressed_total", "counter", "Repeated webhook deliveries that were not processed again",
+            [(prometheus_labels(channel=channel), count) for channel, count in sorted(self._suppressed.items())]
+        )
+        return "\n".join(lines) + "\n"
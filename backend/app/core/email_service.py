@@ -14,7 +14,7 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-from typing import Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from datetime import datetime, timedelta
 
 from app.agents.master_orchestrator import MasterOrchestrator
@@ -173,7 +173,8 @@ For urgent matters, please contact us directly.
         except Exception as e:
             logger.error(f"Error extracting email content: {e}")
         
-        return content.strip()
+        # Kept whole; quoted history and signatures are stripped when prompts are built
+        return content
 
     async def process_email(self, email_data: Dict) -> Dict:
         """
@@ -220,20 +221,27 @@ For urgent matters, please contact us directly.
             logger.error(f"Error processing email: {e}")
             return {"error": str(e)}
 
-    async def start_email_polling(self):
+    async def start_email_polling(self, deliver: Optional[Callable[[Dict], Awaitable[Any]]] = None):
         """
         Start continuous email polling in background
+        
+        Args:
+            deliver: Called with each fetched email (defaults to process_email)
         """
         logger.info("Starting email polling service...")
+        deliver = deliver or self.process_email
         
         while True:
             try:
                 # Fetch new emails
                 new_emails = self.fetch_new_emails()
                 
-                # Process each new email
+                # Hand over each new email; one failure must not lose the rest (they are already marked seen)
                 for email_data in new_emails:
-                    await self.process_email(email_data)
+                    try:
+                        await deliver(email_data)
+                    except Exception as e:
+                        logger.error(f"Error delivering email {email_data.get('message_id')}: {e}")
                 
                 # Wait before next poll
                 await asyncio.sleep(self.polling_interval)
@@ -0,0 +1,296 @@
+"""
+Job Queue - Durable in-process queue between webhook acknowledgement and message processing
+
+Webhooks store the parsed message in SQLite (WAL) and return at once; a pool
+of worker tasks drains the queue with bounded concurrency. A job is deleted
+once handled, retried with a delay when its handler raises, and kept as
+"failed" after the last attempt. Jobs that were queued or running when the
+process stopped are picked up again on the next start, so delivery is
+at-least-once. Workers take jobs in the order chosen by the PriorityScheduler
+(priority tier, SLA deadline, tenant/channel fairness, reserved high capacity).
+"""
+
+import asyncio
+import json
+import os
+import time
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable, Awaitable, List, Tuple
+
+import aiosqlite
+
+from app.core.job_scheduler import DEFAULT_PRIORITY, PriorityScheduler, SchedulerConfig
+from app.core.llm_metrics import LatencyHistogram, prometheus_histogram, prometheus_labels, prometheus_metric
+
+logger = logging.getLogger(__name__)
+
+# Waits range from immediate pickup to minutes of backlog
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+JobHandler = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+# (channel, payload) -> (priority, flow) for the scheduler
+JobPrioritizer = Callable[[str, Dict[str, Any]], Tuple[str, str]]
+# (channel, payload) -> conversation (None: no constraint). A conversation's pending jobs go to one
+# worker together and are handed to the handler concurrently; the handler orders them (KeyedExecutor)
+ConversationKey = Callable[[str, Dict[str, Any]], Optional[str]]
+
+def _default_prioritizer(channel: str, payload: Dict[str, Any]) -> Tuple[str, str]:
+    return DEFAULT_PRIORITY, channel
+
+class DurableJobQueue:
+    """SQLite-backed job queue drained by a fixed pool of asyncio workers"""
+
+    def __init__(self, handler: JobHandler, path: str, workers: int = 8, max_attempts: int = 3, retry_delay: float = 5.0,
+                 prioritize: Optional[JobPrioritizer] = None, scheduler_config: Optional[SchedulerConfig] = None,
+                 conversation_of: Optional[ConversationKey] = None):
+        self.handler = handler
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.prioritize = prioritize or _default_prioritizer
+        self.conversation_of = conversation_of
+        self.scheduler_config = scheduler_config or SchedulerConfig()
+
+        self._db: Optional[aiosqlite.Connection] = None
+        self._scheduler: Optional[PriorityScheduler] = None
+        # job id -> enqueue time (wall clock, so it survives restarts) for jobs waiting in memory
+        self._waiting: Dict[int, float] = {}
+        # job id -> (priority, flow, conversation) until the job is finished, so retries keep their place
+        self._keys: Dict[int, Tuple[str, str, Optional[str]]] = {}
+        # Payloads of jobs that could not be persisted (database unavailable)
+        self._volatile: Dict[int, Dict[str, Any]] = {}
+        self._next_volatile_id = -1
+        self._tasks: List[asyncio.Task] = []
+        self._start_lock = asyncio.Lock()
+        self._running = 0
+        self._stats: Counter = Counter()
+        self._wait: Dict[str, LatencyHistogram] = {}
+        self._processing: Dict[str, LatencyHistogram] = {}
+
+    @classmethod
+    def from_env(cls, handler: JobHandler, prioritize: Optional[JobPrioritizer] = None,
+                 conversation_of: Optional[ConversationKey] = None) -> "DurableJobQueue":
+        return cls(
+            handler,
+            path=os.getenv("JOB_QUEUE_PATH", "data/job_queue.db"),
+            workers=int(os.getenv("JOB_QUEUE_WORKERS", "8")),
+            max_attempts=int(os.getenv("JOB_QUEUE_MAX_ATTEMPTS", "3")),
+            retry_delay=float(os.getenv("JOB_QUEUE_RETRY_SECONDS", "5")),
+            prioritize=prioritize,
+            scheduler_config=SchedulerConfig.from_env(),
+            conversation_of=conversation_of
+        )
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        """Open the database, requeue unfinished jobs and start the workers"""
+        async with self._start_lock:
+            if self.started:
+                return
+            self._scheduler = PriorityScheduler(self.workers, self.scheduler_config)
+            try:
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                self._db = await aiosqlite.connect(self.path)
+                await self._db.execute("PRAGMA journal_mode=WAL")
+                # With WAL, NORMAL only risks the last commits on power loss, not corruption
+                await self._db.execute("PRAGMA synchronous=NORMAL")
+                await self._db.executescript(_SCHEMA)
+                # Jobs that were mid-processing when the process stopped run again
+                await self._db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+                await self._db.commit()
+                async with self._db.execute("SELECT id, channel, payload, enqueued_at FROM jobs WHERE status = 'queued' ORDER BY id") as cursor:
+                    for job_id, channel, payload, enqueued_at in await cursor.fetchall():
+                        self._keys[job_id] = self._key(channel, json.loads(payload))
+                        self._push(job_id, enqueued_at)
+                if self._waiting:
+                    logger.info(f"Job queue resumed {len(self._waiting)} unfinished jobs from {self.path}")
+            except Exception as e:
+                logger.error(f"Job queue database {self.path} unavailable, jobs will not survive a restart: {e}")
+                self._db = None
+            self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; unfinished jobs stay in the database for the next start"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    def _key(self, channel: str, payload: Dict[str, Any]) -> Tuple[str, str, Optional[str]]:
+        try:
+            priority, flow = self.prioritize(channel, payload)
+        except Exception as e:
+            logger.warning(f"Could not prioritize {channel} job: {e}")
+            priority, flow = DEFAULT_PRIORITY, channel
+        conversation = self.conversation_of(channel, payload) if self.conversation_of else None
+        return priority, flow, conversation
+
+    def _push(self, job_id: int, enqueued_at: float):
+        self._waiting[job_id] = enqueued_at
+        priority, flow, conversation = self._keys[job_id]
+        self._scheduler.put(job_id, priority, flow, enqueued_at, conversation)
+
+    async def enqueue(self, channel: str, payload: Dict[str, Any]) -> int:
+        """Persist a job and hand it to the workers; returns once it is durable"""
+        if not self.started:
+            await self.start()
+        key = self._key(channel, payload)
+        enqueued_at = time.time()
+        job_id = None
+        if self._db is not None:
+            try:
+                cursor = await self._db.execute(
+                    "INSERT INTO jobs (channel, payload, enqueued_at) VALUES (?, ?, ?)",
+                    (channel, json.dumps(payload), enqueued_at)
+                )
+                await self._db.commit()
+                job_id = cursor.lastrowid
+            except Exception as e:
+                self._stats["persist_errors"] += 1
+                logger.error(f"Could not persist {channel} job, keeping it in memory only: {e}")
+        if job_id is None:
+            job_id, self._next_volatile_id = self._next_volatile_id, self._next_volatile_id - 1
+            self._volatile[job_id] = {"channel": channel, "payload": payload, "attempts": 0}
+        self._stats["enqueued"] += 1
+        self._keys[job_id] = key
+        self._push(job_id, enqueued_at)
+        return job_id
+
+    async def _load(self, job_id: int) -> Optional[Dict[str, Any]]:
+        if job_id in self._volatile:
+            return self._volatile[job_id]
+        if self._db is None:
+            return None
+        async with self._db.execute("SELECT channel, payload, attempts FROM jobs WHERE id = ?", (job_id,)) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        await self._db.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1 WHERE id = ?", (job_id,))
+        await self._db.commit()
+        return {"channel": row[0], "payload": json.loads(row[1]), "attempts": row[2]}
+
+    async def _finish(self, job_id: int, error: Optional[str], attempts: int):
+        """Delete a handled job, requeue a failed one with a delay, or park it as failed"""
+        retry = error is not None and attempts < self.max_attempts
+        if job_id in self._volatile:
+            if error is None or not retry:
+                self._volatile.pop(job_id)
+            else:
+                self._volatile[job_id]["attempts"] = attempts
+        elif self._db is not None:
+            if error is None:
+                await self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            else:
+                await self._db.execute(
+                    "UPDATE jobs SET status = ?, last_error = ? WHERE id = ?",
+                    ("queued" if retry else "failed", error, job_id)
+                )
+            await self._db.commit()
+
+        if retry:
+            self._stats["retried"] += 1
+            asyncio.get_running_loop().call_later(self.retry_delay, self._push, job_id, time.time())
+        else:
+            self._keys.pop(job_id, None)
+
+    async def _worker(self, index: int):
+        while True:
+            batch = await self._scheduler.get()
+            try:
+                # One conversation's jobs, handed over together so the handler can order (or merge) them
+                await asyncio.gather(*(self._run(scheduled.job_id) for scheduled in batch))
+            finally:
+                self._scheduler.done(batch)
+
+    async def _run(self, job_id: int):
+        enqueued_at = self._waiting.pop(job_id, time.time())
+        try:
+            job = await self._load(job_id)
+        except Exception as e:
+            logger.error(f"Job {job_id} could not be loaded: {e}")
+            return
+        if job is None:
+            self._keys.pop(job_id, None)
+            return
+
+        channel = job["channel"]
+        self._wait.setdefault(channel, LatencyHistogram(WAIT_BUCKETS)).observe(max(0.0, time.time() - enqueued_at))
+        attempts = job["attempts"] + 1
+        self._running += 1
+        started = time.monotonic()
+        error = None
+        try:
+            await self.handler(channel, job["payload"])
+            self._stats["completed"] += 1
+        except asyncio.CancelledError:
+            # Shutdown: the job stays 'running' in the database and is requeued on start
+            raise
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            logger.warning(f"{channel} job {job_id} failed (attempt {attempts}/{self.max_attempts}): {error}")
+            if attempts >= self.max_attempts:
+                self._stats["failed"] += 1
+        finally:
+            self._running -= 1
+            self._processing.setdefault(channel, LatencyHistogram()).observe(time.monotonic() - started)
+        try:
+            await self._finish(job_id, error, attempts)
+        except Exception as e:
+            logger.error(f"Could not update job {job_id}: {e}")
+
+    def depth(self) -> int:
+        """Jobs waiting for a worker"""
+        return len(self._waiting)
+
+    def get_stats(self) -> Dict[str, Any]:
+        oldest = min(self._waiting.values(), default=None)
+        return {
+            "persistent": self._db is not None,
+            "path": self.path,
+            "workers": self.workers,
+            "depth": self.depth(),
+            "running": self._running,
+            "oldest_wait_seconds": round(time.time() - oldest, 3) if oldest is not None else 0.0,
+            **self._stats,
+            "wait": {channel: histogram.snapshot() for channel, histogram in self._wait.items()},
+            "processing": {channel: histogram.snapshot() for channel, histogram in self._processing.items()},
+            "scheduler": self._scheduler.get_stats() if self._scheduler is not None else None
+        }
+
+    def render_prometheus(self) -> str:
+        lines = prometheus_metric("job_queue_depth", "gauge", "Jobs waiting for a worker", [("", self.depth())])
+        lines += prometheus_metric("job_queue_running", "gauge", "Jobs being processed", [("", self._running)])
+        lines += prometheus_metric("job_queue_jobs_total", "counter", "Job queue events", [
+            (prometheus_labels(event=event), count) for event, count in sorted(self._stats.items())
+        ])
+        lines += prometheus_histogram("job_queue_wait_seconds", "Time from enqueue to pickup by a worker", [
+            (prometheus_labels(channel=channel), histogram) for channel, histogram in sorted(self._wait.items())
+        ])
+        lines += prometheus_histogram("job_queue_processing_seconds", "Time a worker spent on a job", [
+            (prometheus_labels(channel=channel), histogram) for channel, histogram in sorted(self._processing.items())
+        ])
+        if self._scheduler is not None:
+            lines += self._scheduler.render_prometheus()
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,212 @@
+"""
+Job Scheduler - Priority, SLA and fairness ordering for the webhook job queue
+
+Jobs are grouped by priority tier (high, medium, low) and, inside a tier, by
+flow (tenant/channel). The next job comes from the tier whose oldest job has
+the earliest SLA deadline (enqueue time + the tier's SLA), so fresh high
+priority work runs first while long-waiting low priority work still ages its
+way up. Flows inside a tier are served round-robin, so one busy tenant or
+channel cannot starve the others. A number of workers is reserved for the
+high tier: medium and low jobs never occupy more than the rest.
+
+Jobs of one conversation (chat / email sender) must run in order, so a worker
+takes all of a conversation's pending jobs together, and jobs that arrive
+while that conversation is running are held back until it is done. One busy
+chat therefore occupies one worker, never the whole pool.
+
+Priorities come from the fast local classifiers (trained model when it is
+confident, keyword rules otherwise), before any LLM call.
+"""
+
+import asyncio
+import json
+import os
+import time
+import logging
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Deque, List, Set, Tuple
+
+from app.core.keyword_classifier import get_keyword_classifier
+from app.core.llm_gateway import get_llm_gateway
+from app.core.llm_metrics import LatencyHistogram, prometheus_histogram, prometheus_labels, prometheus_metric
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("high", "medium", "low")
+DEFAULT_PRIORITY = "medium"
+
+# Same range as the queue's per-channel waits
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 1800.0)
+
+@dataclass
+class SchedulerConfig:
+    sla_seconds: Dict[str, float] = field(default_factory=lambda: {"high": 60.0, "medium": 300.0, "low": 1800.0})
+    reserved_high: int = 2           # workers that only take high priority jobs
+
+    @classmethod
+    def from_env(cls) -> "SchedulerConfig":
+        config = cls(reserved_high=int(os.getenv("JOB_QUEUE_RESERVED_HIGH_WORKERS", "2")))
+        try:
+            overrides = json.loads(os.getenv("JOB_QUEUE_SLA_SECONDS", "{}"))
+            config.sla_seconds.update({priority: float(seconds) for priority, seconds in overrides.items() if priority in PRIORITIES})
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.error(f"Ignoring invalid JOB_QUEUE_SLA_SECONDS: {e}")
+        return config
+
+def message_priority(message: Dict[str, Any]) -> str:
+    """Priority guess from the local classifiers; no LLM call"""
+    text = message.get("content") or ""
+    guess = get_llm_gateway().local_classifier.guess(text)
+    if guess is not None:
+        return guess["priority"]
+    return get_keyword_classifier().classify(text).values.get("priority", DEFAULT_PRIORITY)
+
+def message_schedule_key(channel: str, message: Dict[str, Any]) -> Tuple[str, str]:
+    """(priority, flow) of a parsed channel message"""
+    tenant_id = message.get("tenant_id") or "default"
+    return message_priority(message), f"{tenant_id}/{channel}"
+
+class ScheduledJob:
+    __slots__ = ("job_id", "priority", "flow", "conversation", "enqueued_at", "deadline", "taken")
+
+    def __init__(self, job_id: int, priority: str, flow: str, conversation: Optional[str], enqueued_at: float, deadline: float):
+        self.job_id = job_id
+        self.priority = priority
+        self.flow = flow
+        self.conversation = conversation
+        self.enqueued_at = enqueued_at
+        self.deadline = deadline
+        # Started with an earlier job of its conversation; skipped when it reaches the head of its flow
+        self.taken = False
+
+class PriorityScheduler:
+    """Earliest-deadline tier, round-robin flows, reserved high priority capacity"""
+
+    def __init__(self, workers: int, config: SchedulerConfig):
+        self.workers = workers
+        self.config = config
+        # Medium and low jobs may use every worker but the reserved ones (at least one)
+        self.shared_capacity = max(1, workers - config.reserved_high)
+        self._tiers: Dict[str, "OrderedDict[str, Deque[ScheduledJob]]"] = {priority: OrderedDict() for priority in PRIORITIES}
+        self._depth: Counter = Counter()
+        self._running: Counter = Counter()
+        # conversation -> its jobs waiting in the tiers / held back while it is running
+        self._pending: Dict[str, List[ScheduledJob]] = {}
+        self._held: Dict[str, List[ScheduledJob]] = {}
+        self._busy: Set[str] = set()
+        self._wake = asyncio.Event()
+        self._stats: Counter = Counter()
+        self._wait: Dict[str, LatencyHistogram] = {}
+
+    def put(self, job_id: int, priority: str, flow: str, enqueued_at: float, conversation: Optional[str] = None):
+        if priority not in self._tiers:
+            priority = DEFAULT_PRIORITY
+        deadline = enqueued_at + self.config.sla_seconds.get(priority, 0.0)
+        self._depth[priority] += 1
+        self._insert(ScheduledJob(job_id, priority, flow, conversation, enqueued_at, deadline))
+
+    def _insert(self, job: ScheduledJob):
+        if job.conversation is not None:
+            if job.conversation in self._busy:
+                self._held.setdefault(job.conversation, []).append(job)
+                return
+            self._pending.setdefault(job.conversation, []).append(job)
+        self._tiers[job.priority].setdefault(job.flow, deque()).append(job)
+        self._wake.set()
+
+    def _pick(self) -> Optional[ScheduledJob]:
+        while True:
+            shared_busy = sum(count for priority, count in self._running.items() if priority != "high")
+            best, best_deadline = None, None
+            for priority, flows in self._tiers.items():
+                if not flows or (priority != "high" and shared_busy >= self.shared_capacity):
+                    continue
+                deadline = min(queue[0].deadline for queue in flows.values())
+                if best_deadline is None or deadline < best_deadline:
+                    best, best_deadline = priority, deadline
+            if best is None:
+                return None
+
+            # Serve the tier's next flow and move it to the back of the rotation
+            flows = self._tiers[best]
+            flow, queue = flows.popitem(last=False)
+            job = queue.popleft()
+            if queue:
+                flows[flow] = queue
+            if not job.taken:
+                return job
+
+    async def get(self) -> List[ScheduledJob]:
+        """
+        Wait for the next job this scheduler allows to run, together with the other
+        pending jobs of its conversation (in arrival order); pair with `done()`
+        """
+        while True:
+            job = self._pick()
+            if job is not None:
+                break
+            self._wake.clear()
+            await self._wake.wait()
+
+        batch = [job]
+        if job.conversation is not None:
+            batch = self._pending.pop(job.conversation)
+            for other in batch:
+                other.taken = True
+            self._busy.add(job.conversation)
+
+        # done() releases the same slot
+        self._running[batch[0].priority] += 1
+        now = time.time()
+        for started in batch:
+            self._depth[started.priority] -= 1
+            self._wait.setdefault(started.priority, LatencyHistogram(WAIT_BUCKETS)).observe(max(0.0, now - started.enqueued_at))
+            self._stats[(started.priority, "started")] += 1
+            if now > started.deadline:
+                self._stats[(started.priority, "sla_missed")] += 1
+        # Another idle worker may be able to take the next job
+        if any(self._tiers.values()):
+            self._wake.set()
+        return batch
+
+    def done(self, batch: List[ScheduledJob]):
+        self._running[batch[0].priority] -= 1
+        conversation = batch[0].conversation
+        if conversation is not None:
+            self._busy.discard(conversation)
+            # Jobs that arrived meanwhile are scheduled again, keeping their deadlines
+            for job in self._held.pop(conversation, []):
+                self._insert(job)
+        self._wake.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "reserved_high_workers": self.workers - self.shared_capacity,
+            "busy_conversations": len(self._busy),
+            "held_back": sum(len(jobs) for jobs in self._held.values()),
+            "sla_seconds": self.config.sla_seconds,
+            "priorities": {
+                priority: {
+                    "depth": self._depth[priority],
+                    "running": self._running[priority],
+                    "flows": len(self._tiers[priority]),
+                    "started": self._stats[(priority, "started")],
+                    "sla_missed": self._stats[(priority, "sla_missed")],
+                    "wait": self._wait[priority].snapshot() if priority in self._wait else None
+                }
+                for priority in PRIORITIES
+            }
+        }
+
+    def render_prometheus(self) -> List[str]:
+        lines = prometheus_metric("job_queue_priority_depth", "gauge", "Jobs waiting for a worker per priority", [
+            (prometheus_labels(priority=priority), self._depth[priority]) for priority in PRIORITIES
+        ])
+        lines += prometheus_metric("job_queue_sla_missed_total", "counter", "Jobs started after their SLA deadline", [
+            (prometheus_labels(priority=priority), self._stats[(priority, "sla_missed")]) for priority in PRIORITIES
+        ])
+        lines += prometheus_histogram("job_queue_priority_wait_seconds", "Time from enqueue to pickup per priority", [
+            (prometheus_labels(priority=priority), self._wait[priority]) for priority in PRIORITIES if priority in self._wait
+        ])
+        return lines
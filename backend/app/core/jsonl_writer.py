@@ -0,0 +1,85 @@
+"""
+JSONL Writer - Write-behind appender for diagnostic logs
+
+Rows are buffered in memory and appended to the file in batches from a worker
+thread, so logging never blocks the event loop. The flush loop starts with the
+first row written from a running loop; `stop()` writes what is left. When the
+disk cannot keep up the oldest buffered rows are dropped and counted. With
+`max_bytes`, a file that would grow past it is renamed to `<path>.1`
+(replacing the previous one) and a new file is started.
+"""
+
+import asyncio
+import json
+import os
+import logging
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+class BufferedJsonlWriter:
+    """Appends JSON rows to a file in batches, off the event loop"""
+
+    def __init__(self, path: str, flush_interval: float = 2.0, max_pending: int = 10000, max_bytes: int = 0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_bytes = max_bytes  # 0 = no limit
+
+        self._pending: List[str] = []
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stats = {"written": 0, "dropped": 0, "write_errors": 0, "rotations": 0}
+
+    def write(self, record: Dict[str, Any]):
+        self._pending.append(json.dumps(record, ensure_ascii=False) + "\n")
+        if len(self._pending) > self.max_pending:
+            del self._pending[0]
+            self._stats["dropped"] += 1
+        if self._task is None:
+            try:
+                self._task = asyncio.get_running_loop().create_task(self._run())
+            except RuntimeError:
+                pass  # no loop (scripts); rows are written by the next flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._append, batch)
+            except OSError as e:
+                self._stats["write_errors"] += 1
+                self._stats["dropped"] += len(batch)
+                logger.warning(f"Could not write {len(batch)} rows to {self.path}: {e}")
+                return
+            self._stats["written"] += len(batch)
+
+    def _append(self, lines: List[str]):
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        if self.max_bytes and os.path.exists(self.path):
+            size = sum(len(line.encode("utf-8")) for line in lines)
+            if os.path.getsize(self.path) + size > self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+                self._stats["rotations"] += 1
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "max_bytes": self.max_bytes, "pending": len(self._pending), **self._stats}
@@ -0,0 +1,115 @@
+"""
+Keyed Executor - Sequential work per key, parallel across keys
+
+Each key (one conversation: a Telegram chat or an email sender) gets a lane
+that runs its items one batch at a time, in `order` (arrival time), while
+lanes of different keys run concurrently. A lane exists only while it has
+work, so memory is bounded by the number of active conversations.
+
+With merging enabled, a lane waits up to `merge_window` after its oldest
+item arrived and hands up to `max_batch` queued items to one run; every
+caller of that batch gets the same result.
+"""
+
+import asyncio
+import bisect
+import itertools
+import time
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+BatchRunner = Callable[[str, List[Any]], Awaitable[Any]]
+
+class _Entry:
+    __slots__ = ("order", "seq", "item", "future", "submitted")
+
+    def __init__(self, order: float, seq: int, item: Any, future: asyncio.Future):
+        self.order = order
+        self.seq = seq
+        self.item = item
+        self.future = future
+        self.submitted = time.monotonic()
+
+    def sort_key(self):
+        return (self.order, self.seq)
+
+class _Lane:
+    __slots__ = ("pending", "task")
+
+    def __init__(self):
+        self.pending: List[_Entry] = []
+        self.task = None
+
+class KeyedExecutor:
+    """Runs batches for the same key one after another, different keys concurrently"""
+
+    def __init__(self, run: BatchRunner, merge_window: float = 0.0, max_batch: int = 1):
+        self.run = run
+        self.merge_window = merge_window
+        self.max_batch = max(1, max_batch)
+        self._lanes: Dict[str, _Lane] = {}
+        self._seq = itertools.count()
+        self._stats: Counter = Counter()
+
+    @property
+    def merging(self) -> bool:
+        return self.max_batch > 1
+
+    async def submit(self, key: str, item: Any, order: float = 0.0) -> Any:
+        """Queue an item on its key's lane and wait for the result of the batch it ran in"""
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane()
+        entry = _Entry(order, next(self._seq), item, asyncio.get_running_loop().create_future())
+        # Items picked up out of order (parallel queue workers) still run in arrival order
+        keys = [pending.sort_key() for pending in lane.pending]
+        lane.pending.insert(bisect.bisect(keys, entry.sort_key()), entry)
+        self._stats["submitted"] += 1
+        if lane.task is None:
+            lane.task = asyncio.create_task(self._drain(key, lane))
+        else:
+            self._stats["queued_behind"] += 1
+        return await entry.future
+
+    async def _drain(self, key: str, lane: _Lane):
+        batch: List[_Entry] = []
+        try:
+            while lane.pending:
+                if self.merging and self.merge_window > 0:
+                    delay = lane.pending[0].submitted + self.merge_window - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                batch = lane.pending[:self.max_batch]
+                del lane.pending[:len(batch)]
+                self._stats["batches"] += 1
+                self._stats["merged"] += len(batch) - 1
+                try:
+                    result = await self.run(key, [entry.item for entry in batch])
+                except Exception as e:
+                    for entry in batch:
+                        if not entry.future.done():
+                            entry.future.set_exception(e)
+                else:
+                    for entry in batch:
+                        if not entry.future.done():
+                            entry.future.set_result(result)
+                batch = []
+        finally:
+            # Cancelled (shutdown): nobody will run what is left
+            for entry in batch + lane.pending:
+                if not entry.future.done():
+                    entry.future.cancel()
+            if self._lanes.get(key) is lane:
+                del self._lanes[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "active_keys": len(self._lanes),
+            "pending": sum(len(lane.pending) for lane in self._lanes.values()),
+            "merge_window_ms": round(self.merge_window * 1000) if self.merging else None,
+            "max_batch": self.max_batch,
+            **self._stats
+        }
@@ -0,0 +1,194 @@
+"""
+Keyword Classifier - Compiled single-pass keyword engine for local classification
+
+Rules are loaded from a JSON file (app/data/keyword_rules.json by default) and
+compiled once into an Aho-Corasick automaton. Each field (priority, category, ...) has an
+ordered rule list; the first matching rule sets the field, and every matching
+rule is reported.
+"""
+
+import json
+import os
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Set, FrozenSet, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = Path(__file__).resolve().parent.parent / "data" / "keyword_rules.json"
+CLASSIFICATION_FIELDS = ("priority", "category", "sentiment")
+
+# Distinct words whose matches are remembered; the table is cleared when full
+MAX_CACHED_TOKENS = 50000
+
+class _KeywordAutomaton:
+    """Aho-Corasick automaton: every pattern occurring in a string, in one pass over it"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        outputs: List[Set[str]] = [set()]
+        for pattern in patterns:
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    outputs.append(set())
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            outputs[state].add(pattern)
+
+        # Breadth-first: each state fails to the longest proper suffix that is also a state
+        self._fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                outputs[child] |= outputs[self._fail[child]]
+                queue.append(child)
+        self._outputs = [frozenset(output) for output in outputs]
+
+    def scan(self, text: str) -> Tuple[Set[str], FrozenSet[str]]:
+        """(patterns occurring anywhere in text, patterns that end exactly at its end)"""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        found: Set[str] = set()
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                found |= outputs[state]
+        return found, outputs[state]
+
+@dataclass(frozen=True)
+class KeywordRule:
+    name: str
+    field: str
+    value: str
+    any_of: FrozenSet[str] = frozenset()
+    all_of: FrozenSet[str] = frozenset()
+
+    def matches(self, keywords: Set[str]) -> bool:
+        if self.all_of and not self.all_of <= keywords:
+            return False
+        if self.any_of and self.any_of.isdisjoint(keywords):
+            return False
+        return bool(self.all_of or self.any_of)
+
+@dataclass
+class KeywordMatch:
+    """Result of one scan: field values plus every rule and keyword that matched"""
+    values: Dict[str, str]
+    matched_rules: List[str] = field(default_factory=list)
+    keywords: Set[str] = field(default_factory=set)
+
+    @property
+    def classification(self) -> Dict[str, str]:
+        return {name: self.values[name] for name in CLASSIFICATION_FIELDS}
+
+class KeywordClassifier:
+    """
+    Finds every keyword of every rule in one pass over the text.
+
+    Keywords are substrings (as with `keyword in text`), so matches may overlap.
+    A keyword without whitespace always lies inside one whitespace-separated
+    word, so the text is split once and each distinct word is run through an
+    Aho-Corasick automaton of all keywords; the keywords found in a word are
+    cached, and common words cost one dict lookup. A keyword with spaces
+    ("charged twice") can only occur where a word ends with its first word, which
+    the same scan reports; only those candidates are confirmed against the text.
+    """
+
+    def __init__(self, rules: Iterable[KeywordRule], defaults: Dict[str, str]):
+        self.rules = list(rules)
+        self.defaults = dict(defaults)
+        self.fields = list(dict.fromkeys([*self.defaults, *(rule.field for rule in self.rules)]))
+
+        self.keywords = frozenset(keyword for rule in self.rules for keyword in rule.any_of | rule.all_of)
+        self._words = frozenset(keyword for keyword in self.keywords if len(keyword.split()) == 1 and keyword == keyword.strip())
+        # first word -> keywords with spaces that start with it ("" when one starts with a space)
+        self._phrases: Dict[str, Set[str]] = {}
+        for keyword in self.keywords - self._words:
+            head = keyword.split()[0] if keyword.strip() and not keyword[0].isspace() else ""
+            self._phrases.setdefault(head, set()).add(keyword)
+        self._automaton = _KeywordAutomaton(self._words | (self._phrases.keys() - {""}))
+        # word -> (keywords in it, keywords with spaces that may start at its end), and the
+        # words known to hold neither; most words are in the second, set-difference-only table
+        self._tokens: Dict[str, Tuple[FrozenSet[str], FrozenSet[str]]] = {}
+        self._plain: Set[str] = set()
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "KeywordClassifier":
+        path = Path(path) if path else DEFAULT_RULES_PATH
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+
+        rules = []
+        for field_name, field_rules in config["rules"].items():
+            for rule in field_rules:
+                rules.append(KeywordRule(
+                    name=rule["name"],
+                    field=field_name,
+                    value=rule["value"],
+                    any_of=frozenset(keyword.lower() for keyword in rule.get("any", [])),
+                    all_of=frozenset(keyword.lower() for keyword in rule.get("all", []))
+                ))
+
+        classifier = cls(rules, config.get("defaults", {}))
+        logger.info(f"Keyword classifier compiled {len(rules)} rules ({len(classifier.keywords)} keywords) from {path}")
+        return classifier
+
+    def find_keywords(self, text: str) -> Set[str]:
+        """All rule keywords that occur in the text (case-insensitive)"""
+        if not self.keywords:
+            return set()
+        text = text.lower()
+        found: Set[str] = set()
+        candidates: Set[str] = set(self._phrases.get("", ()))
+        tokens = self._tokens
+        for token in set(text.split()) - self._plain:
+            matches = tokens.get(token)
+            if matches is None:
+                matches = self._scan_token(token)
+                if not (matches[0] or matches[1]):
+                    if len(self._plain) >= MAX_CACHED_TOKENS:
+                        self._plain.clear()
+                    self._plain.add(token)
+                    continue
+                if len(tokens) >= MAX_CACHED_TOKENS:
+                    tokens.clear()
+                tokens[token] = matches
+            found |= matches[0]
+            candidates |= matches[1]
+        found.update(phrase for phrase in candidates if phrase in text)
+        return found
+
+    def _scan_token(self, token: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        occurring, at_end = self._automaton.scan(token)
+        phrases = frozenset(phrase for head in at_end for phrase in self._phrases.get(head, ()))
+        return frozenset(occurring & self._words), phrases
+
+    def classify(self, text: str) -> KeywordMatch:
+        keywords = self.find_keywords(text)
+        result = KeywordMatch(values=dict(self.defaults), keywords=keywords)
+        decided: Set[str] = set()
+
+        for rule in self.rules:
+            if not rule.matches(keywords):
+                continue
+            result.matched_rules.append(rule.name)
+            if rule.field not in decided:
+                result.values[rule.field] = rule.value
+                decided.add(rule.field)
+
+        return result
+
+@lru_cache(maxsize=1)
+def get_keyword_classifier() -> KeywordClassifier:
+    """Process-wide classifier, compiled once (rules path from KEYWORD_RULES_PATH)"""
+    return KeywordClassifier.from_file(os.getenv("KEYWORD_RULES_PATH"))
@@ -0,0 +1,268 @@
+"""
+LLM Cassette - Record upstream answers once, replay them offline with synthetic latency
+
+LLM_CASSETTE_MODE=record wraps every provider so each answered prompt is
+appended to a gzipped JSONL cassette. LLM_CASSETTE_MODE=replay serves answers
+from that cassette without touching the network, after a delay drawn from
+LLM_CASSETTE_LATENCY. Replay makes load tests repeatable: the same traffic gets
+the same answers and the same latency distribution on every run.
+
+Latency specs (milliseconds), either one for all providers or a JSON object
+per provider name, e.g. {"mistral": "lognormal:900,0.4", "ollama": "fixed:40"}:
+
+    recorded[:SCALE]           the latency seen while recording, times SCALE (default)
+    fixed:MS
+    uniform:MIN,MAX
+    lognormal:MEDIAN,SIGMA
+    none
+
+Prompts are matched after ticket numbers are masked. A prompt that was never
+recorded gets a deterministic pick among the same model's answers, or an error
+with LLM_CASSETTE_ON_MISS=error.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+import logging
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Dict, Any, AsyncIterator, List, Union, Callable
+
+from app.core.llm_providers import LLMProvider, LLMResponse
+
+logger = logging.getLogger(__name__)
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+_TICKET_ID = re.compile(r"TICKET_\w+")
+
+class CassetteMiss(Exception):
+    """Replay found no recorded answer for a prompt"""
+
+def cassette_key(provider: str, model: str, prompt: str) -> str:
+    normalized = _TICKET_ID.sub("TICKET", prompt)
+    return hashlib.sha256(f"{provider}\0{model}\0{normalized}".encode("utf-8")).hexdigest()[:24]
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[Optional[float]], float]:
+    """Latency spec -> function(recorded seconds or None) -> seconds to wait"""
+    kind, _, args = spec.strip().lower().partition(":")
+    values = [float(value) for value in args.split(",") if value.strip()]
+    if kind == "none":
+        return lambda recorded: 0.0
+    if kind == "recorded":
+        scale = values[0] if values else 1.0
+        return lambda recorded: (recorded or 0.0) * scale
+    if kind == "fixed" and len(values) == 1:
+        return lambda recorded: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda recorded: rng.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal" and len(values) == 2:
+        return lambda recorded: rng.lognormvariate(math.log(values[0]), values[1]) / 1000
+    raise ValueError(f"invalid latency spec {spec!r}")
+
+@dataclass
+class CassetteConfig:
+    mode: str = MODE_OFF
+    path: str = "data/llm_cassette.jsonl.gz"
+    latency: Dict[str, str] = field(default_factory=lambda: {"*": "recorded"})
+    on_miss: str = "any"             # "any" (a recorded answer of the same model) or "error"
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "CassetteConfig":
+        mode = os.getenv("LLM_CASSETTE_MODE", MODE_OFF).lower()
+        latency = os.getenv("LLM_CASSETTE_LATENCY", "recorded").strip()
+        seed = os.getenv("LLM_CASSETTE_SEED")
+        return cls(
+            mode=mode if mode in (MODE_RECORD, MODE_REPLAY) else MODE_OFF,
+            path=os.getenv("LLM_CASSETTE_PATH", "data/llm_cassette.jsonl.gz"),
+            latency=json.loads(latency) if latency.startswith("{") else {"*": latency},
+            on_miss=os.getenv("LLM_CASSETTE_ON_MISS", "any").lower(),
+            seed=int(seed) if seed else None
+        )
+
+class Cassette:
+    """Recorded answers keyed by provider/model/prompt, stored as gzipped JSONL"""
+
+    def __init__(self, config: CassetteConfig):
+        self.config = config
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.by_model: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._writer = None
+        self._stats: Counter = Counter()
+        rng = random.Random(config.seed)
+        self._latency = {provider: parse_latency(spec, rng) for provider, spec in config.latency.items()}
+        self._load()
+        if config.mode == MODE_RECORD:
+            Path(config.path).parent.mkdir(parents=True, exist_ok=True)
+            # Appending a new gzip member keeps earlier recordings readable
+            self._writer = gzip.open(config.path, "at", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.config.path):
+            if self.config.mode == MODE_REPLAY:
+                logger.error(f"Cassette {self.config.path} not found; every replayed call will miss")
+            return
+        with gzip.open(self.config.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._add(json.loads(line))
+        logger.info(f"Loaded {len(self.entries)} recorded LLM answers from {self.config.path}")
+
+    def _add(self, entry: Dict[str, Any]):
+        if entry["key"] not in self.entries:
+            self.entries[entry["key"]] = entry
+            self.by_model[f"{entry['provider']}/{entry['model']}"].append(entry)
+
+    def record(self, provider: str, model: str, prompt: str, response: LLMResponse,
+               latency: float, ttfb: Optional[float] = None):
+        key = cassette_key(provider, model, prompt)
+        if key in self.entries or not response.success:
+            return
+        entry = {
+            "key": key,
+            "provider": provider,
+            "model": model,
+            "content": response.content,
+            "tokens": response.tokens_used,
+            "cost_usd": response.cost_usd,
+            "latency": round(latency, 4),
+            "ttfb": round(ttfb, 4) if ttfb is not None else None
+        }
+        self._add(entry)
+        self._writer.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._writer.flush()
+        self._stats["recorded"] += 1
+
+    def lookup(self, provider: str, model: str, prompt: str) -> Dict[str, Any]:
+        key = cassette_key(provider, model, prompt)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self._stats["hits"] += 1
+            return entry
+        candidates = self.by_model.get(f"{provider}/{model}")
+        if self.config.on_miss == "error" or not candidates:
+            self._stats["misses"] += 1
+            raise CassetteMiss(f"no recorded {provider}/{model} answer for this prompt")
+        # Same prompt, same pick: runs stay comparable even with unrecorded prompts
+        self._stats["substituted"] += 1
+        return candidates[int(key, 16) % len(candidates)]
+
+    def delay(self, provider: str, entry: Dict[str, Any]) -> float:
+        latency = self._latency.get(provider) or self._latency.get("*") or (lambda recorded: recorded or 0.0)
+        return max(0.0, latency(entry.get("latency")))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.config.mode,
+            "path": self.config.path,
+            "entries": len(self.entries),
+            "latency": self.config.latency,
+            **self._stats
+        }
+
+class CassetteProvider(LLMProvider):
+    """Wraps a provider to record its answers, or to replay them instead of calling it"""
+
+    def __init__(self, inner: LLMProvider, cassette: Cassette):
+        super().__init__(inner.base_url, inner.api_key, inner.pool)
+        self.inner = inner
+        self.cassette = cassette
+        self.name = inner.name
+        self.default_timeout = inner.default_timeout
+        self.replaying = cassette.config.mode == MODE_REPLAY
+        self.supports_warmup = inner.supports_warmup
+
+    @property
+    def client(self):
+        return self.inner.client
+
+    def cost(self, model: str, tokens: int) -> float:
+        return self.inner.cost(model, tokens)
+
+    async def warm_up(self, model: str, timeout: float) -> float:
+        return 0.0 if self.replaying else await self.inner.warm_up(model, timeout)
+
+    def _response(self, model: str, prompt: str, entry: Dict[str, Any]) -> LLMResponse:
+        return LLMResponse(
+            content=self._content(prompt, entry),
+            model_used=model,
+            provider=self.name,
+            tokens_used=entry["tokens"],
+            cost_usd=entry["cost_usd"],
+            success=True
+        )
+
+    @staticmethod
+    def _content(prompt: str, entry: Dict[str, Any]) -> str:
+        """Recorded answer with the recorded ticket number replaced by this prompt's"""
+        ticket = _TICKET_ID.search(prompt)
+        return _TICKET_ID.sub(ticket.group(), entry["content"]) if ticket else entry["content"]
+
+    async def complete(self, model: str, prompt: str, timeout: float) -> LLMResponse:
+        self.requests += 1
+        if self.replaying:
+            entry = self.cassette.lookup(self.name, model, prompt)
+            await asyncio.sleep(self.cassette.delay(self.name, entry))
+            return self._response(model, prompt, entry)
+
+        started = time.monotonic()
+        response = await self.inner.complete(model, prompt, timeout)
+        self.cassette.record(self.name, model, prompt, response, time.monotonic() - started)
+        return response
+
+    async def stream(self, model: str, prompt: str, timeout: float) -> AsyncIterator[Union[str, LLMResponse]]:
+        self.requests += 1
+        if self.replaying:
+            entry = self.cassette.lookup(self.name, model, prompt)
+            total = self.cassette.delay(self.name, entry)
+            # Keep the recorded share of time before the first chunk (a quarter if unknown)
+            share = entry["ttfb"] / entry["latency"] if entry.get("ttfb") and entry.get("latency") else 0.25
+            words = self._content(prompt, entry).split(" ")
+            chunks = [" ".join(words[start:start + 4]) + " " for start in range(0, len(words), 4)]
+            chunks[-1] = chunks[-1][:-1]
+            await asyncio.sleep(total * share)
+            for chunk in chunks:
+                yield chunk
+                await asyncio.sleep(total * (1 - share) / len(chunks))
+            yield self._response(model, prompt, entry)
+            return
+
+        started, first_chunk = time.monotonic(), None
+        async for event in self.inner.stream(model, prompt, timeout):
+            if isinstance(event, LLMResponse):
+                self.cassette.record(self.name, model, prompt, event, time.monotonic() - started, first_chunk)
+            elif first_chunk is None:
+                first_chunk = time.monotonic() - started
+            yield event
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return self.inner.pool_stats()
+
+def wrap_providers(providers: Dict[str, LLMProvider], config: CassetteConfig) -> Optional[Cassette]:
+    """Wrap every provider in place for record/replay; returns the cassette (None when off)"""
+    if config.mode == MODE_OFF:
+        return None
+    cassette = Cassette(config)
+    for name, provider in providers.items():
+        providers[name] = CassetteProvider(provider, cassette)
+    logger.warning(f"LLM cassette {config.mode} mode active ({config.path})")
+    return cassette
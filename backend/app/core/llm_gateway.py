@@ -4,130 +4,738 @@ LLM Gateway - Handles multiple AI providers
 
 import json
 import os
+import asyncio
+import random
+import re
 import httpx
 import logging
-from enum import Enum
+import time
 from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator, List, Union
 
-import os
-import asyncio
-import httpx
-from typing import Dict, Optional
-from dataclasses import dataclass
-from enum import Enum
-import logging
+from app.core.call_metrics import get_call_metrics
+from app.core.circuit_breaker import BreakerState, CircuitBreaker
+from app.core.classification_cache import ClassificationCache, normalize_text
+from app.core.cost_ledger import BUDGET_DOWNGRADE, BUDGET_EXHAUSTED, BUDGET_OK, CostLedger
+from app.core.keyword_classifier import get_keyword_classifier
+from app.core.llm_cassette import CassetteConfig, wrap_providers
+from app.core.llm_metrics import LatencyHistogram
+from app.core.llm_providers import (
+    LLMProvider, LLMResponse, ModelProvider, load_provider_plugins, registered_providers
+)
+from app.core.local_classifier import LABELS, LocalPreClassifier
+from app.core.micro_batcher import MicroBatcher
+from app.core.model_chains import ChainHop, load_chains
+from app.core.model_router import ModelRouter, RouteDecision, RoutingPolicy
+from app.core.model_warmup import ModelWarmer, WarmupConfig
+from app.core.prompt_builder import estimate_tokens, get_prompt_builder
+from app.core.rate_limiter import AdmissionController, AdmissionTimeout
+from app.core.request_coalescer import RequestCoalescer, coalescing_key
+from app.core.response_cache import ReplyScope, ResponseTemplateCache
 
 logger = logging.getLogger(__name__)
 
-class ModelProvider(Enum):
-    MISTRAL = "mistral"
-    OLLAMA = "ollama"
+def parse_json_object(text: str) -> Optional[Dict]:
+    """Parse the first JSON object in an LLM answer, tolerating code fences and prose"""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        match = re.search(r"\{.*\}", text or "", re.DOTALL)
+        if not match:
+            return None
+        try:
+            data = json.loads(match.group())
+        except ValueError:
+            return None
+    return data if isinstance(data, dict) else None
+
+class LLMStream:
+    """
+    Async iterator over generated text chunks.
+    
+    Once iteration finishes, `response` holds the complete LLMResponse
+    (full content, model, provider and token usage).
+    """
+    
+    def __init__(self, events: AsyncIterator[Union[str, LLMResponse]]):
+        self._events = events
+        self.response: Optional[LLMResponse] = None
+    
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._iterate()
+    
+    async def _iterate(self) -> AsyncIterator[str]:
+        async for event in self._events:
+            if isinstance(event, LLMResponse):
+                self.response = event
+            else:
+                yield event
 
 @dataclass
-class LLMResponse:
-    content: str
-    model_used: str
-    provider: ModelProvider
-    tokens_used: int
-    cost_usd: float
-    success: bool
-    error: Optional[str] = None
+class HedgePolicy:
+    """When to fire a duplicate request at the fallback provider"""
+    enabled: bool = False
+    percentile: float = 0.9         # hedge once the primary is slower than this share of recent calls
+    min_samples: int = 20           # below this, use default_delay instead of the percentile
+    default_delay: float = 2.0
+    min_delay: float = 0.25
+    max_delay: float = 10.0
+
+    @classmethod
+    def from_env(cls) -> "HedgePolicy":
+        return cls(
+            enabled=os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true",
+            percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9")),
+            min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+            default_delay=float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_MS", "2000")) / 1000,
+            min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "250")) / 1000,
+            max_delay=float(os.getenv("LLM_HEDGE_MAX_DELAY_MS", "10000")) / 1000
+        )
 
 class LLMGateway:
     def __init__(self):
-        self.mistral_api_key = os.getenv("MISTRAL_API_KEY")
-        self.ollama_url = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")  # Use container name
+        # One instance per registered provider class, each with its own pooled client
+        load_provider_plugins()
+        self.providers: Dict[str, LLMProvider] = {
+            name: provider_class.from_env() for name, provider_class in registered_providers().items()
+        }
+        # Record/replay of upstream answers for offline load tests (LLM_CASSETTE_MODE)
+        self.cassette = wrap_providers(self.providers, CassetteConfig.from_env())
+        
+        # Ordered provider/model hops per task, each with its own timeout
+        self.chains: Dict[str, List[ChainHop]] = {}
+        for task, hops in load_chains().items():
+            known = [hop for hop in hops if hop.provider in self.providers]
+            for hop in hops:
+                if hop.provider not in self.providers:
+                    logger.error(f"Chain for {task} names unknown provider {hop.provider}; hop skipped")
+            self.chains[task] = known
         
-        self.model_config = {
-            "classification": {
-                "primary": {"provider": ModelProvider.MISTRAL, "model": "mistral-small"},
-                "fallback": {"provider": ModelProvider.OLLAMA, "model": "llama3.2:1b"}  # Use available model
+        # Per-request choice of the first hop from prompt size, priority and provider load
+        self.router = ModelRouter(RoutingPolicy.from_env())
+        
+        # Models loaded on demand (Ollama) are preloaded at startup and kept resident
+        self.warmer = ModelWarmer(
+            self.providers,
+            [hop for hops in self.chains.values() for hop in hops]
+            + [tier for tier in (self.router.policy.small, self.router.policy.large) if tier],
+            WarmupConfig.from_env()
+        )
+        
+        # While a provider's breaker is open, calls skip straight to the next hop
+        self.breakers = {name: CircuitBreaker(name) for name in self.providers}
+        
+        # Bounds concurrent calls and request/token rates per provider and model
+        self.admission = AdmissionController.from_env(list(self.providers))
+        
+        # Per-stage timing, tokens and cost per provider/model/task (exported on /metrics)
+        self.call_metrics = get_call_metrics()
+        
+        # Recent latency per provider drives the adaptive hedge delay
+        self.latency = {name: LatencyHistogram() for name in self.providers}
+        self.hedge_policy = HedgePolicy.from_env()
+        self._hedge_stats = {"hedged_calls": 0, "hedges_fired": 0, "fallback_wins": 0, "primary_wins": 0}
+        
+        # Compiled once; serves the no-provider fallback
+        self.keyword_classifier = get_keyword_classifier()
+        
+        # Repeated messages ("reset password") skip the classification round trip
+        self.classification_cache = (
+            ClassificationCache.from_env()
+            if os.getenv("CLASSIFICATION_CACHE_ENABLED", "true").lower() == "true"
+            else None
+        )
+        
+        # Hashed n-gram model trained on past LLM classifications answers routine messages
+        self.local_classifier = LocalPreClassifier.from_env()
+        self.local_audit_rate = float(os.getenv("LOCAL_CLASSIFIER_AUDIT_RATE", "0.05"))
+        
+        # Identical prompts already in flight share one upstream call
+        self.coalescer = (
+            RequestCoalescer()
+            if os.getenv("LLM_COALESCING_ENABLED", "true").lower() == "true"
+            else None
+        )
+        
+        # Routine replies are reused as templates with the new ticket number filled in
+        self.response_cache = (
+            ResponseTemplateCache.from_env()
+            if os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+            else None
+        )
+        
+        # Concurrent classify() calls within a few milliseconds share one batched prompt
+        self.micro_batch_size = max(1, int(os.getenv("LLM_MICRO_BATCH_MAX_SIZE", "16")))
+        self.classification_batcher = (
+            MicroBatcher(
+                self._classify_upstream,
+                max_batch_size=self.micro_batch_size,
+                max_wait=float(os.getenv("LLM_MICRO_BATCH_WAIT_MS", "5")) / 1000
+            )
+            if os.getenv("LLM_MICRO_BATCH_ENABLED", "true").lower() == "true"
+            else None
+        )
+        self._batch_stats = {"batched_calls": 0, "batched_messages": 0, "retried_individually": 0}
+        
+        # Spend per tenant/model, persisted in write-behind batches; drives the tenant budgets
+        self.cost_ledger = (
+            CostLedger.from_env() if os.getenv("COST_LEDGER_ENABLED", "true").lower() == "true" else None
+        )
+    
+    async def start(self):
+        """Open the pooled clients of the providers used by a chain (called from the FastAPI lifespan)"""
+        for name in {hop.provider for hops in self.chains.values() for hop in hops}:
+            self.providers[name].client  # created on first access
+        logger.info(f"LLM gateway pools opened: {self.get_pool_stats()}")
+        self.warmer.start()
+        if self.cost_ledger:
+            await self.cost_ledger.start()
+    
+    async def aclose(self):
+        """Stop the keep-alive task, flush the cost ledger and logs and close all pooled provider clients"""
+        # Running micro-batches still need the providers and the ledger
+        if self.classification_batcher:
+            await self.classification_batcher.aclose()
+        await self.warmer.stop()
+        await self.router.stop()
+        await self.local_classifier.aclose()
+        if self.cost_ledger:
+            await self.cost_ledger.stop()
+        await asyncio.gather(*(provider.aclose() for provider in self.providers.values()), return_exceptions=True)
+        if self.classification_cache:
+            await self.classification_cache.aclose()
+        if self.cassette:
+            self.cassette.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Runtime statistics for the gateway"""
+        return {
+            "pools": self.get_pool_stats(),
+            "classification_cache": (
+                self.classification_cache.get_stats() if self.classification_cache else {"enabled": False}
+            ),
+            "coalescing": self.coalescer.get_stats() if self.coalescer else {"enabled": False},
+            "response_cache": self.response_cache.get_stats() if self.response_cache else {"enabled": False},
+            "cost_ledger": self.cost_ledger.get_stats() if self.cost_ledger else {"enabled": False},
+            "prompt_budget": get_prompt_builder().get_stats(),
+            "local_classifier": self.local_classifier.get_stats(),
+            "micro_batching": {
+                "enabled": self.classification_batcher is not None,
+                **self._batch_stats,
+                **(self.classification_batcher.get_stats() if self.classification_batcher else {})
+            },
+            "circuit_breakers": self.get_breaker_states(),
+            "admission": self.admission.get_stats(),
+            "chains": {
+                task: [{"provider": hop.provider, "model": hop.model, "timeout": self._hop_timeout(hop)} for hop in hops]
+                for task, hops in self.chains.items()
             },
-            "generation": {
-                "primary": {"provider": ModelProvider.MISTRAL, "model": "mistral-large-latest"},
-                "fallback": {"provider": ModelProvider.OLLAMA, "model": "llama3.2:1b"}  # Use available model
+            "routing": self.router.get_stats(),
+            "warmup": self.warmer.get_stats(),
+            "cassette": self.cassette.get_stats() if self.cassette else {"mode": "off"},
+            "latency": {name: histogram.snapshot() for name, histogram in self.latency.items()},
+            "hedging": {
+                "enabled": self.hedge_policy.enabled,
+                **self._hedge_stats,
+                "current_delay_seconds": {
+                    name: round(self._hedge_delay(name), 4) for name in self.providers
+                }
             }
         }
     
-    async def classify(self, text: str) -> LLMResponse:
-        """Classify customer message"""
-        prompt = f"""Classify this support message and return JSON:
+    def get_breaker_states(self) -> Dict[str, Any]:
+        """Circuit breaker state per provider"""
+        return {name: breaker.get_state() for name, breaker in self.breakers.items()}
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Connection pool statistics per provider"""
+        return {name: provider.pool_stats() for name, provider in self.providers.items()}
+    
+    async def classify(self, text: str, tenant_id: Optional[str] = None) -> LLMResponse:
+        """Classify customer message (the spend is charged to tenant_id)"""
+        return (await self._classify_texts([text], micro_batch=True, tenant_id=tenant_id))[0]
+    
+    async def classify_many(self, texts: List[str], tenant_id: Optional[str] = None) -> List[LLMResponse]:
+        """Classify several messages, packing the ones that need the LLM into batched prompts"""
+        return await self._classify_texts(texts, micro_batch=False, tenant_id=tenant_id)
+    
+    async def _classify_texts(self, texts: List[str], micro_batch: bool, tenant_id: Optional[str] = None) -> List[LLMResponse]:
+        """Cache, then local pre-classifier, then the LLM; results are in input order"""
+        results: List[Optional[LLMResponse]] = [None] * len(texts)
+        if self.classification_cache:
+            cached_entries = await asyncio.gather(*(self.classification_cache.get(text) for text in texts))
+            for index, cached in enumerate(cached_entries):
+                if cached:
+                    results[index] = LLMResponse(
+                        content=cached["content"],
+                        model_used=cached["model_used"],
+                        provider=cached["provider"],
+                        tokens_used=0,
+                        cost_usd=0.0,
+                        success=True
+                    )
+        pending = [index for index, result in enumerate(results) if result is None]
+        
+        # Confident local predictions skip the LLM; a small audit share still goes
+        # to the LLM so agreement keeps being measured
+        predicted: Dict[int, Dict[str, str]] = {}
+        if pending and self.local_classifier.ready:
+            predictions = self.local_classifier.predict_batch([texts[index] for index in pending])
+            for index, (classification, confidence) in zip(pending, predictions):
+                if self.local_classifier.is_confident(confidence) and random.random() >= self.local_audit_rate:
+                    self.local_classifier.record_skip()
+                    results[index] = self._local_response(classification)
+                else:
+                    predicted[index] = classification
+            pending = [index for index in pending if results[index] is None]
+        
+        budget = self._budget_state(tenant_id) if pending else BUDGET_OK
+        if budget == BUDGET_EXHAUSTED:
+            # Over budget: keyword classification only, and nothing to cache or learn from
+            for index in pending:
+                results[index] = self._local_response(self.classify_locally(texts[index]))
+            pending = []
+        
+        if pending:
+            if budget == BUDGET_DOWNGRADE:
+                # Shared micro-batches use the normal chain, so budget-limited tenants bypass them
+                responses = await self._classify_upstream([texts[index] for index in pending], cheap=True)
+            elif micro_batch and self.classification_batcher:
+                responses = await asyncio.gather(*(self.classification_batcher.submit(texts[index]) for index in pending))
+            else:
+                responses = await self._classify_upstream([texts[index] for index in pending])
+            
+            for index, response in zip(pending, responses):
+                results[index] = response
+                # Only real model answers that parse are cached and learned from;
+                # static fallbacks should not outlive an outage
+                parsed = self._parse_model_classification(response)
+                if parsed is not None:
+                    self.local_classifier.record_llm_result(texts[index], predicted.get(index), parsed)
+                    if self.classification_cache:
+                        # Stored as plain JSON, whatever fences or prose the model wrapped it in
+                        await self.classification_cache.set(texts[index], {
+                            "content": json.dumps(parsed),
+                            "model_used": response.model_used,
+                            "provider": response.provider
+                        })
+                if self.cost_ledger:
+                    self.cost_ledger.record(tenant_id, "classification", response)
+        
+        return results
+    
+    async def _classify_upstream(self, texts: List[str], cheap: bool = False) -> List[LLMResponse]:
+        """Ask the LLM about each distinct message once, in chunks of up to micro_batch_size"""
+        unique: Dict[str, str] = {}
+        for text in texts:
+            unique.setdefault(normalize_text(text), text)
+        keys = list(unique)
+        chunks = [keys[start:start + self.micro_batch_size] for start in range(0, len(keys), self.micro_batch_size)]
+        
+        answers = await asyncio.gather(*(self._classify_batch([unique[key] for key in chunk], cheap) for chunk in chunks))
+        by_key = {key: response for chunk, responses in zip(chunks, answers) for key, response in zip(chunk, responses)}
+        return [by_key[normalize_text(text)] for text in texts]
+    
+    async def _classify_batch(self, texts: List[str], cheap: bool = False) -> List[LLMResponse]:
+        """
+        One prompt for several messages, answered as a JSON array. Entries that are
+        missing or fail validation are retried with the single-message prompt.
+        """
+        if len(texts) == 1:
+            return [await self._call("classification", self._classification_prompt(texts[0]), cheap=cheap)]
+        
+        self._batch_stats["batched_calls"] += 1
+        self._batch_stats["batched_messages"] += len(texts)
+        response = await self._call("classification", self._batch_classification_prompt(texts), cheap=cheap)
+        
+        if response.model_used in ("intelligent_fallback", "basic_fallback"):
+            # No provider answered; the keyword fallback works per message
+            return [
+                self._intelligent_fallback("classification", self._classification_prompt(text), "All providers failed")
+                for text in texts
+            ]
+        
+        results: List[Optional[LLMResponse]] = [None] * len(texts)
+        for index, classification in self._parse_batch_classification(response, len(texts)).items():
+            results[index] = LLMResponse(
+                content=json.dumps(classification),
+                model_used=response.model_used,
+                provider=response.provider,
+                tokens_used=response.tokens_used // len(texts),
+                cost_usd=response.cost_usd / len(texts),
+                success=True
+            )
+        
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            self._batch_stats["retried_individually"] += len(missing)
+            logger.warning(f"Batched classification answered {len(texts) - len(missing)}/{len(texts)} messages; retrying the rest")
+            retries = await asyncio.gather(*(
+                self._call("classification", self._classification_prompt(texts[index]), cheap=cheap) for index in missing
+            ))
+            for index, retry in zip(missing, retries):
+                results[index] = retry
+        
+        return results
+    
+    @staticmethod
+    def _classification_prompt(text: str) -> str:
+        return f"""Classify this support message and return JSON:
 {text}
 
 Return: {{"priority": "high|medium|low", "category": "billing|technical|general", "sentiment": "positive|neutral|negative"}}"""
+    
+    @staticmethod
+    def _batch_classification_prompt(texts: List[str]) -> str:
+        messages = "\n".join(f"[{number}] {' '.join(text.split())}" for number, text in enumerate(texts, start=1))
+        return f"""Classify each of these {len(texts)} support messages and return a JSON array with one object per message:
+{messages}
+
+Return: [{{"id": 1, "priority": "high|medium|low", "category": "billing|technical|general", "sentiment": "positive|neutral|negative"}}, ...]"""
+    
+    @staticmethod
+    def _parse_batch_classification(response: LLMResponse, count: int) -> Dict[int, Dict[str, str]]:
+        """Valid entries of a batched answer, keyed by 0-based message index"""
+        content = response.content or ""
+        start, end = content.find("["), content.rfind("]")
+        if start == -1 or end <= start:
+            return {}
+        try:
+            items = json.loads(content[start:end + 1])
+        except ValueError:
+            return {}
         
-        return await self._call("classification", prompt)
+        parsed: Dict[int, Dict[str, str]] = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            number = item.get("id")
+            if not isinstance(number, int) or not 1 <= number <= count or number - 1 in parsed:
+                continue
+            classification = {head: item.get(head) for head in LABELS}
+            if all(classification[head] in values for head, values in LABELS.items()):
+                parsed[number - 1] = classification
+        return parsed
     
-    async def generate_response(self, context: str) -> LLMResponse:
-        """Generate customer response"""
-        return await self._call("generation", context)
+    @staticmethod
+    def _parse_model_classification(response: LLMResponse) -> Optional[Dict[str, str]]:
+        """Normalized classification of a real model answer, parsed as leniently as the orchestrator does"""
+        if not response.success or response.model_used in ("intelligent_fallback", "basic_fallback"):
+            return None
+        parsed = parse_json_object(response.content)
+        if parsed is None:
+            return None
+        classification = {head: str(parsed.get(head, "")).strip().lower() for head in LABELS}
+        if not all(classification[head] in values for head, values in LABELS.items()):
+            return None
+        return classification
     
-    async def _call(self, model_type: str, prompt: str) -> LLMResponse:
-        config = self.model_config[model_type]
+    @staticmethod
+    def _local_response(classification: Dict[str, str]) -> LLMResponse:
+        return LLMResponse(
+            content=json.dumps(classification),
+            model_used="local_classifier",
+            provider=ModelProvider.MISTRAL.value,
+            tokens_used=0,
+            cost_usd=0.0,
+            success=True
+        )
+    
+    async def generate_response(self, context: str, hedge: bool = False, scope: Optional[ReplyScope] = None,
+                                priority: Optional[str] = None, tenant_id: Optional[str] = None) -> LLMResponse:
+        """
+        Generate customer response (hedge=True for latency-critical tickets; scope enables
+        the template cache; priority feeds the model router; the spend is charged to
+        tenant_id, or to the scope's tenant)
+        """
+        cached = self.cached_reply(scope)
+        if cached:
+            return cached
         
-        # Try primary model
-        try:
-            if config["primary"]["provider"] == ModelProvider.MISTRAL:
-                return await self._call_mistral(config["primary"]["model"], prompt)
-        except Exception as e:
-            logger.warning(f"Primary model failed: {e}")
+        tenant_id = tenant_id or (scope.tenant_id if scope else None)
+        budget = self._budget_state(tenant_id)
+        if budget == BUDGET_EXHAUSTED:
+            return self._intelligent_fallback("generation", context, f"LLM budget of tenant {tenant_id} exhausted")
+        
+        response = await self._call("generation", context, hedge=hedge, priority=priority, cheap=budget == BUDGET_DOWNGRADE)
+        if self.cost_ledger:
+            self.cost_ledger.record(tenant_id, "generation", response)
+        self.remember_reply(scope, response)
+        return response
+    
+    def cached_reply(self, scope: Optional[ReplyScope]) -> Optional[LLMResponse]:
+        """Reply served from the response template cache, if one matches"""
+        if scope is None or self.response_cache is None:
+            return None
+        entry = self.response_cache.get(scope)
+        if entry is None:
+            return None
+        return LLMResponse(
+            content=entry["content"],
+            model_used="response_cache",
+            provider=ModelProvider.MISTRAL.value,
+            tokens_used=0,
+            cost_usd=0.0,
+            success=True
+        )
+    
+    def remember_reply(self, scope: Optional[ReplyScope], response: LLMResponse):
+        """Store a real model reply as a template; fallbacks and cached replies are not stored"""
+        if scope is None or self.response_cache is None or not response.success:
+            return
+        if response.model_used in ("intelligent_fallback", "basic_fallback", "response_cache"):
+            return
+        self.response_cache.set(scope, response.content, response.model_used)
+    
+    def stream_response(self, context: str, priority: Optional[str] = None, tenant_id: Optional[str] = None) -> LLMStream:
+        """Generate customer response, yielding text chunks as the provider produces them"""
+        return LLMStream(self._stream("generation", context, priority, tenant_id))
+    
+    async def _stream(self, model_type: str, prompt: str, priority: Optional[str] = None,
+                      tenant_id: Optional[str] = None) -> AsyncIterator[Union[str, LLMResponse]]:
+        """Stream from each hop of the routed chain in turn, then the static fallback"""
+        budget = self._budget_state(tenant_id)
+        if budget == BUDGET_EXHAUSTED:
+            fallback = self._intelligent_fallback(model_type, prompt, f"LLM budget of tenant {tenant_id} exhausted")
+            yield fallback.content
+            yield fallback
+            return
+        
+        decision = self._route(model_type, prompt, priority, cheap=budget == BUDGET_DOWNGRADE)
+        request_started = time.monotonic()
+        for hop in decision.hops:
+            provider = self.providers[hop.provider]
+            breaker = self.breakers[hop.provider]
+            if not breaker.allow_request():
+                continue
             
-            # Try fallback
-            try:
-                return await self._call_ollama(config["fallback"]["model"], prompt)
-            except Exception as fallback_error:
-                logger.error(f"Fallback failed: {fallback_error}")
-                
-                # Intelligent static fallback based on prompt content
-                return self._intelligent_fallback(model_type, prompt, str(fallback_error))
-    
-    async def _call_mistral(self, model: str, prompt: str) -> LLMResponse:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.mistral.ai/v1/chat/completions",
-                headers={"Authorization": f"Bearer {self.mistral_api_key}"},
-                json={
-                    "model": model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.1
-                },
-                timeout=30.0
-            )
-            response.raise_for_status()
-            data = response.json()
+            started, started_at = False, time.monotonic()
+            with self.call_metrics.call(hop.provider, hop.model, model_type) as timing:
+                try:
+                    async with self.admission.admit(hop.provider, hop.model, self._estimate_tokens(prompt)) as permit:
+                        timing.admitted()
+                        started_at = timing.sent
+                        async for event in provider.stream(hop.model, prompt, self._hop_timeout(hop)):
+                            if isinstance(event, LLMResponse):
+                                permit.actual_tokens = event.tokens_used
+                                self.call_metrics.record(timing, "success", event.tokens_used, event.cost_usd)
+                                if self.cost_ledger:
+                                    self.cost_ledger.record(tenant_id, model_type, event)
+                            started = True
+                            yield event
+                except AdmissionTimeout as e:
+                    breaker.record_cancelled()
+                    self.call_metrics.record(timing, "not_admitted")
+                    logger.warning(f"Streaming from {hop.provider} not admitted: {e}")
+                    continue
+                except (asyncio.CancelledError, GeneratorExit):
+                    breaker.record_cancelled()
+                    self.call_metrics.record(timing, "cancelled")
+                    raise
+                except Exception as e:
+                    self._record_provider_error(hop.provider, hop.model, e, time.monotonic() - started_at)
+                    self.call_metrics.record(timing, "error")
+                    # Chunks already delivered cannot be taken back, so only switch providers before the first one
+                    if started:
+                        raise
+                    logger.warning(f"Streaming from {hop.provider} failed: {e}")
+                    continue
             
-            return LLMResponse(
-                content=data["choices"][0]["message"]["content"],
-                model_used=model,
-                provider=ModelProvider.MISTRAL,
-                tokens_used=data["usage"]["total_tokens"],
-                cost_usd=self._calculate_cost(model, data["usage"]["total_tokens"]),
-                success=True
-            )
+            elapsed = time.monotonic() - started_at
+            breaker.record_success(elapsed)
+            self.latency[hop.provider].observe(elapsed)
+            self.router.record_outcome(decision, f"{hop.provider}/{hop.model}", time.monotonic() - request_started, True)
+            return
+        
+        fallback = self._intelligent_fallback(model_type, prompt, "All streaming providers failed")
+        self.router.record_outcome(decision, fallback.model_used, time.monotonic() - request_started, fallback.success)
+        yield fallback.content
+        yield fallback
     
-    async def _call_ollama(self, model: str, prompt: str) -> LLMResponse:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.ollama_url}/api/generate",
-                json={"model": model, "prompt": prompt, "stream": False},
-                timeout=60.0
-            )
-            response.raise_for_status()
-            data = response.json()
+    async def _call(self, model_type: str, prompt: str, hedge: bool = False, priority: Optional[str] = None,
+                    cheap: bool = False) -> LLMResponse:
+        """Route, coalesce and call upstream (cheap=True puts the least expensive hops first)"""
+        decision = self._route(model_type, prompt, priority, cheap)
+        if hedge and self.hedge_policy.enabled:
+            upstream = lambda: self._call_hedged(model_type, prompt, decision.hops)
+        else:
+            upstream = lambda: self._call_upstream(model_type, prompt, decision.hops)
+        
+        started = time.monotonic()
+        if self.coalescer:
+            # Budget-limited callers must not pick up (or hand out) an answer routed the expensive way
+            key = coalescing_key(f"{model_type}:cheap" if cheap else model_type, prompt)
+            response = await self.coalescer.run(key, upstream)
+        else:
+            response = await upstream()
+        
+        served_by = response.model_used if response.model_used.endswith("_fallback") else f"{response.provider}/{response.model_used}"
+        self.router.record_outcome(decision, served_by, time.monotonic() - started, response.success)
+        return response
+    
+    def _route(self, model_type: str, prompt: str, priority: Optional[str], cheap: bool = False) -> RouteDecision:
+        return self.router.route(
+            model_type,
+            self.chains[model_type],
+            estimate_tokens(prompt),
+            priority,
+            latency_of=lambda name: self.latency[name].percentile(0.5) if name in self.latency else None,
+            queue_of=self.admission.queue_depth,
+            healthy=lambda name: name in self.breakers and self.breakers[name].state == BreakerState.CLOSED,
+            # Relative price of a hop: its cost for 1000 tokens
+            cost_of=(lambda hop: self.providers[hop.provider].cost(hop.model, 1000)) if cheap else None
+        )
+    
+    def _budget_state(self, tenant_id: Optional[str]) -> str:
+        """Where tenant_id stands against its LLM budget (always ok without a ledger)"""
+        if not self.cost_ledger:
+            return BUDGET_OK
+        state = self.cost_ledger.budget_state(tenant_id)
+        if state != BUDGET_OK:
+            self.cost_ledger.note_enforced(state)
+            logger.info(f"Tenant {tenant_id or 'default'} is at its LLM budget limit ({state})")
+        return state
+    
+    async def _call_upstream(self, model_type: str, prompt: str, hops: Optional[List[ChainHop]] = None,
+                             last_error: str = "No provider available") -> LLMResponse:
+        """Walk the chain (or the given remaining hops) until a provider answers"""
+        # Skip providers whose circuit is open
+        for hop in self.chains[model_type] if hops is None else hops:
+            if not self.breakers[hop.provider].allow_request():
+                logger.info(f"Skipping {model_type} hop {hop.provider}/{hop.model}: circuit is open")
+                last_error = f"{hop.provider} circuit open"
+                continue
             
-            return LLMResponse(
-                content=data["response"],
-                model_used=model,
-                provider=ModelProvider.OLLAMA,
-                tokens_used=data.get("eval_count", 0),
-                cost_usd=0.0,
-                success=True
-            )
+            try:
+                return await self._call_provider(model_type, hop, prompt)
+            except Exception as e:
+                logger.warning(f"{model_type} hop {hop.provider}/{hop.model} failed: {e}")
+                last_error = str(e)
+        
+        # Intelligent static fallback based on prompt content
+        return self._intelligent_fallback(model_type, prompt, last_error)
+    
+    async def _call_hedged(self, model_type: str, prompt: str, chain: Optional[List[ChainHop]] = None) -> LLMResponse:
+        """
+        Call the first hop; if it has not answered within the hedge delay, send the same
+        prompt to the second hop as well, take whichever succeeds first and cancel the other.
+        """
+        chain = self.chains[model_type] if chain is None else chain
+        if len(chain) < 2 or not self.breakers[chain[0].provider].allow_request():
+            return await self._call_upstream(model_type, prompt, chain)
+        primary, fallback = chain[0], chain[1]
+        
+        self._hedge_stats["hedged_calls"] += 1
+        delay = self._hedge_delay(primary.provider)
+        primary_task = asyncio.ensure_future(self._call_provider(model_type, primary, prompt))
+        pending = {primary_task}
+        hedge_task = None
+        last_error = "No provider available"
+        
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done and self.breakers[fallback.provider].allow_request():
+                self._hedge_stats["hedges_fired"] += 1
+                logger.info(f"Hedging {model_type} call to {fallback.provider} after {delay:.2f}s")
+                hedge_task = asyncio.ensure_future(self._call_provider(model_type, fallback, prompt))
+                pending.add(hedge_task)
+            
+            while done or pending:
+                for task in done:
+                    if task.exception() is None:
+                        if hedge_task is not None:
+                            self._hedge_stats["fallback_wins" if task is hedge_task else "primary_wins"] += 1
+                        return task.result()
+                    last_error = str(task.exception())
+                    logger.warning(f"Hedged {model_type} call failed: {last_error}")
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        # Continue down the chain with the hops that have not been tried yet
+        remaining = chain[2:] if hedge_task is not None else chain[1:]
+        return await self._call_upstream(model_type, prompt, remaining, last_error)
+    
+    def _hedge_delay(self, provider: str) -> float:
+        """Hedge delay from the provider's recent latency percentile, clamped to the policy bounds"""
+        policy = self.hedge_policy
+        histogram = self.latency[provider]
+        if histogram.recent_samples < policy.min_samples:
+            delay = policy.default_delay
+        else:
+            delay = histogram.percentile(policy.percentile)
+        return min(policy.max_delay, max(policy.min_delay, delay))
+    
+    def _hop_timeout(self, hop: ChainHop) -> float:
+        return hop.timeout if hop.timeout is not None else self.providers[hop.provider].default_timeout
+    
+    async def _call_provider(self, model_type: str, hop: ChainHop, prompt: str) -> LLMResponse:
+        """Call one hop through admission control, reporting the outcome to its provider's circuit breaker"""
+        provider = self.providers[hop.provider]
+        breaker = self.breakers[hop.provider]
+        timeout = self._hop_timeout(hop)
+        
+        with self.call_metrics.call(hop.provider, hop.model, model_type) as timing:
+            try:
+                async with self.admission.admit(hop.provider, hop.model, self._estimate_tokens(prompt)) as permit:
+                    timing.admitted()
+                    started = timing.sent
+                    try:
+                        # The hop timeout bounds the whole call, not just each socket operation
+                        response = await asyncio.wait_for(provider.complete(hop.model, prompt, timeout), timeout)
+                    except asyncio.CancelledError:
+                        breaker.record_cancelled()
+                        self.call_metrics.record(timing, "cancelled")
+                        raise
+                    except asyncio.TimeoutError as e:
+                        self._record_provider_error(hop.provider, hop.model, e, time.monotonic() - started)
+                        self.call_metrics.record(timing, "timeout")
+                        raise asyncio.TimeoutError(f"no answer within the {timeout}s hop timeout") from e
+                    except Exception as e:
+                        self._record_provider_error(hop.provider, hop.model, e, time.monotonic() - started)
+                        self.call_metrics.record(timing, "error")
+                        raise
+                    permit.actual_tokens = response.tokens_used
+            except AdmissionTimeout:
+                # Local backpressure, not a provider fault: free any half-open probe slot
+                breaker.record_cancelled()
+                self.call_metrics.record(timing, "not_admitted")
+                raise
+            self.call_metrics.record(timing, "success", response.tokens_used, response.cost_usd)
+        
+        elapsed = time.monotonic() - started
+        breaker.record_success(elapsed)
+        self.latency[hop.provider].observe(elapsed)
+        return response
+    
+    def _record_provider_error(self, provider: str, model: str, error: Exception, elapsed: float):
+        """Rate limiting pauses admission for the provider; anything else counts against its breaker"""
+        if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429:
+            try:
+                retry_after = float(error.response.headers.get("retry-after", "1"))
+            except ValueError:
+                retry_after = 1.0
+            logger.warning(f"{provider} rate limited {model}; pausing admission for {retry_after}s")
+            self.admission.throttle(provider, model, retry_after)
+            self.breakers[provider].record_cancelled()
+        else:
+            self.breakers[provider].record_failure(elapsed)
+    
+    @staticmethod
+    def _estimate_tokens(prompt: str) -> int:
+        """Rough prompt + completion token estimate used to reserve TPM quota"""
+        return estimate_tokens(prompt) + 256
     
-    def _calculate_cost(self, model: str, tokens: int) -> float:
-        pricing = {"mistral-small": 0.0002, "mistral-large": 0.008}
-        return (tokens / 1000) * pricing.get(model, 0.002)
+    def input_budget(self, model_type: str) -> int:
+        """Token budget for customer text in a prompt for model_type (fits every model in its chain)"""
+        return get_prompt_builder().budget_for(hop.model for hop in self.chains[model_type])
+    
+    def classify_locally(self, text: str) -> Dict[str, str]:
+        """Keyword-based classification that needs no model call"""
+        return self.keyword_classifier.classify(text).classification
     
     def _intelligent_fallback(self, model_type: str, prompt: str, error: str) -> LLMResponse:
         """Provide intelligent fallback responses based on prompt content"""
@@ -143,57 +751,13 @@ Return: {{"priority": "high|medium|low", "category": "billing|technical|general"
                     break
             
             # Use the extracted message, fallback to full prompt if extraction fails
-            prompt_lower = actual_message.lower() if actual_message else prompt.lower()
-            
-            # Analyze the message content for intelligent classification
-            priority = "medium"  # default
-            category = "general"  # default
-            sentiment = "neutral"  # default
-            
-            # Priority detection
-            urgent_keywords = ["urgent", "emergency", "critical", "asap", "immediately", "broken", "not working", "failed", "error", "charged twice", "can't login"]
-            high_keywords = ["problem", "issue", "help", "support", "stuck", "can't", "unable", "doesn't work", "crash", "slow"]
-            
-            if any(keyword in prompt_lower for keyword in urgent_keywords):
-                priority = "high"
-            elif any(keyword in prompt_lower for keyword in high_keywords):
-                priority = "high"
-            elif any(keyword in prompt_lower for keyword in ["question", "how", "what", "when", "info", "reset password", "business hours"]):
-                priority = "low"
-            
-            # Category detection
-            billing_keywords = ["payment", "bill", "charge", "credit", "invoice", "subscription", "refund", "money", "billing", "charged"]
-            technical_keywords = ["login", "password", "app", "website", "technical", "bug", "error", "crash", "slow", "reset", "access", "account", "reset password"]
-            
-            # Special handling for password reset queries - this should take priority
-            if "reset" in prompt_lower and "password" in prompt_lower:
-                category = "technical"
-            elif any(keyword in prompt_lower for keyword in billing_keywords):
-                category = "billing"
-            elif any(keyword in prompt_lower for keyword in technical_keywords):
-                category = "technical"
-            else:
-                category = "general"
-            
-            # Sentiment detection
-            negative_keywords = ["frustrated", "angry", "terrible", "awful", "hate", "worst", "disappointed", "upset"]
-            positive_keywords = ["thank", "great", "excellent", "love", "amazing", "wonderful", "fantastic"]
-            
-            if any(keyword in prompt_lower for keyword in negative_keywords):
-                sentiment = "negative"
-            elif any(keyword in prompt_lower for keyword in positive_keywords):
-                sentiment = "positive"
-            
-            classification = {
-                "priority": priority,
-                "category": category,
-                "sentiment": sentiment
-            }
+            match = self.keyword_classifier.classify(actual_message or prompt)
+            classification = {**match.classification, "matched_rules": match.matched_rules}
             
             return LLMResponse(
                 content=json.dumps(classification),
                 model_used="intelligent_fallback",
-                provider=ModelProvider.MISTRAL,
+                provider=ModelProvider.MISTRAL.value,
                 tokens_used=0,
                 cost_usd=0.0,
                 success=True,
@@ -217,21 +781,13 @@ Return: {{"priority": "high|medium|low", "category": "billing|technical|general"
                 elif "Category:" in line:
                     category = line.replace("Category:", "").strip()
                 elif "ticket number" in line:
-                    import re
                     match = re.search(r'TICKET_\w+', line)
                     if match:
                         ticket_id = match.group()
             
             # Analyze customer message for sentiment if not provided
             if customer_message:
-                msg_lower = customer_message.lower()
-                negative_keywords = ["frustrated", "angry", "terrible", "awful", "hate", "worst", "disappointed", "upset", "failed", "broken"]
-                positive_keywords = ["thank", "great", "excellent", "love", "amazing", "wonderful", "fantastic"]
-                
-                if any(keyword in msg_lower for keyword in negative_keywords):
-                    sentiment = "negative"
-                elif any(keyword in msg_lower for keyword in positive_keywords):
-                    sentiment = "positive"
+                sentiment = self.keyword_classifier.classify(customer_message).values["reply_sentiment"]
             
             # Generate appropriate response based on category and priority
             if category == "billing":
@@ -257,7 +813,7 @@ Return: {{"priority": "high|medium|low", "category": "billing|technical|general"
             return LLMResponse(
                 content=response,
                 model_used="intelligent_fallback",
-                provider=ModelProvider.MISTRAL,
+                provider=ModelProvider.MISTRAL.value,
                 tokens_used=0,
                 cost_usd=0.0,
                 success=True,
@@ -268,9 +824,18 @@ Return: {{"priority": "high|medium|low", "category": "billing|technical|general"
         return LLMResponse(
             content="I'm here to help! Please let me know how I can assist you today.",
             model_used="basic_fallback",
-            provider=ModelProvider.MISTRAL,
+            provider=ModelProvider.MISTRAL.value,
             tokens_used=0,
             cost_usd=0.0,
             success=False,
             error=error
-        )
\ No newline at end of file
+        )
+
+_gateway: Optional[LLMGateway] = None
+
+def get_llm_gateway() -> LLMGateway:
+    """Process-wide gateway so every orchestrator shares the same connection pools"""
+    global _gateway
+    if _gateway is None:
+        _gateway = LLMGateway()
+    return _gateway
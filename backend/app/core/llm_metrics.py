@@ -0,0 +1,96 @@
+"""
+LLM Metrics - Latency histograms for gateway providers, and Prometheus text rendering
+"""
+
+import math
+from collections import deque
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+# Bucket upper bounds in seconds, from fast cached answers to the Ollama timeout
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+class LatencyHistogram:
+    """
+    Cumulative bucketed latency histogram plus a window of recent samples.
+
+    The buckets give a stable long-run distribution; the recent window gives
+    percentiles that follow current conditions (used for adaptive hedging).
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS, window: int = 200):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._recent: deque = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        self._recent.append(seconds)
+        for index, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.bucket_counts[index] += 1
+                return
+        self.bucket_counts[-1] += 1
+
+    @property
+    def recent_samples(self) -> int:
+        return len(self._recent)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Nearest-rank percentile (0 < q <= 1) over the recent window"""
+        if not self._recent:
+            return None
+        ordered = sorted(self._recent)
+        rank = max(1, math.ceil(q * len(ordered)))
+        return ordered[rank - 1]
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(upper bound, observations <= bound) pairs ending with +Inf, as Prometheus expects"""
+        pairs, running = [], 0
+        for bound, count in zip(list(self.buckets) + [math.inf], self.bucket_counts):
+            running += count
+            pairs.append((bound, running))
+        return pairs
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = {"+Inf" if bound == math.inf else str(bound): count for bound, count in self.cumulative()}
+
+        def rounded(value: Optional[float]) -> Optional[float]:
+            return round(value, 4) if value is not None else None
+
+        return {
+            "count": self.count,
+            "sum_seconds": round(self.sum, 4),
+            "p50": rounded(self.percentile(0.5)),
+            "p90": rounded(self.percentile(0.9)),
+            "p99": rounded(self.percentile(0.99)),
+            "buckets": cumulative
+        }
+
+def _label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def prometheus_labels(**labels: Any) -> str:
+    """name="value" pairs for a series, escaped for the text exposition format"""
+    return ",".join(f'{name}="{_label_value(value)}"' for name, value in labels.items())
+
+def prometheus_metric(name: str, kind: str, help_text: str, series: List[Tuple[str, float]]) -> List[str]:
+    """Lines for a counter or gauge; series are (labels, value) pairs"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in series:
+        lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    return lines
+
+def prometheus_histogram(name: str, help_text: str, series: List[Tuple[str, LatencyHistogram]]) -> List[str]:
+    """Lines for a histogram; series are (labels, histogram) pairs"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in series:
+        prefix = f"{labels}," if labels else ""
+        for bound, count in histogram.cumulative():
+            le = "+Inf" if bound == math.inf else repr(float(bound))
+            lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {count}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum}" if labels else f"{name}_sum {histogram.sum}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}" if labels else f"{name}_count {histogram.count}")
+    return lines
@@ -0,0 +1,338 @@
+"""
+LLM Providers - Registry of upstream model providers behind one async interface
+
+Each provider is a class registered under a name ("mistral", "ollama", ...).
+The gateway creates one instance per registered provider; fallback chains
+refer to providers by that name. Extra providers can be added from other
+modules listed in LLM_PROVIDER_PLUGINS:
+
+    @register_provider
+    class MyProvider(LLMProvider):
+        name = "myprovider"
+        ...
+"""
+
+import importlib
+import importlib.util
+import json
+import os
+import time
+import logging
+from dataclasses import dataclass, asdict
+from enum import Enum
+from typing import Optional, Dict, Any, AsyncIterator, List, Type, Union
+
+import httpx
+
+from app.core.call_metrics import trace_extensions
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional `h2` package (installed via httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+class ModelProvider(str, Enum):
+    """Names of the built-in providers"""
+    MISTRAL = "mistral"
+    OLLAMA = "ollama"
+
+@dataclass
+class LLMResponse:
+    content: str
+    model_used: str
+    provider: str
+    tokens_used: int
+    cost_usd: float
+    success: bool
+    error: Optional[str] = None
+
+@dataclass
+class PoolConfig:
+    """Connection pool limits for one provider's HTTP client"""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+
+    @classmethod
+    def from_env(cls, provider: str, http2: bool = False) -> "PoolConfig":
+        """Read LLM_POOL_* defaults, overridable per provider (e.g. MISTRAL_POOL_MAX_CONNECTIONS)"""
+        def setting(name: str, default: str) -> str:
+            return os.getenv(f"{provider.upper()}_POOL_{name}", os.getenv(f"LLM_POOL_{name}", default))
+
+        return cls(
+            max_connections=int(setting("MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(setting("MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(setting("KEEPALIVE_EXPIRY", "30")),
+            http2=http2 and HTTP2_AVAILABLE and setting("HTTP2", "true").lower() == "true"
+        )
+
+class LLMProvider:
+    """
+    Common async interface for an upstream provider.
+
+    Subclasses set `name` and implement `complete` (one answer) and `stream`
+    (text chunks followed by the final LLMResponse) on top of the long-lived
+    pooled client returned by `client`, passing `extensions=trace_extensions()`
+    so the gateway can time connect and time-to-first-byte.
+    """
+
+    name: str = ""
+    default_base_url: str = ""
+    default_timeout: float = 30.0
+    http2: bool = False
+    # Providers that load models on demand (local servers) can preload and pin them
+    supports_warmup: bool = False
+
+    def __init__(self, base_url: str, api_key: Optional[str] = None, pool: Optional[PoolConfig] = None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.pool = pool or PoolConfig()
+        self.requests = 0
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_env(cls) -> "LLMProvider":
+        """Configured from <NAME>_BASE_URL, <NAME>_API_KEY and the pool settings"""
+        prefix = cls.name.upper()
+        return cls(
+            base_url=os.getenv(f"{prefix}_BASE_URL", cls.default_base_url),
+            api_key=os.getenv(f"{prefix}_API_KEY"),
+            pool=PoolConfig.from_env(cls.name, http2=cls.http2)
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The pooled client, created on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=self.pool.http2,
+                limits=httpx.Limits(
+                    max_connections=self.pool.max_connections,
+                    max_keepalive_connections=self.pool.max_keepalive_connections,
+                    keepalive_expiry=self.pool.keepalive_expiry
+                )
+            )
+        return self._client
+
+    async def complete(self, model: str, prompt: str, timeout: float) -> LLMResponse:
+        raise NotImplementedError
+
+    def stream(self, model: str, prompt: str, timeout: float) -> AsyncIterator[Union[str, LLMResponse]]:
+        raise NotImplementedError
+
+    def cost(self, model: str, tokens: int) -> float:
+        return 0.0
+
+    async def warm_up(self, model: str, timeout: float) -> float:
+        """Load `model` and keep it resident; returns the load time in seconds"""
+        raise NotImplementedError
+
+    async def aclose(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        client = self._client
+        # httpx does not expose its pool publicly; read httpcore's connection list defensively
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        return {
+            **asdict(self.pool),
+            "base_url": self.base_url,
+            "open": client is not None and not client.is_closed,
+            "requests": self.requests,
+            "connections": len(connections),
+            "idle_connections": sum(1 for conn in connections if conn.is_idle()),
+            "http2_connections": sum(
+                1 for conn in connections
+                if not conn.is_closed() and "HTTP/2" in conn.info()
+            )
+        }
+
+_REGISTRY: Dict[str, Type[LLMProvider]] = {}
+
+def register_provider(cls: Type[LLMProvider]) -> Type[LLMProvider]:
+    """Class decorator adding a provider to the registry under its `name`"""
+    if not cls.name:
+        raise ValueError(f"{cls.__name__} has no provider name")
+    _REGISTRY[cls.name] = cls
+    return cls
+
+def registered_providers() -> Dict[str, Type[LLMProvider]]:
+    return dict(_REGISTRY)
+
+def load_provider_plugins():
+    """Import the modules in LLM_PROVIDER_PLUGINS (comma-separated) so they can register providers"""
+    for module in filter(None, (name.strip() for name in os.getenv("LLM_PROVIDER_PLUGINS", "").split(","))):
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            logger.error(f"Could not load LLM provider plugin {module}: {e}")
+
+@register_provider
+class MistralProvider(LLMProvider):
+    """Mistral chat completions API, served over TLS and negotiating HTTP/2"""
+
+    name = ModelProvider.MISTRAL.value
+    default_base_url = "https://api.mistral.ai"
+    default_timeout = 30.0
+    http2 = True
+
+    # USD per 1k tokens by model family; aliases and versions ("mistral-large-latest",
+    # "mistral-small-2409") are priced as their family
+    PRICING = {"mistral-small": 0.0002, "mistral-large": 0.008}
+    DEFAULT_PRICE = 0.002
+
+    def cost(self, model: str, tokens: int) -> float:
+        return (tokens / 1000) * self.price(model)
+
+    def price(self, model: str) -> float:
+        family = max((name for name in self.PRICING if model == name or model.startswith(f"{name}-")), key=len, default=None)
+        return self.PRICING[family] if family else self.DEFAULT_PRICE
+
+    def _request(self, model: str, prompt: str, stream: bool = False) -> Dict[str, Any]:
+        body = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.1
+        }
+        if stream:
+            body["stream"] = True
+        return {"headers": {"Authorization": f"Bearer {self.api_key}"}, "json": body}
+
+    async def complete(self, model: str, prompt: str, timeout: float) -> LLMResponse:
+        self.requests += 1
+        response = await self.client.post(
+            "/v1/chat/completions", timeout=timeout, extensions=trace_extensions(), **self._request(model, prompt)
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        return LLMResponse(
+            content=data["choices"][0]["message"]["content"],
+            model_used=model,
+            provider=self.name,
+            tokens_used=data["usage"]["total_tokens"],
+            cost_usd=self.cost(model, data["usage"]["total_tokens"]),
+            success=True
+        )
+
+    async def stream(self, model: str, prompt: str, timeout: float) -> AsyncIterator[Union[str, LLMResponse]]:
+        self.requests += 1
+        parts, tokens = [], 0
+
+        async with self.client.stream(
+            "POST", "/v1/chat/completions", timeout=timeout, extensions=trace_extensions(),
+            **self._request(model, prompt, stream=True)
+        ) as response:
+            response.raise_for_status()
+            # Server-sent events: "data: {...}" lines terminated by "data: [DONE]"
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                event = json.loads(payload)
+                if event.get("usage"):
+                    tokens = event["usage"].get("total_tokens", tokens)
+                choices = event.get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield delta
+
+        yield LLMResponse(
+            content="".join(parts),
+            model_used=model,
+            provider=self.name,
+            tokens_used=tokens,
+            cost_usd=self.cost(model, tokens),
+            success=True
+        )
+
+@register_provider
+class OllamaProvider(LLMProvider):
+    """Local Ollama server; HTTP/1.1 only, so it relies on keep-alive"""
+
+    name = ModelProvider.OLLAMA.value
+    default_base_url = "http://ollama:11434"  # Use container name
+    default_timeout = 60.0
+    supports_warmup = True
+    # How long Ollama keeps a model in memory after each request
+    keep_alive = "30m"
+
+    @classmethod
+    def from_env(cls) -> "OllamaProvider":
+        provider = super().from_env()
+        provider.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", cls.keep_alive)
+        return provider
+
+    async def warm_up(self, model: str, timeout: float) -> float:
+        """A request without a prompt makes Ollama load the model and pin it for keep_alive"""
+        started = time.monotonic()
+        response = await self.client.post(
+            "/api/generate",
+            json={"model": model, "keep_alive": self.keep_alive},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        # load_duration (ns) is only reported when the model actually had to be loaded
+        load_duration = response.json().get("load_duration")
+        return load_duration / 1e9 if load_duration else time.monotonic() - started
+
+    async def complete(self, model: str, prompt: str, timeout: float) -> LLMResponse:
+        self.requests += 1
+        response = await self.client.post(
+            "/api/generate",
+            json={"model": model, "prompt": prompt, "stream": False, "keep_alive": self.keep_alive},
+            timeout=timeout,
+            extensions=trace_extensions()
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        return LLMResponse(
+            content=data["response"],
+            model_used=model,
+            provider=self.name,
+            tokens_used=data.get("eval_count", 0),
+            cost_usd=0.0,
+            success=True
+        )
+
+    async def stream(self, model: str, prompt: str, timeout: float) -> AsyncIterator[Union[str, LLMResponse]]:
+        self.requests += 1
+        parts, tokens = [], 0
+
+        async with self.client.stream(
+            "POST",
+            "/api/generate",
+            json={"model": model, "prompt": prompt, "stream": True, "keep_alive": self.keep_alive},
+            timeout=timeout,
+            extensions=trace_extensions()
+        ) as response:
+            response.raise_for_status()
+            # Newline-delimited JSON objects; the last one has "done": true and the counters
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event.get("response"):
+                    parts.append(event["response"])
+                    yield event["response"]
+                if event.get("done"):
+                    tokens = event.get("eval_count", 0)
+                    break
+
+        yield LLMResponse(
+            content="".join(parts),
+            model_used=model,
+            provider=self.name,
+            tokens_used=tokens,
+            cost_usd=0.0,
+            success=True
+        )
@@ -0,0 +1,321 @@
+"""
+Local Classifier - Hashed n-gram TF-IDF with linear softmax heads on NumPy
+
+A small pre-classifier in front of LLMGateway.classify. It is trained from
+logged (message, classification) pairs that the LLM produced, and answers on
+its own when every head (priority, category, sentiment) is confident.
+
+Training data is captured only with CLASSIFICATION_LOG_ENABLED=true: a sample
+(CLASSIFICATION_LOG_SAMPLE_RATE) of LLM classifications is appended, with the
+customer text, to a size-capped log that rotates once (`<path>.1`). Train from it:
+    python -m app.core.local_classifier --log data/classification_log.jsonl --out data/local_classifier.npz
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import zlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.core.jsonl_writer import BufferedJsonlWriter
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency: the pre-classifier is disabled without it
+    np = None
+
+logger = logging.getLogger(__name__)
+
+NUMPY_AVAILABLE = np is not None
+
+LABELS = {
+    "priority": ("high", "medium", "low"),
+    "category": ("billing", "technical", "general"),
+    "sentiment": ("positive", "neutral", "negative")
+}
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+def extract_features(text: str) -> List[str]:
+    """Word unigrams and bigrams plus character trigrams inside words"""
+    words = _TOKEN.findall(text.lower())
+    features = [f"w:{word}" for word in words]
+    features += [f"b:{first} {second}" for first, second in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return features
+
+class HashedTfidfClassifier:
+    """
+    Multinomial logistic regression per label head over hashed TF-IDF features.
+
+    Features are hashed into `n_features` buckets with CRC32 (stable across
+    processes). Rows are kept sparse (CSR arrays), so scoring a batch is one
+    gather over the weight matrix plus a segmented sum.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy is required for the local classifier")
+        self.n_features = n_features
+        self.idf = np.ones(n_features, dtype=np.float32)
+        self.weights = {head: np.zeros((n_features, len(labels)), dtype=np.float32) for head, labels in LABELS.items()}
+        self.bias = {head: np.zeros(len(labels), dtype=np.float32) for head, labels in LABELS.items()}
+        self.trained_examples = 0
+
+    def _hash_rows(self, texts: Sequence[str]) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+        """CSR (indices, term counts, indptr) of hashed features for each text"""
+        indices, counts, indptr = [], [], [0]
+        for text in texts:
+            row: Dict[int, int] = {}
+            for feature in extract_features(text):
+                bucket = zlib.crc32(feature.encode("utf-8")) % self.n_features
+                row[bucket] = row.get(bucket, 0) + 1
+            indices.extend(row.keys())
+            counts.extend(row.values())
+            indptr.append(len(indices))
+        return (
+            np.asarray(indices, dtype=np.int64),
+            np.asarray(counts, dtype=np.float32),
+            np.asarray(indptr, dtype=np.int64)
+        )
+
+    def _vectorize(self, texts: Sequence[str]):
+        """Sublinear TF * IDF, L2-normalized per row"""
+        indices, counts, indptr = self._hash_rows(texts)
+        data = (1.0 + np.log(counts)) * self.idf[indices] if len(indices) else counts
+        rows = np.repeat(np.arange(len(texts)), np.diff(indptr))
+        norms = np.sqrt(np.bincount(rows, weights=data * data, minlength=len(texts)))
+        data = data / np.maximum(norms[rows], 1e-12)
+        return indices, data.astype(np.float32), rows
+
+    def _scores(self, head: str, indices, data, rows, batch_size: int):
+        contributions = self.weights[head][indices] * data[:, None]
+        scores = np.zeros((batch_size, len(LABELS[head])), dtype=np.float32)
+        np.add.at(scores, rows, contributions)
+        return scores + self.bias[head]
+
+    @staticmethod
+    def _softmax(scores):
+        shifted = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return shifted / shifted.sum(axis=1, keepdims=True)
+
+    def predict_batch(self, texts: Sequence[str]) -> List[Tuple[Dict[str, str], float]]:
+        """Classify many texts in one vectorized pass; returns (classification, confidence) pairs"""
+        if not texts:
+            return []
+        indices, data, rows = self._vectorize(texts)
+        labels = {}
+        confidence = np.ones(len(texts), dtype=np.float32)
+        for head in LABELS:
+            probabilities = self._softmax(self._scores(head, indices, data, rows, len(texts)))
+            labels[head] = probabilities.argmax(axis=1)
+            # A prediction is only as confident as its least certain head
+            confidence = np.minimum(confidence, probabilities.max(axis=1))
+        return [
+            ({head: LABELS[head][labels[head][i]] for head in LABELS}, float(confidence[i]))
+            for i in range(len(texts))
+        ]
+
+    def fit(self, examples: Sequence[Tuple[str, Dict[str, str]]], epochs: int = 50, learning_rate: float = 10.0, l2: float = 1e-6):
+        """Train on (message, classification) pairs with full-batch gradient descent"""
+        examples = [
+            (text, labels) for text, labels in examples
+            if all(labels.get(head) in values for head, values in LABELS.items())
+        ]
+        if not examples:
+            raise ValueError("No valid training examples")
+        texts = [text for text, _ in examples]
+
+        # Document frequencies -> smoothed IDF
+        indices, _, indptr = self._hash_rows(texts)
+        df = np.bincount(indices, minlength=self.n_features).astype(np.float32)
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+
+        indices, data, rows = self._vectorize(texts)
+        for head, values in LABELS.items():
+            targets = np.zeros((len(texts), len(values)), dtype=np.float32)
+            targets[np.arange(len(texts)), [values.index(labels[head]) for _, labels in examples]] = 1.0
+            weights = np.zeros((self.n_features, len(values)), dtype=np.float32)
+            bias = np.zeros(len(values), dtype=np.float32)
+            self.weights[head], self.bias[head] = weights, bias
+
+            for _ in range(epochs):
+                error = (self._softmax(self._scores(head, indices, data, rows, len(texts))) - targets) / len(texts)
+                gradient = np.zeros_like(weights)
+                np.add.at(gradient, indices, data[:, None] * error[rows])
+                weights -= learning_rate * (gradient + l2 * weights)
+                bias -= learning_rate * error.sum(axis=0)
+
+        self.trained_examples = len(texts)
+        return self
+
+    def save(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        arrays = {"idf": self.idf, "meta": np.asarray([self.n_features, self.trained_examples])}
+        for head in LABELS:
+            # Only non-zero rows are stored; most hash buckets are never used
+            used = np.flatnonzero(np.abs(self.weights[head]).sum(axis=1))
+            arrays[f"{head}_rows"] = used
+            arrays[f"{head}_weights"] = self.weights[head][used]
+            arrays[f"{head}_bias"] = self.bias[head]
+        with open(path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedTfidfClassifier":
+        with np.load(path) as arrays:
+            n_features, trained_examples = (int(value) for value in arrays["meta"])
+            model = cls(n_features)
+            model.idf = arrays["idf"].astype(np.float32)
+            model.trained_examples = trained_examples
+            for head in LABELS:
+                model.weights[head][arrays[f"{head}_rows"]] = arrays[f"{head}_weights"]
+                model.bias[head] = arrays[f"{head}_bias"].astype(np.float32)
+        return model
+
+class LocalPreClassifier:
+    """
+    Gateway stage: answers confident cases locally and tracks how often it
+    skips the LLM and how often it agrees with the LLM when both run.
+    """
+
+    def __init__(self, model: Optional[HashedTfidfClassifier], threshold: float, log_path: Optional[str],
+                 log_sample_rate: float = 1.0, log_max_bytes: int = 0):
+        self.model = model
+        self.threshold = threshold
+        self.log_path = log_path
+        self.log_sample_rate = log_sample_rate
+        # Customer text leaves the process here, so only a sample goes to a bounded file
+        self._log = BufferedJsonlWriter(log_path, max_bytes=log_max_bytes) if log_path else None
+        self._stats = {
+            "predictions": 0,
+            "skipped_llm": 0,
+            "agreement_checks": 0,
+            "agreements": 0,
+            "logged_examples": 0
+        }
+        self._field_agreements = {head: 0 for head in LABELS}
+
+    @classmethod
+    def from_env(cls) -> "LocalPreClassifier":
+        model_path = os.getenv("LOCAL_CLASSIFIER_MODEL_PATH", "data/local_classifier.npz")
+        model = None
+        if not NUMPY_AVAILABLE:
+            logger.info("numpy not installed; local pre-classifier disabled")
+        elif os.path.exists(model_path):
+            try:
+                model = HashedTfidfClassifier.load(model_path)
+                logger.info(f"Loaded local classifier from {model_path} ({model.trained_examples} examples)")
+            except Exception as e:
+                logger.error(f"Failed to load local classifier from {model_path}: {e}")
+
+        capture = os.getenv("CLASSIFICATION_LOG_ENABLED", "false").lower() == "true"
+        return cls(
+            model=model,
+            threshold=float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.85")),
+            log_path=(os.getenv("CLASSIFICATION_LOG_PATH", "data/classification_log.jsonl") or None) if capture else None,
+            log_sample_rate=float(os.getenv("CLASSIFICATION_LOG_SAMPLE_RATE", "0.1")),
+            log_max_bytes=int(os.getenv("CLASSIFICATION_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self.model is not None
+
+    def predict(self, text: str) -> Optional[Tuple[Dict[str, str], float]]:
+        return self.predict_batch([text])[0] if self.ready else None
+
+    def predict_batch(self, texts: Sequence[str]) -> List[Tuple[Dict[str, str], float]]:
+        predictions = self.model.predict_batch(texts)
+        self._stats["predictions"] += len(predictions)
+        return predictions
+
+    def guess(self, text: str, min_confidence: Optional[float] = None) -> Optional[Dict[str, str]]:
+        """
+        Prediction at least `min_confidence` sure (default: the skip threshold) or None,
+        without counting towards the statistics
+        """
+        if not self.ready:
+            return None
+        labels, confidence = self.model.predict_batch([text])[0]
+        return labels if confidence >= (self.threshold if min_confidence is None else min_confidence) else None
+
+    def is_confident(self, confidence: float) -> bool:
+        return confidence >= self.threshold
+
+    def record_skip(self):
+        self._stats["skipped_llm"] += 1
+
+    def record_llm_result(self, text: str, predicted: Optional[Dict[str, str]], llm_result: Dict[str, str]):
+        """Compare with the LLM's answer and, if sampled, queue the pair for the training log"""
+        if predicted:
+            self._stats["agreement_checks"] += 1
+            if all(predicted[head] == llm_result.get(head) for head in LABELS):
+                self._stats["agreements"] += 1
+            for head in LABELS:
+                self._field_agreements[head] += int(predicted[head] == llm_result.get(head))
+
+        if self._log and random.random() < self.log_sample_rate:
+            self._log.write({"message": text, "classification": llm_result})
+            self._stats["logged_examples"] += 1
+    
+    async def aclose(self):
+        """Write the buffered training log rows"""
+        if self._log:
+            await self._log.stop()
+
+    def get_stats(self) -> Dict:
+        predictions, checks = self._stats["predictions"], self._stats["agreement_checks"]
+        return {
+            "enabled": self.ready,
+            "numpy_available": NUMPY_AVAILABLE,
+            "trained_examples": self.model.trained_examples if self.model else 0,
+            "threshold": self.threshold,
+            "training_log": {**self._log.get_stats(), "sample_rate": self.log_sample_rate} if self._log else None,
+            **self._stats,
+            "skip_rate": round(self._stats["skipped_llm"] / predictions, 4) if predictions else 0.0,
+            "agreement_rate": round(self._stats["agreements"] / checks, 4) if checks else 0.0,
+            "field_agreement_rate": {
+                head: round(count / checks, 4) if checks else 0.0 for head, count in self._field_agreements.items()
+            }
+        }
+
+def load_examples(log_path: str) -> List[Tuple[str, Dict[str, str]]]:
+    """Examples from the log and its rotated predecessor (`<path>.1`), oldest first"""
+    examples = []
+    for path in (f"{log_path}.1", log_path):
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    examples.append((record["message"], record["classification"]))
+                except (ValueError, KeyError):
+                    continue
+    return examples
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local pre-classifier from logged LLM classifications")
+    parser.add_argument("--log", default=os.getenv("CLASSIFICATION_LOG_PATH", "data/classification_log.jsonl"))
+    parser.add_argument("--out", default=os.getenv("LOCAL_CLASSIFIER_MODEL_PATH", "data/local_classifier.npz"))
+    parser.add_argument("--features", type=int, default=2 ** 18)
+    parser.add_argument("--epochs", type=int, default=50)
+    args = parser.parse_args()
+
+    examples = load_examples(args.log)
+    model = HashedTfidfClassifier(args.features).fit(examples, epochs=args.epochs)
+
+    predictions = model.predict_batch([text for text, _ in examples])
+    correct = sum(1 for (_, labels), (predicted, _) in zip(examples, predictions) if all(predicted[h] == labels.get(h) for h in LABELS))
+    model.save(args.out)
+    print(f"Trained on {model.trained_examples} examples; training accuracy {correct / len(examples):.3f}; saved to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Micro Batcher - Groups requests that arrive within a few milliseconds into one batch
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """
+    Collects submitted items and hands them to `process_batch` together.
+
+    A batch is flushed when it reaches `max_batch_size` or when `max_wait`
+    seconds have passed since its first item arrived, whichever comes first.
+    `process_batch` must return one result per item, in order; each caller
+    receives its own result (or the batch's exception). Running batches are
+    tracked so `aclose()` can wait for them.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int = 16,
+        max_wait: float = 0.005
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._stats = {"submitted": 0, "batches": 0, "max_batch_size_seen": 0, "failed_batches": 0}
+
+    async def submit(self, item: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        self._stats["submitted"] += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        # Callers that were cancelled while waiting do not need a result
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        self._stats["batches"] += 1
+        self._stats["max_batch_size_seen"] = max(self._stats["max_batch_size_seen"], len(batch))
+
+        try:
+            results = await self.process_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            self._stats["failed_batches"] += 1
+            logger.error(f"Micro-batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def aclose(self):
+        """Send what is still collecting and wait for every running batch"""
+        if self._pending:
+            self._flush()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        batches = self._stats["batches"]
+        return {
+            **self._stats,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "pending": len(self._pending),
+            "in_flight": len(self._tasks),
+            "avg_batch_size": round(self._stats["submitted"] / batches, 2) if batches else 0.0
+        }
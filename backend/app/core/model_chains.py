@@ -0,0 +1,83 @@
+"""
+Model Chains - Ordered provider/model fallback chains per task
+
+Chains are read from LLM_CHAINS_PATH (YAML, needs PyYAML, or JSON) or from
+LLM_CHAINS (JSON), falling back to DEFAULT_CHAINS. Tasks missing from the
+configuration keep their default chain. Format:
+
+    classification:
+      - {provider: mistral, model: mistral-small, timeout: 10}
+      - {provider: ollama, model: "llama3.2:1b", timeout: 20}
+    generation:
+      - {provider: mistral, model: mistral-large-latest}
+      - {provider: ollama, model: "llama3.2:1b"}
+
+A hop without a timeout uses its provider's default.
+"""
+
+import json
+import os
+import logging
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List
+
+try:
+    import yaml
+except ImportError:  # optional dependency: YAML chain files need it, JSON does not
+    yaml = None
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class ChainHop:
+    provider: str
+    model: str
+    timeout: Optional[float] = None  # seconds for the whole call; None = provider default
+
+DEFAULT_CHAINS: Dict[str, List[ChainHop]] = {
+    "classification": [
+        ChainHop("mistral", "mistral-small"),
+        ChainHop("ollama", "llama3.2:1b")  # Use available model
+    ],
+    "generation": [
+        ChainHop("mistral", "mistral-large-latest"),
+        ChainHop("ollama", "llama3.2:1b")  # Use available model
+    ]
+}
+
+def parse_chains(config: Dict[str, Any]) -> Dict[str, List[ChainHop]]:
+    """Turn {"task": [{"provider", "model", "timeout"?}, ...]} into ChainHops"""
+    chains = {}
+    for task, hops in config.get("chains", config).items():
+        chains[task] = [
+            ChainHop(
+                provider=str(hop["provider"]),
+                model=str(hop["model"]),
+                timeout=float(hop["timeout"]) if hop.get("timeout") is not None else None
+            )
+            for hop in hops
+        ]
+        if not chains[task]:
+            raise ValueError(f"chain for {task} is empty")
+    return chains
+
+def _read_file(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise RuntimeError("PyYAML is not installed; use a JSON chain file or install pyyaml")
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+def load_chains() -> Dict[str, List[ChainHop]]:
+    chains = dict(DEFAULT_CHAINS)
+    path, inline = os.getenv("LLM_CHAINS_PATH"), os.getenv("LLM_CHAINS")
+    try:
+        if path:
+            chains.update(parse_chains(_read_file(path)))
+        elif inline:
+            chains.update(parse_chains(json.loads(inline)))
+    except Exception as e:
+        logger.error(f"Ignoring invalid LLM chain configuration ({path or 'LLM_CHAINS'}): {e}")
+        return dict(DEFAULT_CHAINS)
+    return chains
@@ -0,0 +1,223 @@
+"""
+Model Router - Picks the first hop of a task's chain per request
+
+Short, low-priority requests go to a small local model while it keeps up
+(requests without a priority only with LLM_ROUTE_SMALL_FOR_UNKNOWN_PRIORITY);
+high-priority or long requests go to the large model. Everything else uses the
+configured chain order, and tenants near their budget get the cheapest hop.
+The chosen hop is moved to the front of the chain, so the remaining hops still
+serve as fallbacks.
+
+Every decision and its outcome (who answered, how fast) is appended to a JSONL
+log, in write-behind batches, for offline tuning of the thresholds.
+"""
+
+import os
+import time
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+from app.core.jsonl_writer import BufferedJsonlWriter
+from app.core.llm_metrics import LatencyHistogram
+from app.core.model_chains import ChainHop
+
+logger = logging.getLogger(__name__)
+
+def parse_hop(value: str) -> Optional[ChainHop]:
+    """"provider/model" -> ChainHop; an empty value disables the tier"""
+    if not value:
+        return None
+    provider, _, model = value.partition("/")
+    return ChainHop(provider, model) if model else None
+
+@dataclass
+class RoutingPolicy:
+    enabled: bool = True
+    tasks: Tuple[str, ...] = ("classification", "generation")
+    short_tokens: int = 120          # prompt tokens at or below which a request counts as short
+    long_tokens: int = 600           # prompt tokens at or above which a request counts as long
+    small: Optional[ChainHop] = field(default_factory=lambda: ChainHop("ollama", "llama3.2:1b"))
+    large: Optional[ChainHop] = field(default_factory=lambda: ChainHop("mistral", "mistral-large-latest"))
+    large_tasks: Tuple[str, ...] = ("generation",)
+    small_max_latency: float = 5.0   # expected seconds (recent p50 scaled by queue) above which the small model is skipped
+    small_max_queue: int = 4
+    small_for_unknown_priority: bool = False  # also send short requests without a priority to the small model
+    log_path: Optional[str] = "data/routing_log.jsonl"
+
+    @classmethod
+    def from_env(cls) -> "RoutingPolicy":
+        def tasks(name: str, default: str) -> Tuple[str, ...]:
+            return tuple(task.strip() for task in os.getenv(name, default).split(",") if task.strip())
+
+        return cls(
+            enabled=os.getenv("LLM_ROUTING_ENABLED", "true").lower() == "true",
+            tasks=tasks("LLM_ROUTING_TASKS", "classification,generation"),
+            short_tokens=int(os.getenv("LLM_ROUTE_SHORT_TOKENS", "120")),
+            long_tokens=int(os.getenv("LLM_ROUTE_LONG_TOKENS", "600")),
+            small=parse_hop(os.getenv("LLM_ROUTE_SMALL_MODEL", "ollama/llama3.2:1b")),
+            large=parse_hop(os.getenv("LLM_ROUTE_LARGE_MODEL", "mistral/mistral-large-latest")),
+            large_tasks=tasks("LLM_ROUTE_LARGE_TASKS", "generation"),
+            small_max_latency=float(os.getenv("LLM_ROUTE_SMALL_MAX_LATENCY_MS", "5000")) / 1000,
+            small_max_queue=int(os.getenv("LLM_ROUTE_SMALL_MAX_QUEUE", "4")),
+            small_for_unknown_priority=os.getenv("LLM_ROUTE_SMALL_FOR_UNKNOWN_PRIORITY", "false").lower() == "true",
+            log_path=os.getenv("LLM_ROUTING_LOG_PATH", "data/routing_log.jsonl") or None
+        )
+
+@dataclass
+class RouteDecision:
+    task: str
+    prompt_tokens: int
+    priority: Optional[str]
+    hops: List[ChainHop]
+    reason: str
+    expected_latency: Dict[str, Optional[float]]
+    queue_depth: Dict[str, int]
+    decided_at: float = field(default_factory=time.time)
+
+    @property
+    def chosen(self) -> ChainHop:
+        return self.hops[0]
+
+class ModelRouter:
+    """
+    Decides the hop order per request from prompt size, priority and the
+    providers' current latency and queue depth.
+    """
+
+    def __init__(self, policy: RoutingPolicy):
+        self.policy = policy
+        self._reasons: Counter = Counter()
+        self._chosen: Counter = Counter()
+        self._outcomes: Counter = Counter()
+        # Latency of answered requests per routing reason, to compare policies
+        self._latency: Dict[str, LatencyHistogram] = {}
+        self._log = BufferedJsonlWriter(policy.log_path) if policy.log_path else None
+
+    def route(
+        self,
+        task: str,
+        chain: List[ChainHop],
+        prompt_tokens: int,
+        priority: Optional[str],
+        latency_of: Callable[[str], Optional[float]],
+        queue_of: Callable[[str], int],
+        healthy: Callable[[str], bool],
+        cost_of: Optional[Callable[[ChainHop], float]] = None
+    ) -> RouteDecision:
+        """
+        latency_of(provider) is its recent median latency (None without samples),
+        queue_of(provider) the number of calls waiting for admission and
+        healthy(provider) whether its circuit is closed. With cost_of (a tenant
+        near its budget) the chain is simply ordered cheapest first.
+        """
+        providers = {hop.provider for hop in chain}
+        policy = self.policy
+        for tier in (policy.small, policy.large):
+            if tier:
+                providers.add(tier.provider)
+        latencies = {name: latency_of(name) for name in providers}
+        queues = {name: queue_of(name) for name in providers}
+
+        def expected(name: str) -> Optional[float]:
+            # A call waits behind the ones queued ahead of it
+            return None if latencies.get(name) is None else latencies[name] * (1 + queues.get(name, 0))
+
+        first, reason = chain[0] if chain else None, "default"
+        if cost_of is not None and chain:
+            chain = sorted(chain, key=cost_of)
+            first, reason = chain[0], "budget"
+        elif not policy.enabled or task not in policy.tasks or not chain:
+            reason = "disabled"
+        elif policy.large and task in policy.large_tasks and (priority == "high" or prompt_tokens >= policy.long_tokens):
+            if healthy(policy.large.provider):
+                first = policy.large
+                reason = "high_priority" if priority == "high" else "long_message"
+        elif policy.small and prompt_tokens <= policy.short_tokens and (
+            priority == "low" or (priority is None and policy.small_for_unknown_priority)
+        ):
+            small_expected = expected(policy.small.provider)
+            if not healthy(policy.small.provider):
+                reason = "small_unhealthy"
+            elif queues.get(policy.small.provider, 0) > policy.small_max_queue:
+                reason = "small_queue_full"
+            elif small_expected is not None and small_expected > policy.small_max_latency:
+                reason = "small_too_slow"
+            else:
+                first, reason = policy.small, "short_low_priority" if priority == "low" else "short_message"
+
+        hops = [first] + [hop for hop in chain if (hop.provider, hop.model) != (first.provider, first.model)] if first else []
+        # A tier hop inherits the chain's timeout for the same provider/model, if any
+        for index, hop in enumerate(hops):
+            for configured in chain:
+                if (configured.provider, configured.model) == (hop.provider, hop.model):
+                    hops[index] = configured
+                    break
+
+        decision = RouteDecision(
+            task=task,
+            prompt_tokens=prompt_tokens,
+            priority=priority,
+            hops=hops,
+            reason=reason,
+            expected_latency={name: expected(name) for name in providers},
+            queue_depth=queues
+        )
+        self._reasons[reason] += 1
+        if hops:
+            self._chosen[f"{decision.chosen.provider}/{decision.chosen.model}"] += 1
+        return decision
+
+    def record_outcome(self, decision: RouteDecision, served_by: str, latency_seconds: float, success: bool):
+        """Log what happened to a routed request (served_by is "provider/model" or the fallback name)"""
+        planned = f"{decision.chosen.provider}/{decision.chosen.model}" if decision.hops else None
+        outcome = "as_planned" if served_by == planned else "fell_back"
+        self._outcomes[outcome] += 1
+        if success:
+            self._latency.setdefault(decision.reason, LatencyHistogram()).observe(latency_seconds)
+
+        record = {
+            "ts": round(decision.decided_at, 3),
+            "task": decision.task,
+            "prompt_tokens": decision.prompt_tokens,
+            "priority": decision.priority,
+            "reason": decision.reason,
+            "planned": planned,
+            "expected_latency": {
+                name: round(value, 4) if value is not None else None for name, value in decision.expected_latency.items()
+            },
+            "queue_depth": decision.queue_depth,
+            "served_by": served_by,
+            "outcome": outcome,
+            "latency_seconds": round(latency_seconds, 4),
+            "success": success
+        }
+        logger.info(
+            f"Routed {decision.task} ({decision.prompt_tokens} tokens, priority {decision.priority}) "
+            f"to {planned} [{decision.reason}]; served by {served_by} in {latency_seconds:.2f}s"
+        )
+        if self._log:
+            self._log.write(record)
+
+    async def stop(self):
+        """Write the buffered routing log rows"""
+        if self._log:
+            await self._log.stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        policy = self.policy
+        return {
+            "enabled": policy.enabled,
+            "tasks": list(policy.tasks),
+            "short_tokens": policy.short_tokens,
+            "long_tokens": policy.long_tokens,
+            "small": f"{policy.small.provider}/{policy.small.model}" if policy.small else None,
+            "large": f"{policy.large.provider}/{policy.large.model}" if policy.large else None,
+            "small_for_unknown_priority": policy.small_for_unknown_priority,
+            "reasons": dict(self._reasons),
+            "chosen": dict(self._chosen),
+            "outcomes": dict(self._outcomes),
+            "latency_by_reason": {reason: histogram.snapshot() for reason, histogram in self._latency.items()},
+            "log": self._log.get_stats() if self._log else None
+        }
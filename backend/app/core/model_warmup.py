@@ -0,0 +1,143 @@
+"""
+Model Warm-up - Preloads on-demand models at startup and keeps them resident
+
+Local providers such as Ollama load a model on its first request, which can
+take longer than the call timeout. The warmer loads every such model that a
+chain or the router may use, then pings them periodically (with keep_alive)
+so they are not evicted while idle. Readiness waits for the first load.
+"""
+
+import asyncio
+import os
+import time
+import logging
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Iterable
+
+from app.core.llm_metrics import LatencyHistogram
+from app.core.llm_providers import LLMProvider
+from app.core.model_chains import ChainHop
+
+logger = logging.getLogger(__name__)
+
+# Model loads range from sub-second (already resident) to minutes (cold, large)
+LOAD_TIME_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+@dataclass
+class WarmupConfig:
+    enabled: bool = True
+    interval: float = 240.0      # keep-alive ping period; keep it below the provider's keep_alive
+    retry_delay: float = 15.0    # while a model is not warm yet
+    timeout: float = 300.0       # for one load
+
+    @classmethod
+    def from_env(cls) -> "WarmupConfig":
+        return cls(
+            enabled=os.getenv("LLM_WARMUP_ENABLED", "true").lower() == "true",
+            interval=float(os.getenv("LLM_KEEPALIVE_INTERVAL_SECONDS", "240")),
+            retry_delay=float(os.getenv("LLM_WARMUP_RETRY_SECONDS", "15")),
+            timeout=float(os.getenv("LLM_WARMUP_TIMEOUT_SECONDS", "300"))
+        )
+
+class ModelState:
+    def __init__(self):
+        self.warm = False
+        self.attempts = 0
+        self.failures = 0
+        self.last_load_seconds: Optional[float] = None
+        self.first_warm_seconds: Optional[float] = None
+        self.last_warmed_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.load_times = LatencyHistogram(LOAD_TIME_BUCKETS)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "warm": self.warm,
+            "attempts": self.attempts,
+            "failures": self.failures,
+            "first_warm_seconds": round(self.first_warm_seconds, 3) if self.first_warm_seconds is not None else None,
+            "last_load_seconds": round(self.last_load_seconds, 3) if self.last_load_seconds is not None else None,
+            "seconds_since_warm": round(time.monotonic() - self.last_warmed_at, 1) if self.last_warmed_at else None,
+            "last_error": self.last_error,
+            "load_times": self.load_times.snapshot()
+        }
+
+class ModelWarmer:
+    """Background task that loads and then keeps alive a set of provider models"""
+
+    def __init__(self, providers: Dict[str, LLMProvider], targets: Iterable[ChainHop], config: WarmupConfig):
+        self.providers = providers
+        self.config = config
+        # One entry per provider/model that supports warm-up
+        self.targets: List[ChainHop] = []
+        for hop in targets:
+            provider = providers.get(hop.provider)
+            if provider and provider.supports_warmup and all(
+                (known.provider, known.model) != (hop.provider, hop.model) for known in self.targets
+            ):
+                self.targets.append(hop)
+        self.models = {f"{hop.provider}/{hop.model}": ModelState() for hop in self.targets}
+        self._task: Optional[asyncio.Task] = None
+        self._started_at = time.monotonic()
+
+    @property
+    def ready(self) -> bool:
+        """True once every target has been loaded at least once (or when warm-up is off)"""
+        if not self.config.enabled:
+            return True
+        return all(state.first_warm_seconds is not None for state in self.models.values())
+
+    def start(self):
+        if not self.config.enabled or not self.targets or self._task is not None:
+            return
+        self._started_at = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Warming up models: {', '.join(self.models)}")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            await self.warm_all()
+            all_warm = all(state.warm for state in self.models.values())
+            await asyncio.sleep(self.config.interval if all_warm else self.config.retry_delay)
+
+    async def warm_all(self):
+        await asyncio.gather(*(self.warm(hop) for hop in self.targets))
+
+    async def warm(self, hop: ChainHop) -> bool:
+        """Load (or refresh keep_alive for) one model; records its load time"""
+        state = self.models[f"{hop.provider}/{hop.model}"]
+        state.attempts += 1
+        try:
+            load_seconds = await self.providers[hop.provider].warm_up(hop.model, self.config.timeout)
+        except Exception as e:
+            state.warm = False
+            state.failures += 1
+            state.last_error = str(e) or type(e).__name__
+            logger.warning(f"Warm-up of {hop.provider}/{hop.model} failed: {state.last_error}")
+            return False
+
+        if not state.warm:
+            logger.info(f"Model {hop.provider}/{hop.model} warm after a {load_seconds:.2f}s load")
+        if state.first_warm_seconds is None:
+            # Time from startup until the model could serve requests
+            state.first_warm_seconds = time.monotonic() - self._started_at
+        state.warm = True
+        state.last_error = None
+        state.last_load_seconds = load_seconds
+        state.last_warmed_at = time.monotonic()
+        state.load_times.observe(load_seconds)
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.config.enabled,
+            "ready": self.ready,
+            "keepalive_interval_seconds": self.config.interval,
+            "models": {name: state.snapshot() for name, state in self.models.items()}
+        }
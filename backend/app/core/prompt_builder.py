@@ -0,0 +1,209 @@
+"""
+Prompt Builder - Compacts customer text to a per-model token budget before it goes into a prompt
+
+Email bodies carry quoted reply chains and signatures that the model does not
+need. For the email channel the builder strips those; for every channel it
+collapses whitespace, estimates tokens with a
+local approximation of a BPE tokenizer and truncates what is left to the
+budget of the models that will see the prompt.
+"""
+
+import json
+import math
+import os
+import re
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Any, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Input budgets (tokens of customer text, not the whole prompt) per model
+DEFAULT_BUDGETS = {
+    "mistral-small": 1000,
+    "mistral-large-latest": 2000,
+    "llama3.2:1b": 1500
+}
+
+TRUNCATION_MARKER = " [...] "
+
+# Lines that start the quoted part of a reply: "On <date>, <name> wrote:" and
+# Outlook separators
+_QUOTE_START = re.compile(
+    r"^\s*(?:On\s.+wrote:\s*$|-{2,}\s*(?:Original|Forwarded) Message\s*-{2,}|_{8,}\s*$)",
+    re.IGNORECASE
+)
+# A quoted header block: "From:" followed by Sent:/Date:/To:/Subject: lines. A lone
+# "From: ..." line is customer text ("From: my phone, the app crashes")
+_HEADER_FROM = re.compile(r"^\s*\*?From:\*?\s.+$", re.IGNORECASE)
+_HEADER_FIELD = re.compile(r"^\s*\*?(?:Sent|Date|To|Cc|Subject):\*?\s", re.IGNORECASE)
+_HEADER_LOOKAHEAD = 3
+_QUOTED_LINE = re.compile(r"^\s*>")
+_SIGNATURE_DELIMITER = re.compile(r"^--\s*$")
+_MOBILE_SIGNATURE = re.compile(r"^\s*Sent from my \w+", re.IGNORECASE)
+_SIGN_OFF = re.compile(
+    r"^\s*(?:best|kind|warm)?\s*(?:regards|thanks|thank you|cheers|sincerely|best)[,.!]?\s*$",
+    re.IGNORECASE
+)
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+def _starts_header_block(lines: List[str], index: int) -> bool:
+    """A From: line counts only with another mail header among the next non-empty lines"""
+    if not _HEADER_FROM.match(lines[index]):
+        return False
+    following = [line for line in lines[index + 1:index + 1 + _HEADER_LOOKAHEAD * 2] if line.strip()]
+    return any(_HEADER_FIELD.match(line) for line in following[:_HEADER_LOOKAHEAD])
+
+def strip_quoted_history(text: str) -> str:
+    """Drop everything from the first quote header on, and any remaining '>' lines"""
+    lines = text.splitlines()
+    kept = []
+    for index, line in enumerate(lines):
+        if _QUOTE_START.match(line) or _starts_header_block(lines, index):
+            break
+        if not _QUOTED_LINE.match(line):
+            kept.append(line)
+    return "\n".join(kept)
+
+def strip_signature(text: str) -> str:
+    """Drop a '-- ' signature block, 'Sent from my ...' lines and a trailing sign-off followed by a short name block"""
+    lines = text.splitlines()
+    for index, line in enumerate(lines):
+        if _SIGNATURE_DELIMITER.match(line) or _MOBILE_SIGNATURE.match(line):
+            lines = lines[:index]
+            break
+
+    # "Thanks,\nJane Doe\nAcme Ltd" at the very end: only cut when a few short lines (the
+    # name block) follow the sign-off. A closing "Thank you so much!" is part of the
+    # message and its sentiment, and a "thanks" inside the body survives too
+    for index in range(len(lines) - 1, max(-1, len(lines) - 6), -1):
+        if _SIGN_OFF.match(lines[index]):
+            tail = [line for line in lines[index + 1:] if line.strip()]
+            if 1 <= len(tail) <= 3 and all(len(line.strip()) <= 40 for line in tail):
+                lines = lines[:index]
+            break
+    return "\n".join(lines)
+
+def collapse_whitespace(text: str) -> str:
+    """One line with single spaces, which is how prompts quote the customer"""
+    return " ".join(text.split())
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate BPE token count: each punctuation mark is one token and each word
+    about one token per four characters (common short words are single tokens).
+    """
+    return sum(math.ceil(len(piece) / 4) for piece in _TOKEN_PIECES.findall(text))
+
+def truncate_to_budget(text: str, max_tokens: int) -> str:
+    """Keep the head (where the request usually is) and a shorter tail, cut at word boundaries"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    words = text.split(" ")
+    head_budget = (max_tokens * 2) // 3
+    tail_budget = max_tokens - head_budget - estimate_tokens(TRUNCATION_MARKER)
+
+    head, used = [], 0
+    for word in words:
+        cost = estimate_tokens(word)
+        if used + cost > head_budget:
+            break
+        head.append(word)
+        used += cost
+
+    tail, used = [], 0
+    for word in reversed(words[len(head):]):
+        cost = estimate_tokens(word)
+        if used + cost > tail_budget:
+            break
+        tail.append(word)
+        used += cost
+
+    return " ".join(head) + TRUNCATION_MARKER + " ".join(reversed(tail))
+
+def clean_email_body(text: str) -> str:
+    """Quoted history and signature removed, whitespace collapsed"""
+    cleaned = collapse_whitespace(strip_signature(strip_quoted_history(text)))
+    # A message that is nothing but "quote" (e.g. a bare forward) is kept whole
+    return cleaned or collapse_whitespace(text)
+
+@dataclass
+class CompactedText:
+    text: str
+    original_tokens: int
+    tokens: int
+    truncated: bool
+
+class PromptBuilder:
+    """Compacts customer text for prompts and keeps running token-savings counters"""
+
+    def __init__(self, budgets: Dict[str, int], default_budget: int):
+        self.budgets = dict(budgets)
+        self.default_budget = default_budget
+        self._stats = {"prompts": 0, "truncated": 0, "original_tokens": 0, "final_tokens": 0}
+        # Email prompts only (an email goes into a classification and a generation prompt)
+        self._email_stats = {"prompts": 0, "original_tokens": 0, "final_tokens": 0}
+
+    @classmethod
+    def from_env(cls) -> "PromptBuilder":
+        """Budgets from DEFAULT_BUDGETS overridden by PROMPT_TOKEN_BUDGETS (JSON {"model": tokens})"""
+        budgets = dict(DEFAULT_BUDGETS)
+        try:
+            budgets.update({model: int(tokens) for model, tokens in json.loads(os.getenv("PROMPT_TOKEN_BUDGETS", "{}")).items()})
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.error(f"Ignoring invalid PROMPT_TOKEN_BUDGETS: {e}")
+        return cls(budgets, int(os.getenv("PROMPT_MAX_INPUT_TOKENS", "1500")))
+
+    def budget_for(self, models: Iterable[str]) -> int:
+        """A prompt may be sent to any model of a fallback chain, so it must fit the smallest budget"""
+        return min((self.budgets.get(model, self.default_budget) for model in models), default=self.default_budget)
+
+    def compact(self, text: str, max_tokens: Optional[int] = None, channel: Optional[str] = None) -> CompactedText:
+        """
+        Text within max_tokens. Quoted history and signatures are only stripped from
+        email: in chat messages a "From: ..." or "Thanks!" line is what the customer said
+        """
+        original_tokens = estimate_tokens(text)
+        if channel == "email":
+            compacted = clean_email_body(text)
+            self._email_stats["prompts"] += 1
+            self._email_stats["original_tokens"] += original_tokens
+            self._email_stats["final_tokens"] += estimate_tokens(compacted)
+        else:
+            compacted = collapse_whitespace(text)
+        budget = max_tokens or self.default_budget
+        truncated = estimate_tokens(compacted) > budget
+        if truncated:
+            compacted = truncate_to_budget(compacted, budget)
+
+        result = CompactedText(compacted, original_tokens, estimate_tokens(compacted), truncated)
+        self._stats["prompts"] += 1
+        self._stats["truncated"] += int(truncated)
+        self._stats["original_tokens"] += original_tokens
+        self._stats["final_tokens"] += result.tokens
+        if truncated or result.tokens < original_tokens:
+            logger.debug(f"Compacted prompt input from {original_tokens} to {result.tokens} tokens")
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        original, final = self._stats["original_tokens"], self._stats["final_tokens"]
+        email_original, email_final = self._email_stats["original_tokens"], self._email_stats["final_tokens"]
+        return {
+            **self._stats,
+            "tokens_saved": original - final,
+            "savings_rate": round((original - final) / original, 4) if original else 0.0,
+            "email_cleaning": {
+                **self._email_stats,
+                "tokens_saved": email_original - email_final,
+                "savings_rate": round((email_original - email_final) / email_original, 4) if email_original else 0.0
+            },
+            "budgets": self.budgets,
+            "default_budget": self.default_budget
+        }
+
+@lru_cache(maxsize=1)
+def get_prompt_builder() -> PromptBuilder:
+    """Process-wide builder so savings from every entry point are counted together"""
+    return PromptBuilder.from_env()
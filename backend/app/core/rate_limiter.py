@@ -0,0 +1,248 @@
+"""
+Rate Limiter - Admission control for upstream LLM calls
+
+Combines a concurrency semaphore with request-per-second and token-per-minute
+buckets, per provider and per model. Callers that cannot be admitted wait
+(backpressure) until a deadline instead of failing straight away.
+"""
+
+import asyncio
+import json
+import os
+import time
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional, AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+class AdmissionTimeout(Exception):
+    """Raised when a call could not be admitted before its deadline"""
+    pass
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate` tokens per second up to `capacity`.
+
+    Waiters are served in FIFO order. The balance may go negative when a
+    caller reports that it used more than it reserved; later callers then
+    wait for the debt to be repaid.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float, deadline: float):
+        # A request larger than the bucket could never be served; cap it at a full bucket
+        amount = min(amount, self.capacity)
+
+        async with self._lock:
+            while True:
+                self._refill()
+                now = time.monotonic()
+                if now >= self._paused_until and self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+
+                wait = max(self._paused_until - now, (amount - self._tokens) / self.rate)
+                if now + wait > deadline:
+                    raise AdmissionTimeout(f"token bucket needs {wait:.2f}s, past deadline")
+                await asyncio.sleep(wait)
+
+    def adjust(self, delta: float):
+        """Charge (positive) or refund (negative) tokens after the fact"""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - delta)
+
+    def pause(self, seconds: float):
+        """Stop admitting for a while, e.g. after the provider answered 429"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+@dataclass
+class AdmissionLimits:
+    """Limits for one provider or model; 0 disables the corresponding check"""
+    max_concurrency: int = 0
+    requests_per_second: float = 0
+    tokens_per_minute: float = 0
+
+class Limiter:
+    """Concurrency semaphore plus RPS and TPM buckets for one provider or model"""
+
+    def __init__(self, name: str, limits: AdmissionLimits):
+        self.name = name
+        self.limits = limits
+        self._semaphore = asyncio.Semaphore(limits.max_concurrency) if limits.max_concurrency else None
+        # RPS bucket allows a burst of one second's worth of requests
+        self._requests = (
+            TokenBucket(limits.requests_per_second, max(1.0, limits.requests_per_second))
+            if limits.requests_per_second else None
+        )
+        self._tokens = (
+            TokenBucket(limits.tokens_per_minute / 60.0, limits.tokens_per_minute)
+            if limits.tokens_per_minute else None
+        )
+        self.in_flight = 0
+        self.waiting = 0
+        self._stats = {"admitted": 0, "timeouts": 0, "throttled": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+    async def acquire(self, estimated_tokens: int, deadline: float):
+        started = time.monotonic()
+        self.waiting += 1
+        acquired_slot = False
+        try:
+            if self._semaphore:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    raise AdmissionTimeout(f"{self.name}: no concurrency slot before deadline")
+                try:
+                    await asyncio.wait_for(self._semaphore.acquire(), timeout)
+                except asyncio.TimeoutError:
+                    raise AdmissionTimeout(f"{self.name}: no concurrency slot before deadline")
+                acquired_slot = True
+            if self._requests:
+                await self._requests.acquire(1, deadline)
+            if self._tokens:
+                await self._tokens.acquire(estimated_tokens, deadline)
+        except BaseException as e:
+            if acquired_slot:
+                self._semaphore.release()
+            if isinstance(e, AdmissionTimeout):
+                self._stats["timeouts"] += 1
+            raise
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - started
+        self.in_flight += 1
+        self._stats["admitted"] += 1
+        self._stats["wait_seconds"] += waited
+        self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+
+    def release(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        self.in_flight -= 1
+        if self._semaphore:
+            self._semaphore.release()
+        if self._tokens and actual_tokens is not None:
+            self._tokens.adjust(actual_tokens - estimated_tokens)
+
+    def throttle(self, seconds: float):
+        self._stats["throttled"] += 1
+        for bucket in (self._requests, self._tokens):
+            if bucket:
+                bucket.pause(seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        admitted = self._stats["admitted"]
+        return {
+            **asdict(self.limits),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            **{key: round(value, 4) if isinstance(value, float) else value for key, value in self._stats.items()},
+            "avg_wait_seconds": round(self._stats["wait_seconds"] / admitted, 4) if admitted else 0.0,
+            "tokens_available": round(self._tokens.available) if self._tokens else None
+        }
+
+class Permit:
+    """Handle returned by AdmissionController.admit; report real usage through it"""
+
+    def __init__(self, estimated_tokens: int):
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens: Optional[int] = None
+        self.queue_wait_seconds = 0.0
+
+class AdmissionController:
+    """
+    Gateway-level admission: every upstream call passes its provider limiter and
+    then its model limiter, all within one deadline.
+    """
+
+    def __init__(self, provider_limits: Dict[str, AdmissionLimits], model_limits: Dict[str, AdmissionLimits], max_wait: float):
+        self.max_wait = max_wait
+        self._providers = {name: Limiter(name, limits) for name, limits in provider_limits.items()}
+        self._models = {name: Limiter(name, limits) for name, limits in model_limits.items()}
+
+    @classmethod
+    def from_env(cls, providers) -> "AdmissionController":
+        """
+        Provider limits come from <PROVIDER>_MAX_CONCURRENCY, <PROVIDER>_RPS and <PROVIDER>_TPM;
+        per-model limits from LLM_MODEL_LIMITS, a JSON object such as
+        {"mistral-large-latest": {"max_concurrency": 8, "tokens_per_minute": 200000}}.
+        """
+        defaults = {
+            "mistral": AdmissionLimits(max_concurrency=16, requests_per_second=5, tokens_per_minute=500000),
+            "ollama": AdmissionLimits(max_concurrency=2)
+        }
+        provider_limits = {}
+        for name in providers:
+            default = defaults.get(name, AdmissionLimits())
+            prefix = name.upper()
+            provider_limits[name] = AdmissionLimits(
+                max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", default.max_concurrency)),
+                requests_per_second=float(os.getenv(f"{prefix}_RPS", default.requests_per_second)),
+                tokens_per_minute=float(os.getenv(f"{prefix}_TPM", default.tokens_per_minute))
+            )
+
+        model_limits = {}
+        try:
+            for model, limits in json.loads(os.getenv("LLM_MODEL_LIMITS", "{}")).items():
+                model_limits[model] = AdmissionLimits(**limits)
+        except (ValueError, TypeError) as e:
+            logger.error(f"Ignoring invalid LLM_MODEL_LIMITS: {e}")
+
+        return cls(
+            provider_limits,
+            model_limits,
+            max_wait=float(os.getenv("LLM_ADMISSION_MAX_WAIT_MS", "5000")) / 1000
+        )
+
+    @asynccontextmanager
+    async def admit(self, provider: str, model: str, estimated_tokens: int) -> AsyncIterator[Permit]:
+        """Wait (up to max_wait) for capacity on the provider and model, then hold it for the call"""
+        permit = Permit(estimated_tokens)
+        limiters = [limiter for limiter in (self._providers.get(provider), self._models.get(model)) if limiter]
+        deadline = time.monotonic() + self.max_wait
+        started = time.monotonic()
+        acquired = []
+
+        try:
+            for limiter in limiters:
+                await limiter.acquire(estimated_tokens, deadline)
+                acquired.append(limiter)
+            permit.queue_wait_seconds = time.monotonic() - started
+            yield permit
+        finally:
+            for limiter in acquired:
+                limiter.release(estimated_tokens, permit.actual_tokens)
+
+    def throttle(self, provider: str, model: str, seconds: float):
+        """Back off a provider (and model) after it signalled rate limiting"""
+        for limiter in (self._providers.get(provider), self._models.get(model)):
+            if limiter:
+                limiter.throttle(seconds)
+
+    def queue_depth(self, provider: str) -> int:
+        limiter = self._providers.get(provider)
+        return limiter.waiting if limiter else 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_wait_seconds": self.max_wait,
+            "providers": {name: limiter.get_stats() for name, limiter in self._providers.items()},
+            "models": {name: limiter.get_stats() for name, limiter in self._models.items()}
+        }
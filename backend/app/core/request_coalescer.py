@@ -0,0 +1,74 @@
+"""
+Request Coalescer - Single-flight execution for identical in-flight LLM calls
+"""
+
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from app.core.classification_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+def coalescing_key(model_type: str, prompt: str) -> str:
+    """Key shared by calls with the same model type and normalized prompt"""
+    digest = hashlib.sha256(normalize_text(prompt).encode("utf-8")).hexdigest()
+    return f"{model_type}:{digest}"
+
+class RequestCoalescer:
+    """
+    Lets concurrent callers with the same key share one upstream call.
+
+    The first caller (the leader) starts the call as a task; callers arriving
+    while it is in flight await the same task and receive the same result.
+    The task is shielded so a cancelled caller does not cancel it for the others;
+    it is only cancelled once every caller waiting on it has gone away.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self._stats = {
+            "upstream_calls": 0,
+            "coalesced_calls": 0,
+            "abandoned_calls": 0,
+            "max_waiters": 0
+        }
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._in_flight[key] = task
+            self._waiters[key] = 1
+            self._stats["upstream_calls"] += 1
+            task.add_done_callback(lambda _: self._release(key))
+        else:
+            self._waiters[key] += 1
+            self._stats["coalesced_calls"] += 1
+            self._stats["max_waiters"] = max(self._stats["max_waiters"], self._waiters[key])
+            logger.debug(f"Coalesced LLM call onto in-flight request {key[:24]}")
+
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._in_flight.get(key) is task:
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0 and not task.done():
+                    task.cancel()
+                    self._stats["abandoned_calls"] += 1
+            raise
+
+    def _release(self, key: str):
+        self._in_flight.pop(key, None)
+        self._waiters.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self._stats["upstream_calls"] + self._stats["coalesced_calls"]
+        return {
+            **self._stats,
+            "in_flight": len(self._in_flight),
+            "coalesced_rate": round(self._stats["coalesced_calls"] / total, 4) if total else 0.0
+        }
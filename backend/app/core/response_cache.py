@@ -0,0 +1,198 @@
+"""
+Response Cache - Reply templates keyed by (tenant, category, priority, intent signature)
+
+Routine replies differ only in the ticket number and a few customer tokens.
+A generated reply is stored with those values replaced by slots
+({{ticket_id}}, {{email_0}}, ...) and served to later messages with the same
+classification and intent, with the new values filled back in.
+"""
+
+import os
+import re
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Customer-specific tokens, in extraction order; each one found becomes a slot
+_SLOT_PATTERNS = (
+    ("url", re.compile(r"https?://\S+")),
+    ("email", re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")),
+    ("number", re.compile(r"\b\d[\d.,/-]{2,}\d\b"))  # order numbers, amounts, phone numbers
+)
+_TICKET = re.compile(r"TICKET_\w+")
+_WORD = re.compile(r"[a-z']+")
+
+# Function words that do not change what the customer is asking for (negations are kept)
+_STOPWORDS = frozenset(
+    "a an the i i'm im me my we our us you your it its this that these those is am are was were be been "
+    "to of in on at for with from and or so just please hi hello hey there dear".split()
+)
+
+@dataclass
+class ReplyScope:
+    """What a reply depends on: who asked, how the message was classified and its text"""
+    tenant_id: str
+    category: str
+    priority: str
+    message: str
+    ticket_id: str
+    identity: Dict[str, str] = field(default_factory=dict)  # e.g. customer_id, sender
+
+def extract_slots(scope: ReplyScope) -> Dict[str, str]:
+    """Slot name -> value for everything customer-specific about this request"""
+    slots = {"ticket_id": scope.ticket_id}
+    slots.update({name: str(value) for name, value in scope.identity.items() if value and len(str(value)) >= 3})
+
+    text = _TICKET.sub(" ", scope.message)
+    for kind, pattern in _SLOT_PATTERNS:
+        for index, value in enumerate(dict.fromkeys(pattern.findall(text))):
+            slots[f"{kind}_{index}"] = value
+        text = pattern.sub(" ", text)
+    return slots
+
+def intent_signature(text: str) -> str:
+    """
+    Order-insensitive bag of content words plus how many slot values of each kind
+    the message carries, so "refund order 1234" and "order 5678 refund" match.
+    """
+    text = _TICKET.sub(" ", text)
+    counts = []
+    for kind, pattern in _SLOT_PATTERNS:
+        counts.append(f"#{kind}:{len(set(pattern.findall(text)))}")
+        text = pattern.sub(" ", text)
+
+    words = set()
+    for word in _WORD.findall(text.lower()):
+        word = word.strip("'")
+        if not word or word in _STOPWORDS:
+            continue
+        # Cheap plural folding: "refunds" and "refund" share a signature
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return " ".join(sorted(words) + counts)
+
+def to_template(reply: str, slots: Dict[str, str]) -> Optional[str]:
+    """Replace slot values with {{name}} markers; None if the reply cannot be templated safely"""
+    if "{{" in reply:
+        return None
+    # Longest values first so a value contained in another is not split
+    for name, value in sorted(slots.items(), key=lambda item: len(item[1]), reverse=True):
+        reply = reply.replace(value, "{{" + name + "}}")
+    return reply
+
+def fill_template(template: str, slots: Dict[str, str]) -> Optional[str]:
+    """Fill {{name}} markers; None if the template needs a slot this request does not have"""
+    for name in re.findall(r"\{\{(\w+)\}\}", template):
+        if name not in slots:
+            return None
+        template = template.replace("{{" + name + "}}", slots[name])
+    return template
+
+class ResponseTemplateCache:
+    """
+    In-process LRU of reply templates with TTL. Every tenant has its own LRU and
+    entry cap, so one busy tenant cannot evict another's templates and a
+    template is never served across tenants.
+    """
+
+    def __init__(self, ttl_seconds: float = 1800, max_entries_per_tenant: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_tenant = max_entries_per_tenant
+
+        # tenant -> key -> (expires_at, template, model_used)
+        self._tenants: Dict[str, "OrderedDict[str, Tuple[float, str, str]]"] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "uncacheable": 0,
+            "slot_mismatches": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+        self._tenant_lookups: Dict[str, List[int]] = {}  # tenant -> [hits, lookups]
+
+    @classmethod
+    def from_env(cls) -> "ResponseTemplateCache":
+        return cls(
+            ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "1800")),
+            max_entries_per_tenant=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES_PER_TENANT", "1000"))
+        )
+
+    @staticmethod
+    def _key(scope: ReplyScope) -> str:
+        return f"{scope.category}|{scope.priority}|{intent_signature(scope.message)}"
+
+    def get(self, scope: ReplyScope) -> Optional[Dict[str, str]]:
+        """Reply for this request filled in from a stored template, if one matches"""
+        entries = self._tenants.get(scope.tenant_id)
+        key = self._key(scope)
+        entry = entries.get(key) if entries is not None else None
+        reply = None
+
+        if entry is not None:
+            expires_at, template, model_used = entry
+            if expires_at <= time.monotonic():
+                del entries[key]
+                self._stats["expirations"] += 1
+            else:
+                reply = fill_template(template, extract_slots(scope))
+                if reply is None:
+                    self._stats["slot_mismatches"] += 1
+                else:
+                    entries.move_to_end(key)
+
+        counters = self._tenant_lookups.setdefault(scope.tenant_id, [0, 0])
+        counters[1] += 1
+        if reply is None:
+            self._stats["misses"] += 1
+            return None
+
+        counters[0] += 1
+        self._stats["hits"] += 1
+        return {"content": reply, "model_used": model_used}
+
+    def set(self, scope: ReplyScope, reply: str, model_used: str):
+        """Store a generated reply as a template for this request's key"""
+        template = to_template(reply, extract_slots(scope))
+        if template is None:
+            self._stats["uncacheable"] += 1
+            return
+
+        entries = self._tenants.setdefault(scope.tenant_id, OrderedDict())
+        key = self._key(scope)
+        entries.pop(key, None)
+        entries[key] = (time.monotonic() + self.ttl_seconds, template, model_used)
+        self._stats["stores"] += 1
+
+        while len(entries) > self.max_entries_per_tenant:
+            entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def clear(self, tenant_id: Optional[str] = None):
+        if tenant_id is None:
+            self._tenants.clear()
+        else:
+            self._tenants.pop(tenant_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": sum(len(entries) for entries in self._tenants.values()),
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries_per_tenant": self.max_entries_per_tenant,
+            "tenants": {
+                tenant: {
+                    "entries": len(self._tenants.get(tenant, ())),
+                    "hit_rate": round(hits / total, 4) if total else 0.0
+                }
+                for tenant, (hits, total) in self._tenant_lookups.items()
+            }
+        }
@@ -3,9 +3,9 @@ Telegram Channel Implementation for Cassava AI Support Orchestrator
 """
 
 import os
-import httpx
 from typing import Dict, Any, Optional
 from app.core.base_channel import BaseChannel, ChannelConnectionError
+from app.core.telegram_dispatcher import TelegramDispatcher
 
 class TelegramChannel(BaseChannel):
     """
@@ -19,6 +19,9 @@ class TelegramChannel(BaseChannel):
         
         if not self.bot_token:
             raise ChannelConnectionError("TELEGRAM_BOT_TOKEN not configured")
+        
+        # Shared client plus global and per-chat rate limits for every reply
+        self.dispatcher = TelegramDispatcher.from_env(self.api_base)
     
     async def send_message(self, to: str, content: str, **kwargs) -> bool:
         """
@@ -30,23 +33,15 @@ class TelegramChannel(BaseChannel):
             **kwargs: parse_mode, reply_to_message_id, etc.
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.api_base}/sendMessage",
-                    json={
-                        "chat_id": to,
-                        "text": content,
-                        "parse_mode": kwargs.get("parse_mode", "Markdown"),
-                        "reply_to_message_id": kwargs.get("reply_to_message_id")
-                    }
-                )
-                
-                if response.status_code == 200:
-                    self.logger.info(f"Message sent to Telegram chat {to}")
-                    return True
-                else:
-                    self.logger.error(f"Telegram API error: {response.text}")
-                    return False
+            sent = await self.dispatcher.send("sendMessage", {
+                "chat_id": to,
+                "text": content,
+                "parse_mode": kwargs.get("parse_mode", "Markdown"),
+                "reply_to_message_id": kwargs.get("reply_to_message_id")
+            })
+            if sent:
+                self.logger.info(f"Message sent to Telegram chat {to}")
+            return sent
                     
         except Exception as e:
             self.logger.error(f"Failed to send Telegram message: {e}")
@@ -118,6 +113,15 @@ class TelegramChannel(BaseChannel):
         
         return formatted
     
+    def get_delivery_stats(self) -> Optional[Dict[str, Any]]:
+        return self.dispatcher.get_stats()
+    
+    def render_prometheus(self) -> str:
+        return "\n".join(self.dispatcher.render_prometheus()) + "\n"
+    
+    async def aclose(self):
+        await self.dispatcher.aclose()
+    
     def get_channel_info(self) -> Dict[str, Any]:
         """
         Get Telegram channel capabilities
@@ -0,0 +1,201 @@
+"""
+Telegram Dispatcher - Pooled, rate-limited sender for Bot API calls
+
+All replies go through one persistent httpx client and two kinds of token
+bucket: a global one (Telegram allows about 30 messages per second per bot)
+and one per chat (about 1 message per second). A 429 answer pauses the
+chat's bucket for the `retry_after` Telegram asks for before the message is
+retried. Private chats cannot exceed their limit through this sender, so a
+429 for one means the bot as a whole is throttled and the global bucket is
+paused as well; groups (negative chat ids) have a stricter per-group limit,
+so a 429 there only pauses that chat. Network errors and 5xx answers are retried with exponential
+backoff. A message that cannot be sent before its deadline is dropped and
+counted.
+"""
+
+import asyncio
+import os
+import random
+import time
+import logging
+from collections import Counter, OrderedDict
+from typing import Optional, Dict, Any, List
+
+import httpx
+
+from app.core.llm_metrics import LatencyHistogram, prometheus_histogram, prometheus_labels, prometheus_metric
+from app.core.rate_limiter import AdmissionTimeout, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Bucket waits are expected to be short; longer ones mean a chat is flooding
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class TelegramDispatcher:
+    """Sends Bot API requests within Telegram's global and per-chat limits"""
+
+    def __init__(
+        self,
+        api_base: str,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        max_wait: float = 60.0,
+        timeout: float = 10.0,
+        max_chats: int = 10000
+    ):
+        self.api_base = api_base
+        self.chat_rate = chat_rate
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.max_chats = max_chats
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._global = TokenBucket(global_rate, global_rate)
+        # chat id -> bucket, least recently used first
+        self._chats: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._stats: Counter = Counter()
+        self._wait = LatencyHistogram(WAIT_BUCKETS)
+        self._latency = LatencyHistogram()
+
+    @classmethod
+    def from_env(cls, api_base: str) -> "TelegramDispatcher":
+        return cls(
+            api_base,
+            global_rate=float(os.getenv("TELEGRAM_GLOBAL_RPS", "30")),
+            chat_rate=float(os.getenv("TELEGRAM_CHAT_RPS", "1")),
+            max_retries=int(os.getenv("TELEGRAM_SEND_MAX_RETRIES", "3")),
+            backoff=float(os.getenv("TELEGRAM_SEND_BACKOFF_SECONDS", "1")),
+            max_wait=float(os.getenv("TELEGRAM_SEND_MAX_WAIT_SECONDS", "60")),
+            timeout=float(os.getenv("TELEGRAM_SEND_TIMEOUT_SECONDS", "10"))
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60)
+            )
+        return self._client
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, 1)
+            # Forget idle chats (full buckets) beyond the cap
+            while len(self._chats) > self.max_chats:
+                oldest_id, oldest = next(iter(self._chats.items()))
+                if oldest.available < oldest.capacity:
+                    break
+                del self._chats[oldest_id]
+        self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def _admit(self, chat_id: str, deadline: float):
+        started = time.monotonic()
+        # Per chat first, so a flooding chat does not hold global capacity while it waits
+        await self._chat_bucket(chat_id).acquire(1, deadline)
+        await self._global.acquire(1, deadline)
+        waited = time.monotonic() - started
+        self._wait.observe(waited)
+        if waited >= 0.005:
+            self._stats["throttled_local"] += 1
+
+    async def send(self, method: str, payload: Dict[str, Any]) -> bool:
+        """Call a Bot API method for `payload["chat_id"]`; True once Telegram accepted it"""
+        chat_id = str(payload.get("chat_id"))
+        deadline = time.monotonic() + self.max_wait
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._admit(chat_id, deadline)
+            except AdmissionTimeout:
+                self._stats["dropped"] += 1
+                logger.error(f"Telegram {method} to chat {chat_id} dropped: rate limit wait past {self.max_wait:.0f}s")
+                return False
+
+            delay = self.backoff * 2 ** attempt * random.uniform(0.8, 1.2)
+            started = time.monotonic()
+            try:
+                response = await self.client.post(f"{self.api_base}/{method}", json=payload)
+            except httpx.HTTPError as e:
+                self._stats["network_errors"] += 1
+                logger.warning(f"Telegram {method} to chat {chat_id} failed (attempt {attempt + 1}): {e}")
+            else:
+                self._latency.observe(time.monotonic() - started)
+                if response.status_code == 200:
+                    self._stats["sent"] += 1
+                    return True
+                if response.status_code == 429:
+                    self._stats["throttled_upstream"] += 1
+                    retry_after = self._retry_after(response)
+                    # The bucket(s) wait it out; the retry below goes through admission again
+                    self._chat_bucket(chat_id).pause(retry_after)
+                    if self._is_group(chat_id):
+                        logger.warning(f"Telegram rate limited chat {chat_id}, retrying after {retry_after:.0f}s")
+                    else:
+                        self._global.pause(retry_after)
+                        self._stats["paused_global"] += 1
+                        logger.warning(f"Telegram rate limited the bot, pausing all sends for {retry_after:.0f}s")
+                    delay = 0.0
+                elif response.status_code < 500:
+                    self._stats["rejected"] += 1
+                    logger.error(f"Telegram API error: {response.text}")
+                    return False
+                else:
+                    self._stats["server_errors"] += 1
+                    logger.warning(f"Telegram {method} returned {response.status_code} (attempt {attempt + 1})")
+
+            if attempt == self.max_retries or time.monotonic() + delay > deadline:
+                break
+            self._stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+        self._stats["failed"] += 1
+        return False
+
+    @staticmethod
+    def _is_group(chat_id: str) -> bool:
+        """Groups and channels have negative ids and their own per-chat limit (about 20 messages per minute)"""
+        return chat_id.startswith("-")
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> float:
+        try:
+            seconds = response.json().get("parameters", {}).get("retry_after")
+        except ValueError:
+            seconds = None
+        if seconds is None:
+            seconds = response.headers.get("Retry-After", 1)
+        try:
+            return max(1.0, float(seconds))
+        except (TypeError, ValueError):
+            return 1.0
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "global_rps": self._global.rate,
+            "chat_rps": self.chat_rate,
+            "tracked_chats": len(self._chats),
+            **self._stats,
+            "admission_wait": self._wait.snapshot(),
+            "send_latency": self._latency.snapshot()
+        }
+
+    def render_prometheus(self) -> List[str]:
+        lines = prometheus_metric("telegram_send_events_total", "counter", "Telegram sender outcomes, retries and throttles", [
+            (prometheus_labels(event=event), count) for event, count in sorted(self._stats.items())
+        ])
+        lines += prometheus_histogram("telegram_send_wait_seconds", "Time a reply waited for the global and per-chat rate limits", [
+            ("", self._wait)
+        ])
+        lines += prometheus_histogram("telegram_send_seconds", "Bot API request latency", [("", self._latency)])
+        return lines
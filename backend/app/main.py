@@ -12,7 +12,7 @@ from datetime import datetime
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import PlainTextResponse, RedirectResponse
 import uvicorn
 
 # Add the app directory to Python path for imports
@@ -56,33 +56,8 @@ print(f"Debug Mode: {DEBUG}")
 print(f"Host: {APP_HOST}:{APP_PORT}")
 print(f"Allowed Origins: {ALLOWED_ORIGINS}")
 
-# WebSocket Connection Manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        print(f"✅ WebSocket connected. Total connections: {len(self.active_connections)}")
-
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        print(f"❌ WebSocket disconnected. Total connections: {len(self.active_connections)}")
-
-    async def broadcast(self, message: dict):
-        """Broadcast message to all connected clients"""
-        if not self.active_connections:
-            return
-            
-        for connection in self.active_connections.copy():
-            try:
-                await connection.send_json(message)
-            except:
-                self.disconnect(connection)
-
-manager = ConnectionManager()
+# WebSocket Connection Manager (shared with the orchestrator for live reply streaming)
+from app.core.websocket_manager import manager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -99,10 +74,20 @@ async def lifespan(app: FastAPI):
     else:
         print("✅ All required environment variables are configured")
     
-    # Initialize channel manager and services
+    # Open the shared, pooled LLM provider clients
+    from app.core.llm_gateway import get_llm_gateway
+    llm_gateway = get_llm_gateway()
+    await llm_gateway.start()
+    print("🔌 LLM gateway connection pools opened")
+    
+    # Resume webhook jobs left over from the last run and start the workers
+    if webhooks.JOB_QUEUE_ENABLED:
+        await webhooks.job_queue.start()
+        print(f"📥 Webhook job queue started ({webhooks.job_queue.workers} workers, {webhooks.job_queue.depth()} jobs pending)")
+    
+    # Test the channels of the manager the webhooks use, so polled mail shares its dedup index and job queue
     try:
-        from core.channel_manager import ChannelManager
-        channel_manager = ChannelManager()
+        channel_manager = webhooks.channel_manager
         
         # Test all channels
         channel_results = await channel_manager.test_all_channels()
@@ -118,7 +103,10 @@ async def lifespan(app: FastAPI):
             email_channel = channel_manager.get_channel("email")
             if email_channel and hasattr(email_channel, 'email_service'):
                 import asyncio
-                email_task = asyncio.create_task(email_channel.email_service.start_email_polling())
+                # Polled mail is deduplicated and queued exactly like webhook deliveries
+                email_task = asyncio.create_task(email_channel.email_service.start_email_polling(
+                    deliver=lambda email_data: webhooks.accept_message("email", email_data)
+                ))
                 print("📧 Email polling service started")
             
     except Exception as e:
@@ -134,6 +122,13 @@ async def lifespan(app: FastAPI):
             print("📧 Email polling service stopped")
     except:
         pass
+    
+    # Unfinished jobs stay in the queue database for the next start
+    await webhooks.job_queue.stop()
+    await webhooks.channel_manager.aclose()
+    
+    await llm_gateway.aclose()
+    print("🔌 LLM gateway connection pools closed")
 
 # Create FastAPI application
 app = FastAPI(
@@ -198,6 +193,18 @@ async def root():
     """Redirect to the web UI dashboard"""
     return RedirectResponse(url="/ui/")
 
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """LLM call, pipeline, job queue and channel delivery metrics in Prometheus text format"""
+    from app.core.call_metrics import get_call_metrics
+    body = (
+        get_call_metrics().render_prometheus()
+        + webhooks.job_queue.render_prometheus()
+        + webhooks.channel_manager.render_prometheus()
+    )
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 # WebSocket endpoint for real-time updates
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -0,0 +1,110 @@
+"""
+Microbenchmark for the compiled keyword classifier
+
+Compares the single-pass compiled engine against the per-rule `any(keyword in text)`
+scan it replaced, over a mix of short chat messages and longer email bodies.
+
+Usage (from backend/):
+    python -m benchmarks.bench_keyword_classifier [--messages 20000] [--repeat 5]
+"""
+
+import argparse
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.keyword_classifier import KeywordClassifier
+
+SAMPLE_MESSAGES = [
+    "I was charged twice for my subscription this month",
+    "How do I reset my password?",
+    "What are your business hours?",
+    "The app keeps crashing when I open it, this is urgent!",
+    "Thank you so much for the great service",
+    "I can't login to my account and I'm really frustrated",
+    "Where can I download my invoice?",
+    "Hello, just checking in about my order",
+]
+
+FILLER = (
+    "Please see the details below. We have been customers for several years and "
+    "would appreciate a quick look at this when you get a chance. "
+)
+
+def build_corpus(count: int):
+    random.seed(42)
+    corpus = []
+    for _ in range(count):
+        message = random.choice(SAMPLE_MESSAGES)
+        # Roughly one in five messages is a long email body
+        if random.random() < 0.2:
+            message = FILLER * random.randint(5, 20) + message
+        corpus.append(message)
+    return corpus
+
+def build_varied_emails(count: int):
+    """Email-sized bodies drawn from a large random vocabulary, so few words repeat"""
+    random.seed(7)
+    vocabulary = ["".join(random.choices(string.ascii_lowercase, k=random.randint(2, 10))) for _ in range(20000)]
+    return [
+        " ".join(random.choices(vocabulary, k=random.randint(100, 500))) + " " + random.choice(SAMPLE_MESSAGES)
+        for _ in range(count)
+    ]
+
+def naive_classify(classifier: KeywordClassifier, text: str):
+    """Per-rule substring scans, as the pre-compiled fallback did"""
+    text_lower = text.lower()
+    values, decided = dict(classifier.defaults), set()
+    for rule in classifier.rules:
+        if rule.all_of and not all(keyword in text_lower for keyword in rule.all_of):
+            continue
+        if rule.any_of and not any(keyword in text_lower for keyword in rule.any_of):
+            continue
+        if rule.field not in decided:
+            values[rule.field] = rule.value
+            decided.add(rule.field)
+    return values
+
+def measure(label: str, func, corpus, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in corpus:
+            func(message)
+        best = min(best, time.perf_counter() - started)
+    rate = len(corpus) / best
+    print(f"{label:<28} {rate:>12,.0f} msgs/sec  ({best * 1000:.1f} ms for {len(corpus)} messages)")
+    return rate
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    classifier = KeywordClassifier.from_file()
+    print(f"Compiled {len(classifier.rules)} rules in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    corpus = build_corpus(args.messages)
+    mismatches = sum(1 for message in corpus if naive_classify(classifier, message) != classifier.classify(message).values)
+    print(f"Result mismatches vs per-rule scan: {mismatches}")
+
+    subsets = [
+        ("all messages", corpus),
+        ("chat-sized (<200 chars)", [message for message in corpus if len(message) < 200]),
+        ("email-sized (>=200 chars)", [message for message in corpus if len(message) >= 200]),
+        ("email-sized, varied words", build_varied_emails(max(1, args.messages // 20))),
+    ]
+    for name, messages in subsets:
+        print(f"\n{name}:")
+        compiled = measure("  compiled single pass", classifier.classify, messages, args.repeat)
+        naive = measure("  per-rule any() scans", lambda message: naive_classify(classifier, message), messages, args.repeat)
+        print(f"  speedup: {compiled / naive:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Offline load test of the message pipeline against a replayed LLM cassette
+
+Every provider call is served from the cassette (LLM_CASSETTE_MODE=replay) with a
+synthetic latency, so runs need no network and are comparable between changes.
+Record a cassette first by running the app with LLM_CASSETTE_MODE=record, or
+pass --synthesize to generate one from the keyword classifier.
+
+Usage (from backend/):
+    python -m benchmarks.load_test [--messages 5000] [--concurrency 500]
+        [--target orchestrator|webhook] [--latency "lognormal:800,0.5"]
+        [--cassette data/llm_cassette.jsonl.gz] [--synthesize] [--no-caches]
+        [--keep-provider-limits]
+
+Provider admission limits (rate, concurrency) are lifted by default so the run
+measures the pipeline rather than the configured quotas.
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import math
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.bench_keyword_classifier import SAMPLE_MESSAGES, build_corpus
+
+def configure_environment(args):
+    """Replay mode and no side effects (logs, ledger) before any app module reads its settings"""
+    os.environ.update({
+        "LLM_CASSETTE_MODE": "replay",
+        "LLM_CASSETTE_PATH": args.cassette,
+        "LLM_CASSETTE_LATENCY": args.latency,
+        "LLM_CASSETTE_SEED": str(args.seed),
+        "LLM_ROUTING_LOG_PATH": "",
+        "CLASSIFICATION_LOG_PATH": "",
+        "COST_LEDGER_ENABLED": "false",
+        "LLM_WARMUP_ENABLED": "false",
+        # Keep an .env file from pointing the run at real providers
+        "MISTRAL_API_KEY": "replay",
+    })
+    if not args.keep_provider_limits:
+        for provider in ("MISTRAL", "OLLAMA"):
+            os.environ.update({f"{provider}_MAX_CONCURRENCY": "0", f"{provider}_RPS": "0", f"{provider}_TPM": "0"})
+    if args.no_caches:
+        os.environ.update({
+            "CLASSIFICATION_CACHE_ENABLED": "false",
+            "RESPONSE_CACHE_ENABLED": "false",
+            "LOCAL_CLASSIFIER_MODEL_PATH": "",
+        })
+
+def synthesize_cassette(path: str):
+    """A small cassette answering every chain model with keyword classifications and a generic reply"""
+    from app.core.keyword_classifier import get_keyword_classifier
+    from app.core.llm_cassette import cassette_key
+    from app.core.model_chains import load_chains
+
+    classifier = get_keyword_classifier()
+    reply = ("Thank you for contacting us. I've created ticket TICKET_0 and our support team "
+             "will review your message and get back to you shortly.")
+    models = {(hop.provider, hop.model) for hops in load_chains().values() for hop in hops}
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for provider, model in sorted(models):
+            for index, message in enumerate(SAMPLE_MESSAGES):
+                for content in (json.dumps(classifier.classify(message).classification), reply):
+                    entry = {
+                        "key": cassette_key(provider, model, f"{content}\0{index}"),
+                        "provider": provider,
+                        "model": model,
+                        "content": content,
+                        "tokens": 120,
+                        "cost_usd": 0.0,
+                        "latency": 0.8 if provider == "mistral" else 0.3,
+                        "ttfb": None
+                    }
+                    f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    print(f"Synthesized cassette {path} for {len(models)} models")
+
+def percentile(ordered, q: float) -> float:
+    return ordered[max(1, math.ceil(q * len(ordered))) - 1]
+
+async def run(args):
+    from app.agents.master_orchestrator import MasterOrchestrator, get_pipeline_stats
+    from app.core.llm_gateway import get_llm_gateway
+
+    gateway = get_llm_gateway()
+    await gateway.start()
+
+    if args.target == "webhook":
+        import httpx
+        from app.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest")
+
+        async def send(index: int, message: str):
+            response = await client.post("/api/v1/test/test", json={"message": message, "customer_id": f"load_{index}"})
+            return response.status_code == 200
+    else:
+        orchestrator = MasterOrchestrator()
+
+        async def send(index: int, message: str):
+            result = await orchestrator.process_message({
+                "content": message,
+                "channel": "loadtest",
+                "customer_id": f"load_{index}",
+                "message_id": f"load_{index}"
+            })
+            return result.get("success", False)
+
+    corpus = build_corpus(args.messages)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, outcomes = [], Counter()
+
+    async def one(index: int, message: str):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                ok = await send(index, message)
+            except Exception as e:
+                ok = False
+                outcomes[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+            outcomes["ok" if ok else "failed"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index, message) for index, message in enumerate(corpus)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"\n{args.target}: {len(corpus)} messages, concurrency {args.concurrency}, latency {args.latency}")
+    print(f"  throughput   {len(corpus) / elapsed:>10,.0f} msgs/sec  ({elapsed:.2f} s)")
+    print(f"  latency p50  {percentile(latencies, 0.5) * 1000:>10.1f} ms")
+    print(f"  latency p90  {percentile(latencies, 0.9) * 1000:>10.1f} ms")
+    print(f"  latency p99  {percentile(latencies, 0.99) * 1000:>10.1f} ms")
+    print(f"  outcomes     {dict(outcomes)}")
+    stats = gateway.get_stats()
+    print(f"  cassette     {stats['cassette']}")
+    print(f"  pipeline     {get_pipeline_stats()}")
+
+    if args.target == "webhook":
+        await client.aclose()
+    await gateway.aclose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--target", choices=("orchestrator", "webhook"), default="orchestrator")
+    parser.add_argument("--latency", default="lognormal:800,0.5", help="cassette latency spec (see app.core.llm_cassette)")
+    parser.add_argument("--cassette", default="data/llm_cassette.jsonl.gz")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--synthesize", action="store_true", help="generate the cassette instead of using a recorded one")
+    parser.add_argument("--no-caches", action="store_true", help="disable classification/response caches and the local classifier")
+    parser.add_argument("--keep-provider-limits", action="store_true", help="apply the configured admission limits")
+    parser.add_argument("--log-level", default="ERROR")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+    configure_environment(args)
+    if args.synthesize:
+        synthesize_cassette(args.cassette)
+    elif not os.path.exists(args.cassette):
+        parser.error(f"{args.cassette} not found; record one with LLM_CASSETTE_MODE=record or pass --synthesize")
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+from app.core.llm_gateway import LLMGateway, LLMResponse, parse_json_object
+
+def response(content, model_used="mistral-small", success=True):
+    return LLMResponse(content=content, model_used=model_used, provider="mistral", tokens_used=10, cost_usd=0.0, success=success)
+
+def test_plain_json():
+    assert parse_json_object('{"priority": "high"}') == {"priority": "high"}
+
+def test_code_fenced_and_prose_answers():
+    fenced = '```json\n{"priority": "low", "category": "general", "sentiment": "neutral"}\n```'
+    prose = 'Sure! Here is the classification: {"priority": "low", "category": "general", "sentiment": "neutral"} Hope it helps.'
+    assert parse_json_object(fenced)["priority"] == "low"
+    assert parse_json_object(prose)["sentiment"] == "neutral"
+
+def test_non_objects_are_rejected():
+    assert parse_json_object("[1, 2]") is None
+    assert parse_json_object("no json here") is None
+    assert parse_json_object(None) is None
+
+def test_fenced_model_answer_is_cacheable():
+    answer = response('```json\n{"priority": "High", "category": "billing ", "sentiment": "negative"}\n```')
+    assert LLMGateway._parse_model_classification(answer) == {"priority": "high", "category": "billing", "sentiment": "negative"}
+
+def test_invalid_labels_and_fallbacks_are_not_cached():
+    assert LLMGateway._parse_model_classification(response('{"priority": "urgent", "category": "billing", "sentiment": "negative"}')) is None
+    valid = '{"priority": "high", "category": "billing", "sentiment": "negative"}'
+    assert LLMGateway._parse_model_classification(response(valid, model_used="intelligent_fallback")) is None
+    assert LLMGateway._parse_model_classification(response(valid, success=False)) is None
@@ -0,0 +1,46 @@
+import asyncio
+
+import httpx
+
+from app.core.cost_ledger import BUDGET_DOWNGRADE, BUDGET_EXHAUSTED, BUDGET_OK, BudgetPolicy, CostLedger
+from app.core.llm_providers import MistralProvider
+
+def provider(total_tokens):
+    def handle(request):
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "Hello"}}],
+            "usage": {"total_tokens": total_tokens}
+        })
+
+    mistral = MistralProvider("https://api.mistral.test", api_key="key")
+    mistral._client = httpx.AsyncClient(base_url=mistral.base_url, transport=httpx.MockTransport(handle))
+    return mistral
+
+def test_model_aliases_are_priced_as_their_family():
+    mistral = MistralProvider("https://api.mistral.test")
+    assert mistral.price("mistral-large-latest") == 0.008
+    assert mistral.price("mistral-large-2411") == 0.008
+    assert mistral.price("mistral-small-latest") == 0.0002
+    assert mistral.price("mistral-small") == 0.0002
+    assert mistral.price("mistral-smallish") == MistralProvider.DEFAULT_PRICE
+    assert mistral.price("open-mixtral-8x7b") == MistralProvider.DEFAULT_PRICE
+
+def test_large_model_spend_counts_against_the_tenant_budget(tmp_path):
+    ledger = CostLedger(str(tmp_path / "costs.db"), BudgetPolicy(budgets={"acme": 0.045}, soft_limit=0.8))
+
+    async def scenario():
+        mistral = provider(total_tokens=2500)
+        states = []
+        for _ in range(3):
+            response = await mistral.complete("mistral-large-latest", "Draft a reply", timeout=5)
+            ledger.record("acme", "generation", response)
+            states.append(ledger.budget_state("acme"))
+        await mistral.aclose()
+        return response, states
+
+    response, states = asyncio.run(scenario())
+    # 2500 tokens at 0.008 USD / 1k
+    assert response.cost_usd == 0.02
+    assert states == [BUDGET_OK, BUDGET_DOWNGRADE, BUDGET_EXHAUSTED]
+    stats = ledger.get_stats()["tenants"]["acme"]
+    assert stats["models"]["mistral/mistral-large-latest"]["cost_usd"] == 0.06
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from app.core.dedup_index import DeliveryDedupIndex
+
+def claims(index, deliveries):
+    async def scenario():
+        results = [await index.claim(channel, message_id) for channel, message_id in deliveries]
+        await index.aclose()
+        return results
+
+    return asyncio.run(scenario())
+
+def test_first_delivery_wins():
+    index = DeliveryDedupIndex()
+    assert claims(index, [("telegram", "1"), ("telegram", "1"), ("email", "1"), ("telegram", "2")]) == [True, False, True, True]
+    stats = index.get_stats()
+    assert stats["duplicates_suppressed"] == 1
+    assert stats["duplicates_by_channel"] == {"telegram": 1}
+
+def test_released_claim_can_be_processed_again():
+    index = DeliveryDedupIndex()
+
+    async def scenario():
+        assert await index.claim("telegram", "1")
+        await index.release("telegram", "1")
+        return await index.claim("telegram", "1")
+
+    assert asyncio.run(scenario())
+
+def test_claims_expire_after_the_ttl():
+    index = DeliveryDedupIndex(ttl_seconds=0.05)
+
+    async def scenario():
+        assert await index.claim("telegram", "1")
+        await asyncio.sleep(0.1)
+        return await index.claim("telegram", "1")
+
+    assert asyncio.run(scenario())
+
+def test_memory_layer_is_bounded():
+    index = DeliveryDedupIndex(max_entries=2)
+    assert claims(index, [("telegram", str(n)) for n in range(3)] + [("telegram", "0")]) == [True, True, True, True]
+    assert index.get_stats()["evictions"] >= 1
+    assert index.get_stats()["entries"] == 2
+
+def test_sqlite_claims_survive_a_restart(tmp_path):
+    path = str(tmp_path / "dedup.db")
+    assert claims(DeliveryDedupIndex(sqlite_path=path), [("email", "<a@example.com>")]) == [True]
+    restarted = DeliveryDedupIndex(sqlite_path=path)
+    assert claims(restarted, [("email", "<a@example.com>"), ("email", "<b@example.com>")]) == [False, True]
+    assert restarted.backend == "sqlite"
+
+def test_expired_sqlite_claim_is_taken_over(tmp_path):
+    path = str(tmp_path / "dedup.db")
+    assert claims(DeliveryDedupIndex(ttl_seconds=0.05, sqlite_path=path), [("email", "m1")]) == [True]
+    time.sleep(0.1)
+    assert claims(DeliveryDedupIndex(ttl_seconds=0.05, sqlite_path=path), [("email", "m1")]) == [True]
+
+def test_unavailable_store_fails_open(tmp_path):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    index = DeliveryDedupIndex(sqlite_path=str(blocker / "dedup.db"))
+    # The database cannot be created; messages are still processed and memory dedups them
+    assert claims(index, [("telegram", "1"), ("telegram", "1")]) == [True, False]
+
+def test_redis_errors_fail_open():
+    index = DeliveryDedupIndex(redis_url="redis://127.0.0.1:1/0")
+
+    class Unreachable:
+        async def set(self, *args, **kwargs):
+            raise ConnectionError("connection refused")
+
+        async def close(self):
+            pass
+
+    index._redis = Unreachable()
+    assert claims(index, [("telegram", "1")]) == [True]
+    assert index.get_stats()["store_errors"] == 1
@@ -0,0 +1,72 @@
+import asyncio
+
+from app.api.v1 import webhooks
+from app.core.dedup_index import DeliveryDedupIndex
+from app.core.email_channel import EmailChannel
+from app.core.job_queue import DurableJobQueue
+
+def polled(message_id, content="My invoice is wrong"):
+    return {
+        "from": "Jane <jane@example.com>",
+        "subject": "Invoice",
+        "content": content,
+        "message_id": message_id,
+        "received_at": "2024-06-03T10:00:00"
+    }
+
+def test_polled_email_is_deduplicated_and_queued(tmp_path, monkeypatch):
+    for name in ("EMAIL_USERNAME", "EMAIL_PASSWORD", "EMAIL_SMTP_HOST"):
+        monkeypatch.setenv(name, "test")
+    email = EmailChannel()
+    monkeypatch.setitem(webhooks.channel_manager.channels, "email", email)
+    monkeypatch.setattr(webhooks.channel_manager, "deliveries", DeliveryDedupIndex())
+    handled = []
+
+    async def handle(channel, payload):
+        handled.append((channel, payload["message_id"], payload["sender"]))
+
+    queue = DurableJobQueue(handle, str(tmp_path / "jobs.db"), workers=1)
+    monkeypatch.setattr(webhooks, "job_queue", queue)
+    batches = [[polled("<a@example.com>"), polled("<a@example.com>"), polled("<b@example.com>")]]
+    monkeypatch.setattr(email.email_service, "fetch_new_emails", lambda: batches.pop() if batches else [])
+    email.email_service.polling_interval = 0.01
+
+    async def scenario():
+        polling = asyncio.create_task(email.email_service.start_email_polling(
+            deliver=lambda email_data: webhooks.accept_message("email", email_data)
+        ))
+        while len(handled) < 2:
+            await asyncio.sleep(0.01)
+        polling.cancel()
+        await asyncio.gather(polling, return_exceptions=True)
+        stats = queue.get_stats()
+        await queue.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert handled == [("email", "<a@example.com>", "jane@example.com"), ("email", "<b@example.com>", "jane@example.com")]
+    assert stats["enqueued"] == 2
+    assert webhooks.channel_manager.deliveries.get_stats()["duplicates_suppressed"] == 1
+
+def test_one_failing_email_does_not_drop_the_rest(monkeypatch):
+    for name in ("EMAIL_USERNAME", "EMAIL_PASSWORD", "EMAIL_SMTP_HOST"):
+        monkeypatch.setenv(name, "test")
+    service = EmailChannel().email_service
+    batches = [[polled("<a@example.com>"), polled("<b@example.com>")]]
+    monkeypatch.setattr(service, "fetch_new_emails", lambda: batches.pop() if batches else [])
+    service.polling_interval = 0.01
+    delivered = []
+
+    async def deliver(email_data):
+        if email_data["message_id"] == "<a@example.com>":
+            raise RuntimeError("queue unavailable")
+        delivered.append(email_data["message_id"])
+
+    async def scenario():
+        polling = asyncio.create_task(service.start_email_polling(deliver=deliver))
+        await asyncio.sleep(0.05)
+        polling.cancel()
+        await asyncio.gather(polling, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert delivered == ["<b@example.com>"]
@@ -0,0 +1,200 @@
+import asyncio
+import time
+
+from app.core.job_queue import DurableJobQueue
+from app.core.job_scheduler import SchedulerConfig
+from app.core.keyed_executor import KeyedExecutor
+
+def conversation_queue(path, handle, workers=4):
+    """Queue wired like the webhooks: conversation lanes behind a per-chat conversation key"""
+    async def run(key, items):
+        return [await handle(item) for item in items]
+
+    lanes = KeyedExecutor(run)
+
+    async def handler(channel, payload):
+        return await lanes.submit(payload["chat"], payload, order=payload["seq"])
+
+    return DurableJobQueue(
+        handler, str(path), workers=workers, retry_delay=0.05,
+        scheduler_config=SchedulerConfig(reserved_high=0),
+        conversation_of=lambda channel, payload: payload["chat"]
+    )
+
+def test_burst_from_one_chat_does_not_hold_up_other_chats(tmp_path):
+    finished = {}
+
+    async def handle(payload):
+        await asyncio.sleep(0.2)
+        finished[(payload["chat"], payload["seq"])] = time.monotonic()
+
+    async def scenario():
+        queue = conversation_queue(tmp_path / "jobs.db", handle)
+        await queue.start()
+        started = time.monotonic()
+        for seq in range(6):
+            await queue.enqueue("telegram", {"chat": "A", "seq": seq})
+        await queue.enqueue("telegram", {"chat": "B", "seq": 0})
+        while len(finished) < 7:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return started
+
+    started = asyncio.run(scenario())
+    # B runs beside A's burst instead of behind it
+    assert finished[("B", 0)] - started < 0.5
+    a_order = sorted((at, seq) for (chat, seq), at in finished.items() if chat == "A")
+    assert [seq for _, seq in a_order] == list(range(6))
+
+def test_messages_arriving_while_a_chat_runs_are_held_back(tmp_path):
+    running, overlaps, done = set(), [], []
+
+    async def handle(payload):
+        if payload["chat"] in running:
+            overlaps.append(payload)
+        running.add(payload["chat"])
+        await asyncio.sleep(0.05)
+        running.discard(payload["chat"])
+        done.append(payload["seq"])
+
+    async def scenario():
+        queue = conversation_queue(tmp_path / "jobs.db", handle)
+        await queue.start()
+        for seq in range(3):
+            await queue.enqueue("telegram", {"chat": "A", "seq": seq})
+            await asyncio.sleep(0.02)
+        while len(done) < 3 or queue.get_stats()["running"]:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        stats = queue.get_stats()
+        await queue.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert overlaps == []
+    assert done == [0, 1, 2]
+    assert stats["scheduler"]["busy_conversations"] == 0
+
+def plain_queue(path, handler, workers=1, max_attempts=3):
+    return DurableJobQueue(handler, str(path), workers=workers, max_attempts=max_attempts, retry_delay=0.05,
+                           scheduler_config=SchedulerConfig(reserved_high=0))
+
+async def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def job_rows(path):
+    import sqlite3
+    with sqlite3.connect(str(path)) as db:
+        return db.execute("SELECT status, attempts FROM jobs ORDER BY id").fetchall()
+
+def test_unfinished_jobs_run_again_after_a_restart(tmp_path):
+    path = tmp_path / "jobs.db"
+    handled = []
+
+    async def scenario():
+        blocked = asyncio.Event()
+
+        async def stuck(channel, payload):
+            blocked.set()
+            await asyncio.sleep(3600)
+
+        first = plain_queue(path, stuck)
+        await first.start()
+        for seq in range(3):
+            await first.enqueue("telegram", {"seq": seq})
+        await blocked.wait()
+        # One job is mid-processing, two are still queued
+        await first.stop()
+
+        async def record(channel, payload):
+            handled.append(payload["seq"])
+
+        second = plain_queue(path, record)
+        await second.start()
+        await wait_for(lambda: len(handled) == 3)
+        await wait_for(lambda: not job_rows(path))
+        await second.stop()
+
+    asyncio.run(scenario())
+    assert handled == [0, 1, 2]
+
+def test_failed_job_is_retried_then_parked(tmp_path):
+    path = tmp_path / "jobs.db"
+    attempts = []
+
+    async def scenario():
+        async def flaky(channel, payload):
+            attempts.append(payload["name"])
+            if payload["name"] == "broken" or attempts.count(payload["name"]) == 1:
+                raise RuntimeError("upstream down")
+
+        queue = plain_queue(path, flaky, max_attempts=2)
+        await queue.enqueue("email", {"name": "flaky"})
+        await queue.enqueue("email", {"name": "broken"})
+        # The handled job is deleted; the one that kept failing stays for inspection
+        await wait_for(lambda: job_rows(path) == [("failed", 2)])
+        stats = queue.get_stats()
+        await queue.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert attempts.count("flaky") == 2
+    assert attempts.count("broken") == 2
+    assert stats["retried"] == 2
+    assert stats["completed"] == 1
+    assert stats["failed"] == 1
+
+def test_parked_jobs_are_not_resumed(tmp_path):
+    path = tmp_path / "jobs.db"
+    handled = []
+
+    async def scenario():
+        async def failing(channel, payload):
+            raise RuntimeError("bad payload")
+
+        queue = plain_queue(path, failing, max_attempts=1)
+        await queue.enqueue("email", {"seq": 0})
+        await wait_for(lambda: job_rows(path) == [("failed", 1)])
+        await queue.stop()
+
+        async def record(channel, payload):
+            handled.append(payload)
+
+        restarted = plain_queue(path, record)
+        await restarted.start()
+        await asyncio.sleep(0.1)
+        await restarted.stop()
+
+    asyncio.run(scenario())
+    assert handled == []
+    assert job_rows(path) == [("failed", 1)]
+
+def test_higher_priority_jobs_are_taken_first(tmp_path):
+    order = []
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def handler(channel, payload):
+            if payload["name"] == "first":
+                await gate.wait()
+            order.append(payload["name"])
+
+        queue = DurableJobQueue(
+            handler, str(tmp_path / "jobs.db"), workers=1,
+            prioritize=lambda channel, payload: (payload["priority"], channel),
+            scheduler_config=SchedulerConfig(reserved_high=0)
+        )
+        await queue.enqueue("email", {"name": "first", "priority": "low"})
+        await wait_for(lambda: queue.get_stats()["running"] == 1)
+        await queue.enqueue("email", {"name": "low", "priority": "low"})
+        await queue.enqueue("email", {"name": "high", "priority": "high"})
+        gate.set()
+        await wait_for(lambda: len(order) == 3)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert order == ["first", "high", "low"]
@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+from app.core.jsonl_writer import BufferedJsonlWriter
+from app.core.local_classifier import LocalPreClassifier, load_examples
+
+def test_rows_are_buffered_until_flushed(tmp_path):
+    path = tmp_path / "log.jsonl"
+    writer = BufferedJsonlWriter(str(path), flush_interval=60)
+
+    async def scenario():
+        writer.write({"n": 1})
+        writer.write({"n": 2})
+        assert not path.exists()
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert [json.loads(line)["n"] for line in path.read_text().splitlines()] == [1, 2]
+    assert writer.get_stats()["written"] == 2
+
+def test_file_rotates_past_max_bytes(tmp_path):
+    path = tmp_path / "log.jsonl"
+    writer = BufferedJsonlWriter(str(path), max_bytes=100)
+
+    async def scenario():
+        for n in range(3):
+            writer.write({"message": "x" * 40, "n": n})
+            await writer.flush()
+
+    asyncio.run(scenario())
+    assert path.with_name("log.jsonl.1").exists()
+    assert path.stat().st_size <= 100
+    assert writer.get_stats()["rotations"] >= 1
+
+def test_classification_log_is_off_by_default(tmp_path, monkeypatch):
+    monkeypatch.delenv("CLASSIFICATION_LOG_ENABLED", raising=False)
+    monkeypatch.setenv("CLASSIFICATION_LOG_PATH", str(tmp_path / "classification.jsonl"))
+    monkeypatch.setenv("LOCAL_CLASSIFIER_MODEL_PATH", str(tmp_path / "missing.npz"))
+    classifier = LocalPreClassifier.from_env()
+
+    classifier.record_llm_result("my card was charged twice", None, {"priority": "high"})
+    asyncio.run(classifier.aclose())
+    assert classifier.log_path is None
+    assert not (tmp_path / "classification.jsonl").exists()
+
+def test_sampled_examples_are_written_and_loaded_across_rotation(tmp_path):
+    path = str(tmp_path / "classification.jsonl")
+    classifier = LocalPreClassifier(None, 0.85, path, log_sample_rate=1.0, log_max_bytes=150)
+    labels = {"priority": "high", "category": "billing", "sentiment": "negative"}
+
+    async def scenario():
+        for n in range(4):
+            classifier.record_llm_result(f"charged twice, order {n}", None, labels)
+            await classifier._log.flush()
+        await classifier.aclose()
+
+    asyncio.run(scenario())
+    messages = [message for message, _ in load_examples(path)]
+    assert messages[-1] == "charged twice, order 3"
+    assert messages == sorted(messages)
+    assert classifier.get_stats()["logged_examples"] == 4
+
+def test_unsampled_examples_are_not_written(tmp_path):
+    path = str(tmp_path / "classification.jsonl")
+    classifier = LocalPreClassifier(None, 0.85, path, log_sample_rate=0.0)
+    classifier.record_llm_result("hello", None, {"priority": "low"})
+    asyncio.run(classifier.aclose())
+    assert classifier.get_stats()["logged_examples"] == 0
@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+from app.core.keyed_executor import KeyedExecutor
+
+def test_items_of_one_key_run_in_order_one_at_a_time():
+    runs = []
+    active = {"A": 0, "max": 0}
+
+    async def run(key, items):
+        active[key] += 1
+        active["max"] = max(active["max"], active[key])
+        await asyncio.sleep(0.01)
+        runs.extend(items)
+        active[key] -= 1
+        return items[0]
+
+    async def scenario():
+        lanes = KeyedExecutor(run)
+        return await asyncio.gather(*(lanes.submit("A", n, order=n) for n in range(5)))
+
+    assert asyncio.run(scenario()) == [0, 1, 2, 3, 4]
+    assert runs == [0, 1, 2, 3, 4]
+    assert active["max"] == 1
+
+def test_late_items_run_in_arrival_order():
+    runs = []
+
+    async def run(key, items):
+        await asyncio.sleep(0.01)
+        runs.extend(items)
+
+    async def scenario():
+        lanes = KeyedExecutor(run)
+        first = asyncio.create_task(lanes.submit("A", "first", order=1.0))
+        await asyncio.sleep(0)
+        # Picked up by another worker after later messages, but it arrived earlier
+        await asyncio.gather(first, lanes.submit("A", "third", order=3.0), lanes.submit("A", "second", order=2.0))
+
+    asyncio.run(scenario())
+    assert runs == ["first", "second", "third"]
+
+def test_different_keys_run_concurrently():
+    async def run(key, items):
+        await asyncio.sleep(0.2)
+
+    async def scenario():
+        lanes = KeyedExecutor(run)
+        started = time.monotonic()
+        await asyncio.gather(*(lanes.submit(key, key) for key in "ABCDE"))
+        return time.monotonic() - started, lanes.get_stats()
+
+    elapsed, stats = asyncio.run(scenario())
+    assert elapsed < 0.5
+    assert stats["active_keys"] == 0
+
+def test_burst_is_merged_into_one_run():
+    batches = []
+
+    async def run(key, items):
+        batches.append(list(items))
+        return len(items)
+
+    async def scenario():
+        lanes = KeyedExecutor(run, merge_window=0.05, max_batch=3)
+        return await asyncio.gather(*(lanes.submit("A", n, order=n) for n in range(4)))
+
+    results = asyncio.run(scenario())
+    assert batches == [[0, 1, 2], [3]]
+    # Every caller of a batch gets that batch's result
+    assert results == [3, 3, 3, 1]
+
+def test_error_reaches_only_the_failed_batch():
+    async def run(key, items):
+        if items == ["bad"]:
+            raise ValueError("bad item")
+        return items[0]
+
+    async def scenario():
+        lanes = KeyedExecutor(run)
+        return await asyncio.gather(lanes.submit("A", "bad", order=1), lanes.submit("A", "good", order=2), return_exceptions=True)
+
+    bad, good = asyncio.run(scenario())
+    assert isinstance(bad, ValueError)
+    assert good == "good"
@@ -0,0 +1,49 @@
+import random
+
+from app.core.keyword_classifier import KeywordClassifier, KeywordRule
+
+def classifier(*keywords):
+    return KeywordClassifier([KeywordRule("rule", "priority", "high", any_of=frozenset(keywords))], {"priority": "medium"})
+
+def substrings(keywords, text):
+    return {keyword for keyword in keywords if keyword in text.lower()}
+
+def test_overlapping_and_nested_keywords_are_all_found():
+    keywords = ("he", "she", "his", "hers", "bill", "billing")
+    assert classifier(*keywords).find_keywords("Ushers BILLING") == {"he", "she", "hers", "bill", "billing"}
+
+def test_keywords_inside_longer_words_match_like_substrings():
+    assert classifier("app").find_keywords("I am so happy") == {"app"}
+
+def test_phrases_need_the_words_next_to_each_other():
+    keywords = ("charged twice", "reset password")
+    matcher = classifier(*keywords)
+    assert matcher.find_keywords("I was Charged twice.") == {"charged twice"}
+    assert matcher.find_keywords("overcharged twice!") == {"charged twice"}
+    assert matcher.find_keywords("charged  twice") == set()
+    assert matcher.find_keywords("twice charged, reset my password") == set()
+
+def test_matches_substring_scan_on_random_text():
+    keywords = ("he", "she", "his", "hers", "a b", "b c", "ab", "abc d", " x", "can't")
+    matcher = classifier(*keywords)
+    random.seed(7)
+    for _ in range(5000):
+        text = "".join(random.choice("abcdehrsx' \t") for _ in range(random.randint(0, 25)))
+        assert matcher.find_keywords(text) == substrings(keywords, text), text
+
+def test_shipped_rules_agree_with_per_rule_scan():
+    rules = KeywordClassifier.from_file()
+    for text in ("I was charged twice for my subscription", "The app keeps crashing, urgent!", "What are your business hours?"):
+        assert rules.find_keywords(text) == substrings(rules.keywords, text)
+        assert rules.find_keywords(text) == rules.find_keywords(text)
+
+def test_first_matching_rule_sets_the_field():
+    rules = KeywordClassifier([
+        KeywordRule("urgent", "priority", "high", any_of=frozenset({"urgent"})),
+        KeywordRule("question", "priority", "low", any_of=frozenset({"how"})),
+        KeywordRule("login", "category", "technical", all_of=frozenset({"can't", "login"}))
+    ], {"priority": "medium", "category": "general"})
+    result = rules.classify("How soon? This is urgent, I can't login")
+    assert result.values == {"priority": "high", "category": "technical"}
+    assert result.matched_rules == ["urgent", "question", "login"]
+    assert rules.classify("hello").values == {"priority": "medium", "category": "general"}
@@ -0,0 +1,48 @@
+import asyncio
+
+from app.core.micro_batcher import MicroBatcher
+
+def test_items_arriving_together_share_a_batch():
+    batches = []
+
+    async def process(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    async def scenario():
+        batcher = MicroBatcher(process, max_batch_size=3, max_wait=0.01)
+        return await asyncio.gather(*(batcher.submit(n) for n in range(4)))
+
+    assert asyncio.run(scenario()) == [0, 2, 4, 6]
+    assert batches == [[0, 1, 2], [3]]
+
+def test_a_failed_batch_reaches_each_caller():
+    async def process(items):
+        raise RuntimeError("provider down")
+
+    async def scenario():
+        batcher = MicroBatcher(process, max_wait=0.001)
+        return await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(scenario()))
+
+def test_running_batches_are_held_and_awaited_on_close():
+    finished = []
+
+    async def process(items):
+        await asyncio.sleep(0.05)
+        finished.extend(items)
+        return items
+
+    async def scenario():
+        batcher = MicroBatcher(process, max_batch_size=2, max_wait=10)
+        callers = [asyncio.create_task(batcher.submit(n)) for n in range(3)]
+        await asyncio.sleep(0)
+        # The full batch is running; the third item is still collecting
+        assert batcher.get_stats()["in_flight"] == 1
+        await batcher.aclose()
+        assert sorted(finished) == [0, 1, 2]
+        assert batcher.get_stats()["in_flight"] == 0
+        return await asyncio.gather(*callers)
+
+    assert asyncio.run(scenario()) == [0, 1, 2]
@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+from app.core.model_chains import ChainHop
+from app.core.model_router import ModelRouter, RoutingPolicy
+
+CLASSIFICATION = [ChainHop("mistral", "mistral-small", 10), ChainHop("ollama", "llama3.2:1b", 60)]
+GENERATION = [ChainHop("mistral", "mistral-large-latest", 20), ChainHop("ollama", "llama3.2:1b", 60)]
+
+def route(router, chain, tokens, priority, latency=None, queue=0, healthy=True, task="classification", cost_of=None):
+    return router.route(
+        task, chain, tokens, priority,
+        latency_of=lambda provider: latency,
+        queue_of=lambda provider: queue,
+        healthy=lambda provider: healthy,
+        cost_of=cost_of
+    )
+
+def names(decision):
+    return [f"{hop.provider}/{hop.model}" for hop in decision.hops]
+
+def test_short_low_priority_goes_to_small_model():
+    decision = route(ModelRouter(RoutingPolicy(log_path=None)), CLASSIFICATION, 50, "low")
+    assert decision.reason == "short_low_priority"
+    assert names(decision) == ["ollama/llama3.2:1b", "mistral/mistral-small"]
+    # The chain's timeout for that model is kept
+    assert decision.chosen.timeout == 60
+
+def test_unknown_priority_keeps_chain_order_by_default():
+    decision = route(ModelRouter(RoutingPolicy(log_path=None)), CLASSIFICATION, 50, None)
+    assert decision.reason == "default"
+    assert names(decision) == ["mistral/mistral-small", "ollama/llama3.2:1b"]
+
+def test_unknown_priority_uses_small_model_when_enabled():
+    router = ModelRouter(RoutingPolicy(log_path=None, small_for_unknown_priority=True))
+    assert route(router, CLASSIFICATION, 50, None).reason == "short_message"
+
+def test_small_model_skipped_when_slow_busy_or_unhealthy():
+    router = ModelRouter(RoutingPolicy(log_path=None))
+    assert route(router, CLASSIFICATION, 50, "low", latency=2.0, queue=3).reason == "small_too_slow"
+    assert route(router, CLASSIFICATION, 50, "low", queue=5).reason == "small_queue_full"
+    assert route(router, CLASSIFICATION, 50, "low", healthy=False).reason == "small_unhealthy"
+
+def test_long_or_high_priority_generation_goes_to_large_model():
+    router = ModelRouter(RoutingPolicy(log_path=None))
+    chain = list(reversed(GENERATION))
+    assert route(router, chain, 50, "high", task="generation").reason == "high_priority"
+    decision = route(router, chain, 800, "medium", task="generation")
+    assert decision.reason == "long_message"
+    assert names(decision)[0] == "mistral/mistral-large-latest"
+
+def test_budget_orders_chain_cheapest_first():
+    router = ModelRouter(RoutingPolicy(log_path=None))
+    decision = route(router, GENERATION, 50, "high", task="generation", cost_of=lambda hop: 0 if hop.provider == "ollama" else 1)
+    assert decision.reason == "budget"
+    assert names(decision)[0] == "ollama/llama3.2:1b"
+
+def test_outcomes_are_logged_off_loop(tmp_path):
+    path = tmp_path / "routing.jsonl"
+    router = ModelRouter(RoutingPolicy(log_path=str(path)))
+
+    async def scenario():
+        decision = route(router, CLASSIFICATION, 50, "low")
+        router.record_outcome(decision, "ollama/llama3.2:1b", 0.2, True)
+        # Buffered, not written by the call itself
+        assert not path.exists()
+        await router.stop()
+
+    asyncio.run(scenario())
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    assert rows[0]["reason"] == "short_low_priority"
+    assert rows[0]["outcome"] == "as_planned"
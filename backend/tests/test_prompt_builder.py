@@ -0,0 +1,96 @@
+from app.core.prompt_builder import (
+    PromptBuilder,
+    TRUNCATION_MARKER,
+    clean_email_body,
+    estimate_tokens,
+    strip_quoted_history,
+    strip_signature
+)
+
+def builder(budget=1000):
+    return PromptBuilder({}, budget)
+
+def test_reply_chain_is_dropped_from_email():
+    body = "My invoice is wrong.\n\nOn Mon, 3 Jun 2024 at 10:02, Support <help@acme.com> wrote:\n> How can we help?"
+    assert clean_email_body(body) == "My invoice is wrong."
+
+def test_outlook_header_block_starts_the_quote():
+    body = (
+        "Still not fixed.\n\n"
+        "From: Support <help@acme.com>\n"
+        "Sent: Monday, June 3, 2024 10:02 AM\n"
+        "To: Jane <jane@example.com>\n"
+        "Subject: RE: Ticket 42\n\n"
+        "We are looking into it."
+    )
+    assert strip_quoted_history(body).strip() == "Still not fixed."
+
+def test_lone_from_line_is_customer_text():
+    body = "From: my iPhone the app crashes on login.\nIt started after the update and I lost my drafts."
+    assert strip_quoted_history(body) == body
+
+def test_from_line_inside_the_body_does_not_cut_the_rest():
+    body = "I ordered two items.\nFrom: the warehouse in Lyon, nothing arrived.\nPlease refund order 1234."
+    assert "Please refund order 1234." in clean_email_body(body)
+
+def test_header_fields_must_follow_the_from_line_closely():
+    body = "From: Berlin\nmy parcel is late\nagain\nthird week\nfourth line\nTo: be clear, I want a refund"
+    assert strip_quoted_history(body) == body
+
+def test_sign_off_with_name_block_is_stripped():
+    body = "Please cancel my subscription.\n\nKind regards,\nJane Doe\nAcme Ltd"
+    assert clean_email_body(body) == "Please cancel my subscription."
+
+def test_closing_thanks_without_name_is_kept():
+    body = "You fixed it in five minutes.\nThank you so much!"
+    assert clean_email_body(body) == "You fixed it in five minutes. Thank you so much!"
+
+def test_thanks_in_the_body_is_kept():
+    body = "Thanks\nfor nothing, this is the third time my card was charged twice and nobody answers my emails."
+    assert "Thanks" in clean_email_body(body)
+
+def test_signature_delimiter_and_mobile_footer():
+    assert strip_signature("Reset my password please\n--\nJane\n+1 555 0100") == "Reset my password please"
+    assert strip_signature("Where is my order?\nSent from my iPhone") == "Where is my order?"
+
+def test_chat_messages_are_not_stripped():
+    text = "From: my phone\nSent: a screenshot earlier\nThanks!"
+    result = builder().compact(text, channel="telegram")
+    assert result.text == "From: my phone Sent: a screenshot earlier Thanks!"
+    assert not result.truncated
+
+def test_email_channel_is_cleaned_when_compacted():
+    text = "Refund please.\n\nOn Tue, Bob wrote:\n> old text"
+    assert builder().compact(text, channel="email").text == "Refund please."
+
+def test_bare_forward_is_kept_whole():
+    body = "From: Bob <bob@example.com>\nSent: Monday\nTo: me\n\nThe original complaint."
+    assert clean_email_body(body) == "From: Bob <bob@example.com> Sent: Monday To: me The original complaint."
+
+def test_long_text_is_truncated_to_budget_keeping_head_and_tail():
+    text = " ".join(f"word{n}" for n in range(500))
+    result = builder().compact(text, max_tokens=100)
+    assert result.truncated
+    assert result.tokens <= 100
+    assert result.text.startswith("word0 word1")
+    assert result.text.endswith("word499")
+    assert TRUNCATION_MARKER in result.text
+
+def test_budget_is_the_smallest_of_the_chain():
+    prompts = PromptBuilder({"small": 500, "large": 2000}, 1500)
+    assert prompts.budget_for(["large", "small"]) == 500
+    assert prompts.budget_for(["unknown"]) == 1500
+    assert prompts.budget_for([]) == 1500
+
+def test_token_estimate_counts_words_and_punctuation():
+    assert estimate_tokens("Hi, you!") == 4
+    assert estimate_tokens("Hello, world!") == 6
+    assert estimate_tokens("internationalization") == 5
+
+def test_email_cleaning_is_counted_once_per_prompt():
+    prompts = builder()
+    prompts.compact("Refund please.\n\nKind regards,\nJane Doe", channel="email")
+    prompts.compact("Thanks!", channel="telegram")
+    stats = prompts.get_stats()["email_cleaning"]
+    assert stats["prompts"] == 1
+    assert stats["tokens_saved"] > 0
@@ -0,0 +1,96 @@
+import asyncio
+
+from app.agents.master_orchestrator import MasterOrchestrator
+from app.core.llm_gateway import LLMResponse
+
+def response(content):
+    return LLMResponse(content=content, model_used="mistral-small", provider="mistral", tokens_used=1, cost_usd=0.0, success=True)
+
+GUESS = {"priority": "low", "category": "general", "sentiment": "neutral"}
+
+class FakeLocalClassifier:
+    def __init__(self, confidence):
+        self.confidence = confidence
+
+    def guess(self, text, min_confidence=None):
+        return GUESS if self.confidence is not None and self.confidence >= min_confidence else None
+
+class FakeGateway:
+    def __init__(self, classification, confidence=0.9):
+        self.classification = classification
+        self.local_classifier = FakeLocalClassifier(confidence)
+        self.classified = []
+
+    async def classify(self, text, tenant_id=None):
+        self.classified.append(text)
+        await asyncio.sleep(0.01)
+        if isinstance(self.classification, BaseException):
+            raise self.classification
+        return response(self.classification)
+
+def orchestrator(classification, confidence=0.9):
+    speculative = MasterOrchestrator.__new__(MasterOrchestrator)
+    speculative.llm_gateway = FakeGateway(classification, confidence)
+    speculative.speculative = True
+    speculative.speculation_min_confidence = 0.6
+    speculative.drafts = []
+    speculative.unwound = []
+
+    async def generate(message, classification, ticket_id):
+        speculative.drafts.append(classification["priority"])
+        try:
+            if classification["priority"] == "low":
+                await asyncio.sleep(0.05)
+        finally:
+            speculative.unwound.append(classification["priority"])
+        return response(f"reply for {classification['priority']}")
+
+    speculative._prompt_text = lambda message, model_type: message["content"]
+    speculative._generate = generate
+    return speculative
+
+def test_miss_waits_for_the_cancelled_draft_to_unwind():
+    speculative = orchestrator('{"priority": "high", "category": "billing", "sentiment": "negative"}')
+
+    async def scenario():
+        result, reply = await speculative._classify_and_draft({"content": "charged twice"}, "T1", "charged twice", GUESS)
+        # The abandoned draft finished unwinding before the real reply was generated
+        assert speculative.unwound == ["low", "high"]
+        return result, reply
+
+    result, reply = asyncio.run(scenario())
+    assert result["priority"] == "high"
+    assert reply.content == "reply for high"
+
+def test_hit_uses_the_draft():
+    speculative = orchestrator('{"priority": "low", "category": "general", "sentiment": "neutral"}')
+    result, reply = asyncio.run(speculative._classify_and_draft({"content": "hello"}, "T1", "hello", GUESS))
+    assert reply.content == "reply for low"
+    assert speculative.drafts == ["low"]
+
+def test_classification_error_discards_the_draft():
+    speculative = orchestrator(RuntimeError("provider down"))
+
+    async def scenario():
+        try:
+            await speculative._classify_and_draft({"content": "hello"}, "T1", "hello", GUESS)
+        except RuntimeError:
+            pass
+        assert speculative.unwound == ["low"]
+
+    asyncio.run(scenario())
+
+def test_unsure_or_missing_local_model_does_not_speculate():
+    for confidence in (0.4, None):
+        speculative = orchestrator('{"priority": "high", "category": "billing", "sentiment": "negative"}', confidence)
+        result = asyncio.run(speculative._process_two_call({"content": "charged twice"}, "T1"))
+        # Classified first, then a single reply from the LLM's labels; nothing drafted and thrown away
+        assert speculative.drafts == ["high"]
+        assert result["response"] == "reply for high"
+
+def test_confident_local_model_speculates():
+    speculative = orchestrator('{"priority": "low", "category": "general", "sentiment": "neutral"}')
+    result = asyncio.run(speculative._process_two_call({"content": "hello"}, "T1"))
+    assert speculative.drafts == ["low"]
+    assert speculative.llm_gateway.classified == ["hello"]
+    assert result["response"] == "reply for low"
@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+import httpx
+
+from app.core.telegram_dispatcher import TelegramDispatcher
+
+def dispatcher(statuses):
+    """Dispatcher whose Bot API answers with the given status codes in turn, then 200"""
+    answers = iter(statuses)
+    calls = []
+
+    def handle(request):
+        calls.append(time.monotonic())
+        status = next(answers, 200)
+        if status == 429:
+            return httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 1}})
+        return httpx.Response(status, json={"ok": status == 200})
+
+    sender = TelegramDispatcher("https://api.telegram.test/bot1", backoff=0.01, max_wait=5)
+    sender._client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+    return sender, calls
+
+def test_429_for_a_private_chat_pauses_every_chat():
+    sender, calls = dispatcher([429])
+
+    async def scenario():
+        first = asyncio.create_task(sender.send("sendMessage", {"chat_id": 1, "text": "a"}))
+        await asyncio.sleep(0.1)
+        # Another chat has a full bucket of its own but still waits for the global pause
+        other_started = time.monotonic()
+        assert await sender.send("sendMessage", {"chat_id": 2, "text": "b"})
+        assert await first
+        await sender.aclose()
+        return time.monotonic() - other_started
+
+    waited = asyncio.run(scenario())
+    assert waited >= 0.8
+    assert sender.get_stats()["paused_global"] == 1
+    assert len(calls) == 3
+
+def test_429_for_a_group_pauses_only_that_group():
+    sender, calls = dispatcher([429])
+
+    async def scenario():
+        group = asyncio.create_task(sender.send("sendMessage", {"chat_id": -100, "text": "a"}))
+        await asyncio.sleep(0.1)
+        other_started = time.monotonic()
+        assert await sender.send("sendMessage", {"chat_id": 2, "text": "b"})
+        other_waited = time.monotonic() - other_started
+        assert await group
+        await sender.aclose()
+        return other_waited
+
+    assert asyncio.run(scenario()) < 0.5
+    assert sender.get_stats().get("paused_global", 0) == 0
+    assert sender.get_stats()["throttled_upstream"] == 1
+
+def test_client_errors_are_not_retried():
+    sender, calls = dispatcher([400])
+
+    async def scenario():
+        sent = await sender.send("sendMessage", {"chat_id": 1, "text": "a"})
+        await sender.aclose()
+        return sent
+
+    assert asyncio.run(scenario()) is False
+    assert len(calls) == 1
+    assert sender.get_stats()["rejected"] == 1
+
+def test_server_errors_are_retried():
+    sender, calls = dispatcher([502, 503])
+
+    async def scenario():
+        sent = await sender.send("sendMessage", {"chat_id": 1, "text": "a"})
+        await sender.aclose()
+        return sent
+
+    assert asyncio.run(scenario()) is True
+    assert len(calls) == 3
+    assert sender.get_stats()["server_errors"] == 2